@@ -4,15 +4,41 @@ from flask import Flask, redirect, url_for, send_from_directory, request
 from flask_login import LoginManager, current_user
 from flask_migrate import Migrate
 from flask_wtf.csrf import CSRFProtect
+import logging
 import os
 
-from models.db import db
+from models.db import db, engine_options, init_sqlite_pragmas, REPLICA_BIND
+from services.friend_graph import friend_cache
+from services.weekly_matrix import weekly_cache
+from services.identity import identity_cache
+from services.user_search import user_search_cache
+from services.hashing import pin_hasher
+from services.jobs import job_runner
+from services.profiling import profiler
 
 login_manager = LoginManager()
 migrate = Migrate()
 csrf = CSRFProtect()
 
 
+def _init_service_logging(level):
+    """
+    services.*（リクエスト計測・定期ジョブ）のログを stderr に出す。
+    root は WARNING のままで、gunicorn も自分のロガーにしかハンドラーを付けないため、
+    専用のハンドラーを付けて root には伝播させない（create_app を何度呼んでも 1 つだけ）。
+    """
+    logger = logging.getLogger("services")
+    logger.setLevel(level)
+    logger.propagate = False
+    if not logger.handlers:
+        handler = logging.StreamHandler()
+        # gunicorn のログと同じ並び
+        handler.setFormatter(logging.Formatter(
+            "[%(asctime)s] [%(process)d] [%(levelname)s] %(name)s: %(message)s", "%Y-%m-%d %H:%M:%S %z"
+        ))
+        logger.addHandler(handler)
+
+
 def create_app():
     app = Flask(__name__)
     app.secret_key = "secret-key"
@@ -37,11 +63,86 @@ def create_app():
     ).replace("postgres://", "postgresql://")
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
 
+    # --- DB 接続（Postgres はプール、SQLite は PRAGMA。SQLite の値は空文字で既定のまま） ---
+    app.config["DB_POOL_SIZE"] = int(os.environ.get("DB_POOL_SIZE", 5))
+    app.config["DB_MAX_OVERFLOW"] = int(os.environ.get("DB_MAX_OVERFLOW", 5))
+    app.config["DB_POOL_TIMEOUT"] = float(os.environ.get("DB_POOL_TIMEOUT", 10))
+    app.config["DB_POOL_RECYCLE"] = int(os.environ.get("DB_POOL_RECYCLE", 1800))
+    app.config["DB_POOL_PRE_PING"] = os.environ.get("DB_POOL_PRE_PING", "true") == "true"
+    app.config["SQLITE_JOURNAL_MODE"] = os.environ.get("SQLITE_JOURNAL_MODE", "WAL")
+    app.config["SQLITE_SYNCHRONOUS"] = os.environ.get("SQLITE_SYNCHRONOUS", "NORMAL")
+    app.config["SQLITE_BUSY_TIMEOUT"] = os.environ.get("SQLITE_BUSY_TIMEOUT", "5000")      # ミリ秒
+    app.config["SQLITE_CACHE_SIZE"] = os.environ.get("SQLITE_CACHE_SIZE", "-16000")        # 負の値は KiB
+    app.config["SQLITE_MMAP_SIZE"] = os.environ.get("SQLITE_MMAP_SIZE", str(64 * 1024 * 1024))
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(app.config, app.config["SQLALCHEMY_DATABASE_URI"])
+
+    # --- 読み込み用の複製 DB（任意。GET の読み込みだけを流し、書いた人は数秒 primary に固定） ---
+    replica_url = os.environ.get("DATABASE_REPLICA_URL", "").replace("postgres://", "postgresql://")
+    if replica_url:
+        app.config["SQLALCHEMY_BINDS"] = {
+            REPLICA_BIND: dict(engine_options(app.config, replica_url), url=replica_url),
+        }
+    app.config["DB_REPLICA_PIN_SECONDS"] = float(os.environ.get("DB_REPLICA_PIN_SECONDS", 5))
+
+    # --- キャッシュ（プロセス内 LRU） ---
+    app.config["FRIEND_CACHE_SIZE"] = int(os.environ.get("FRIEND_CACHE_SIZE", 10000))
+    app.config["FRIEND_CACHE_TTL"] = int(os.environ.get("FRIEND_CACHE_TTL", 300))
+    app.config["WEEKLY_CACHE_SIZE"] = int(os.environ.get("WEEKLY_CACHE_SIZE", 5000))
+    app.config["WEEKLY_CACHE_TTL"] = int(os.environ.get("WEEKLY_CACHE_TTL", 600))
+    app.config["IDENTITY_CACHE_SIZE"] = int(os.environ.get("IDENTITY_CACHE_SIZE", 10000))
+    app.config["IDENTITY_CACHE_TTL"] = int(os.environ.get("IDENTITY_CACHE_TTL", 60))
+    app.config["USER_SEARCH_CACHE_SIZE"] = int(os.environ.get("USER_SEARCH_CACHE_SIZE", 5000))
+    app.config["USER_SEARCH_CACHE_TTL"] = int(os.environ.get("USER_SEARCH_CACHE_TTL", 60))
+    app.config["USER_SEARCH_LIMIT"] = int(os.environ.get("USER_SEARCH_LIMIT", 8))
+
+    # --- PIN ハッシュ（bcrypt コストと計算スレッド数） ---
+    app.config["BCRYPT_LOG_ROUNDS"] = int(os.environ.get("BCRYPT_LOG_ROUNDS", 12))
+    app.config["HASH_POOL_WORKERS"] = int(os.environ.get("HASH_POOL_WORKERS", 2))
+    app.config["HASH_POOL_QUEUE"] = int(os.environ.get("HASH_POOL_QUEUE", 8))
+    app.config["HASH_TIMEOUT"] = float(os.environ.get("HASH_TIMEOUT", 5))
+
+    # --- 承認待ち件数の SSE ---
+    app.config["PENDING_STREAM_HEARTBEAT"] = int(os.environ.get("PENDING_STREAM_HEARTBEAT", 15))
+    app.config["PENDING_STREAM_MAX_SECONDS"] = int(os.environ.get("PENDING_STREAM_MAX_SECONDS", 300))
+    # プロセスあたりの同時接続数（gthread の WEB_THREADS=4 の半分まで。0 なら常にポーリング）
+    app.config["PENDING_STREAM_MAX_CONNECTIONS"] = int(os.environ.get("PENDING_STREAM_MAX_CONNECTIONS", 2))
+
+    # --- 定期ジョブ（保持期限の削除など） ---
+    app.config["JOBS_ENABLED"] = os.environ.get("JOBS_ENABLED", "true") == "true"
+    # gunicorn の preload では親プロセスで起動せず、post_fork で各ワーカーが start する
+    app.config["JOBS_AUTOSTART"] = os.environ.get("JOBS_AUTOSTART", "true") == "true"
+    app.config["JOBS_INTERVAL"] = int(os.environ.get("JOBS_INTERVAL", 3600))
+    app.config["JOBS_INITIAL_DELAY"] = int(os.environ.get("JOBS_INITIAL_DELAY", 60))
+    app.config["JOBS_LOCK_PATH"] = os.environ.get(
+        "JOBS_LOCK_PATH", os.path.join(BASE_DIR, 'instance', 'jobs.lock')
+    )
+    app.config["RETENTION_DAYS"] = int(os.environ.get("RETENTION_DAYS", 90))
+    app.config["CLEANUP_BATCH_SIZE"] = int(os.environ.get("CLEANUP_BATCH_SIZE", 1000))
+    app.config["CLEANUP_BATCH_PAUSE"] = float(os.environ.get("CLEANUP_BATCH_PAUSE", 0.2))
+
+    # --- カレンダー購読（.ics の配信範囲：今日の N 日前〜M 週後） ---
+    app.config["CALENDAR_PAST_DAYS"] = int(os.environ.get("CALENDAR_PAST_DAYS", 7))
+    app.config["CALENDAR_WEEKS"] = int(os.environ.get("CALENDAR_WEEKS", 8))
+
+    # --- リクエスト計測（0 で無効。本番では 0.01 などで一部だけ） ---
+    app.config["PROFILE_SAMPLE_RATE"] = float(os.environ.get("PROFILE_SAMPLE_RATE", 0))
+
+    # --- ログ（services.* の計測・ジョブの 1 行ログは INFO） ---
+    app.config["SERVICE_LOG_LEVEL"] = os.environ.get("SERVICE_LOG_LEVEL", "INFO").upper()
+
     # --- 初期化 ---
+    _init_service_logging(app.config["SERVICE_LOG_LEVEL"])
     db.init_app(app)
+    init_sqlite_pragmas(app)
     login_manager.init_app(app)
     migrate.init_app(app, db)
     csrf.init_app(app)   # ← CSRFProtect を有効化（最重要）
+    friend_cache.init_app(app)
+    weekly_cache.init_app(app)
+    identity_cache.init_app(app)
+    user_search_cache.init_app(app)
+    pin_hasher.init_app(app)
+    profiler.init_app(app)
 
     # --- GA4 テンプレート ---
     @app.context_processor
@@ -51,24 +152,32 @@ def create_app():
     # --- Models ---
     from models.models import User
     from models.friend import Friend
-    from models.friend_request import FriendRequest
     from models.device import Device
+    from models.calendar_feed import CalendarFeed
 
     # --- Blueprints ---
     from routes.auth import auth_bp
     from routes.schedule import schedule_bp
     from routes.profile import profile_bp
     from routes.friend import friend_bp
+    from routes.availability import availability_bp
     from routes.main import main_bp
-    from maintenance import maintenance_bp
+    from routes.calendar import calendar_bp
+    from maintenance import maintenance_bp, register_jobs
 
     app.register_blueprint(auth_bp)
     app.register_blueprint(schedule_bp)
     app.register_blueprint(profile_bp)
     app.register_blueprint(friend_bp)
+    app.register_blueprint(availability_bp)
+    app.register_blueprint(calendar_bp)
     app.register_blueprint(maintenance_bp)
     app.register_blueprint(main_bp)
 
+    # --- 定期ジョブ（ロックを取れた 1 プロセスだけが実行） ---
+    register_jobs(app)
+    job_runner.init_app(app)
+
     # ---- /register と /login の POST 時だけ auto_login を止める ----
     @app.before_request
     def skip_auto_login_for_auth_post():
@@ -79,8 +188,8 @@ def create_app():
 
     # --- auto_login / LP誘導 ---
     from routes.auth import auto_login, force_register_if_not_logged_in
-    app.before_request(auto_login)
-    app.before_request(force_register_if_not_logged_in)
+    app.before_request(profiler.timed('auto_login', auto_login))
+    app.before_request(profiler.timed('force_register', force_register_if_not_logged_in))
 
     # --- Flask-Login ---
     @login_manager.unauthorized_handler
@@ -89,7 +198,8 @@ def create_app():
 
     @login_manager.user_loader
     def load_user(user_id):
-        return User.query.get(int(user_id))
+        # セッション経由の読み込み（スナップショットがあればクエリなし）
+        return identity_cache.load_user(int(user_id))
 
     # --- index ---
     @app.route("/")
@@ -0,0 +1,2 @@
+# bench/__init__.py
+# 性能まわりの検証ツール置き場（python -m bench.xxx で実行する）
@@ -0,0 +1,136 @@
+# bench/availability.py
+# 空き日さがし：友達 200 人 × 12 週での集計時間
+#   - 素朴な実装（日・枠ごとに行を数える）とビットマスク集計の結果一致と速度
+#   - /api/availability のリクエスト全体
+#
+#   python -m bench.availability [--friends 200] [--weeks 12] [--k 3] [--rounds 50]
+
+import argparse
+import random
+import statistics
+import sys
+import time
+from collections import defaultdict
+from datetime import date, timedelta
+
+from bench.harness import make_app, hash_pin, login, record_statements
+
+SLOTS = ('昼', '夜', '両方')
+
+
+def naive_common_days(rows, friend_ids, start, days, k):
+    """比較用：行をループして (日, 枠) ごとに空いている友達を数える"""
+    friends = set(friend_ids)
+    free = defaultdict(set)
+    for uid, d, time_type in rows:
+        if uid not in friends:
+            continue
+        offset = (d - start).days
+        if time_type in ('昼', '両方'):
+            free[(offset, '昼')].add(uid)
+        if time_type in ('夜', '両方'):
+            free[(offset, '夜')].add(uid)
+    return sorted(
+        (offset, slot) for (offset, slot), users in free.items()
+        if 0 <= offset < days and len(users) >= k
+    )
+
+
+def seed(app, n_friends, weeks, rng):
+    from models import db, User, Friend, Schedule, ScheduleMonth
+
+    hashed = hash_pin()
+    start = date.today()
+    with app.app_context():
+        me = User(username='host', pin=hashed)
+        db.session.add(me)
+        db.session.flush()
+        db.session.execute(db.insert(User), [
+            {'username': f'pal{i}', 'pin': hashed} for i in range(n_friends)
+        ])
+        pal_ids = db.session.execute(
+            db.select(User.id).where(User.username.like('pal%'))
+        ).scalars().all()
+        db.session.execute(db.insert(Friend), [
+            Friend.values(me.id, pid, 'accepted') for pid in pal_ids
+        ])
+        rows = []
+        for uid in [me.id] + pal_ids:
+            activity = rng.betavariate(2, 5)
+            for d in range(weeks * 7):
+                if rng.random() < activity:
+                    rows.append({'user_id': uid, 'date': start + timedelta(days=d), 'time_type': rng.choice(SLOTS)})
+        db.session.execute(db.insert(Schedule), rows)
+        ScheduleMonth.rebuild()
+        db.session.commit()
+        return me.id, pal_ids, len(rows)
+
+
+def timed(fn, rounds):
+    latencies = []
+    result = None
+    for _ in range(rounds):
+        t0 = time.perf_counter()
+        result = fn()
+        latencies.append((time.perf_counter() - t0) * 1000)
+    return result, statistics.median(latencies), max(latencies)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="空き日さがしのベンチマーク")
+    parser.add_argument('--friends', type=int, default=200)
+    parser.add_argument('--weeks', type=int, default=12)
+    parser.add_argument('--k', type=int, default=3)
+    parser.add_argument('--rounds', type=int, default=50)
+    parser.add_argument('--database-url', default=None)
+    args = parser.parse_args(argv)
+
+    app = make_app(args.database_url)
+    me, pal_ids, n_rows = seed(app, args.friends, args.weeks, random.Random(1))
+    days = args.weeks * 7
+    start = date.today()
+
+    from models import db, Schedule
+    from routes.availability import build_masks, find_common_days
+    from routes.schedule import _read_slots
+
+    end = start + timedelta(days=days - 1)
+    with app.app_context():
+        rows = db.session.query(Schedule.user_id, Schedule.date, Schedule.time_type).filter(
+            Schedule.user_id.in_([me] + pal_ids),
+            Schedule.date.between(start, end)
+        ).all()
+        slots = _read_slots([me] + pal_ids, start, end)
+
+    naive, naive_med, naive_max = timed(
+        lambda: naive_common_days(rows, pal_ids, start, days, args.k), args.rounds)
+    masks, mask_med, mask_max = timed(lambda: build_masks(slots, start, days), args.rounds)
+    found, find_med, find_max = timed(
+        lambda: find_common_days(masks, pal_ids, me, args.k, days), args.rounds)
+
+    if sorted((offset, slot) for offset, slot, _, _ in found) != naive:
+        print("MISMATCH: ビットマスク集計と素朴な集計の結果が一致しません")
+        return 1
+
+    client = app.test_client()
+    login(client, 'host')
+    url = f'/api/availability?weeks={args.weeks}&k={args.k}'
+
+    def request():
+        with record_statements() as statements:
+            resp = client.get(url)
+        return len(statements), resp.status_code
+
+    (queries, status), req_med, req_max = timed(request, args.rounds)
+
+    print(f"friends={args.friends} weeks={args.weeks} k={args.k} schedule_rows={n_rows} hits={len(found)}")
+    print(f"{'case':<28} {'median ms':>10} {'max ms':>8}")
+    print(f"{'naive (row loop)':<28} {naive_med:>10.2f} {naive_max:>8.2f}")
+    print(f"{'build_masks':<28} {mask_med:>10.2f} {mask_max:>8.2f}")
+    print(f"{'find_common_days':<28} {find_med:>10.2f} {find_max:>8.2f}")
+    print(f"{'GET /api/availability':<28} {req_med:>10.2f} {req_max:>8.2f}  queries={queries} status={status}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
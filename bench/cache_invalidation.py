@@ -0,0 +1,129 @@
+# bench/cache_invalidation.py
+# 保存・承認・削除のあとに /schedule/weekly が古いまま返らないことの確認
+#   - 直前の ETag で If-None-Match を送っても 304 にならない（ETag が変わる）
+#   - 返ってきた本文が、キャッシュ（friend_cache / weekly_cache）を空にして作った本文と同じ
+#
+# 同じプロセスでの保存・承認・削除に加え、別ワーカー（gunicorn の preload と同じく fork した子プロセス）
+# での保存も確かめる。プロセス内のバージョン番号で表を捨てていた頃は、別ワーカーでの保存後も
+# 新しい ETag で古い表を返していた。
+# 友達関係の変更は他ワーカーの friend_cache には届かず、FRIEND_CACHE_TTL で入れ替わる（ここでは扱わない）。
+#
+#   python -m bench.cache_invalidation
+
+import argparse
+import json
+import os
+import sys
+from datetime import date, timedelta
+
+from bench.harness import make_app, seed_minimal, login
+
+SLOTS = ('昼', '夜', '両方', '')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="保存・承認・削除後のキャッシュ無効化の確認")
+    parser.add_argument('--database-url', default=None)
+    args = parser.parse_args(argv)
+
+    app = make_app(args.database_url)
+    ids = seed_minimal(app)
+
+    from models import db
+    from services.friend_graph import friend_cache
+    from services.weekly_matrix import weekly_cache
+
+    clients = {}
+    for name in ('alice', 'bob', 'carol', 'dave'):
+        clients[name] = app.test_client()
+        login(clients[name], name)
+
+    monday = date.today() - timedelta(days=date.today().weekday())
+    etags = {}
+    failures = []
+    saves = iter(range(1000))
+
+    def weekly(name, conditional=True):
+        """直前に受け取った ETag を If-None-Match に付けて取得する"""
+        headers = {'If-None-Match': etags[name]} if conditional and name in etags else {}
+        r = clients[name].get('/schedule/weekly', headers=headers)
+        if r.status_code == 200:
+            etags[name] = r.headers['ETag']
+        return r
+
+    def uncached(name):
+        friend_cache.backend.clear()
+        weekly_cache.clear()
+        return clients[name].get('/schedule/weekly')
+
+    def check(label, viewers):
+        # 先に全員分をキャッシュのあるまま取り、そのあとで空にして作り直したものと比べる
+        responses = {name: (etags.get(name), weekly(name)) for name in viewers}
+        for name in viewers:
+            before, served = responses[name]
+            fresh = uncached(name)
+            ok = (served.status_code == 200 and served.headers['ETag'] != before
+                  and served.headers['ETag'] == fresh.headers['ETag'] and served.data == fresh.data)
+            print(f"{'ok  ' if ok else 'FAIL'} {label}: {name} の週表示  "
+                  f"status={served.status_code} etag_changed={served.headers.get('ETag', before) != before} "
+                  f"body_fresh={served.data == fresh.data}")
+            if not ok:
+                failures.append(f"{label}: {name}")
+
+    def warm(*names):
+        """表をキャッシュに載せておき（304 では載らない）、もう一度取ると 304 になることを確かめる"""
+        for name in names:
+            weekly(name, conditional=False)
+            r = weekly(name)
+            if r.status_code != 304:
+                print(f"FAIL 変更前の再取得が 304 にならない: {name} -> {r.status_code}")
+                failures.append(f"warm: {name}")
+
+    def save(name):
+        """name の今週の土曜日を毎回違う値にする（schedule.js と同じ form POST）"""
+        slot = SLOTS[next(saves) % len(SLOTS)]
+        payload = json.dumps([{'date': (monday + timedelta(days=5)).isoformat(), 'slot': slot}])
+        return clients[name].post('/schedule/save', data={'payload': payload}, follow_redirects=True)
+
+    # 1) 保存：本人と友達の両方の表が変わる
+    warm('alice', 'bob')
+    save('bob')
+    check("bob の保存", ('alice', 'bob'))
+
+    # 2) 承認：dave → alice を alice が承認すると、双方の表に相手が出る
+    clients['dave'].post('/friend/request', data={'username': 'alice'}, follow_redirects=True)
+    warm('alice', 'dave')
+    clients['alice'].post('/friend/inbox', data={'action': 'accept', 'from_user_id': ids['dave']},
+                          follow_redirects=True)
+    check("dave の申請を承認", ('alice', 'dave'))
+
+    # 3) 削除：alice が bob を削除すると、双方の表から相手が消える
+    warm('alice', 'bob')
+    clients['alice'].post('/friend/delete', data={'friend_id': ids['bob']}, follow_redirects=True)
+    check("bob を削除", ('alice', 'bob'))
+
+    # 4) 別ワーカーでの保存：このプロセス（ワーカー A）のキャッシュはそのままで、
+    #    fork した子（ワーカー B）が dave の予定を保存する
+    warm('alice')
+    pid = os.fork()
+    if pid == 0:
+        code = 1
+        try:
+            with app.app_context():
+                # gunicorn の post_fork と同じく、親の接続は閉じずに手放す
+                for engine in db.engines.values():
+                    engine.dispose(close=False)
+            code = 0 if save('dave').status_code == 200 else 1
+        finally:
+            os._exit(code)
+    _, status = os.waitpid(pid, 0)
+    if os.waitstatus_to_exitcode(status) != 0:
+        print("FAIL ワーカー B での保存")
+        failures.append("worker B save")
+    check("別ワーカーでの dave の保存", ('alice',))
+
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,141 @@
+# bench/calendar_feed.py
+# カレンダー購読（/calendar/feed/<token>.ics）：友達の多いユーザーでの
+#   - 比較用：Schedule を全件読んで 1 つの文字列にする素朴な書き方
+#   - ストリーミング配信（最初のチャンクまでの時間・全体の時間・ピークメモリ）
+#   - 変更なしのポーリング（If-None-Match / If-Modified-Since → 304）
+#
+#   python -m bench.calendar_feed [--users 3000] [--friends-per-user 20] [--weeks 10] [--rounds 20]
+
+import argparse
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import timedelta
+
+from bench.harness import make_app, record_statements
+from bench.seed import seed
+
+
+def materialized_ics(user_ids, start, end):
+    """比較用：Schedule の行をすべて読み込み、本文を組み立ててから返す"""
+    from models import db, User, Schedule
+    from routes.calendar import _ics_line, _ics_text
+
+    names = dict(db.session.query(User.id, User.username).filter(User.id.in_(user_ids)).all())
+    rows = Schedule.query.filter(
+        Schedule.user_id.in_(user_ids), Schedule.date.between(start, end)
+    ).order_by(Schedule.user_id, Schedule.date).all()
+
+    lines = ['BEGIN:VCALENDAR', 'VERSION:2.0', 'PRODID:-//jantomo//schedule feed//JA']
+    for s in rows:
+        lines += [
+            'BEGIN:VEVENT',
+            f'UID:{s.user_id}-{s.date:%Y%m%d}@jantomo',
+            f'DTSTART;VALUE=DATE:{s.date:%Y%m%d}',
+            f'DTEND;VALUE=DATE:{(s.date + timedelta(days=1)):%Y%m%d}',
+            'SUMMARY:' + _ics_text(f"{names.get(s.user_id, '')}（{s.time_type}）"),
+            'END:VEVENT',
+        ]
+    lines.append('END:VCALENDAR')
+    return ''.join(_ics_line(line) for line in lines)
+
+
+def measure(fn):
+    """(所要 ms, ピーク KiB, 戻り値)"""
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    result = fn()
+    elapsed = (time.perf_counter() - t0) * 1000
+    peak = tracemalloc.get_traced_memory()[1] / 1024
+    tracemalloc.stop()
+    return elapsed, peak, result
+
+
+def stream(client, path):
+    """最初のチャンクまでの時間と、本文のバイト数・チャンク数"""
+    t0 = time.perf_counter()
+    resp = client.get(path, buffered=False)
+    chunks = iter(resp.response)
+    first = next(chunks, b'')
+    ttfb = (time.perf_counter() - t0) * 1000
+    size, n = len(first), 1
+    for chunk in chunks:
+        size += len(chunk)
+        n += 1
+    resp.close()
+    return ttfb, size, n, resp
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="カレンダー購読フィードのベンチマーク")
+    parser.add_argument('--users', type=int, default=3000)
+    parser.add_argument('--friends-per-user', type=int, default=20)
+    parser.add_argument('--weeks', type=int, default=10)
+    parser.add_argument('--rounds', type=int, default=20)
+    parser.add_argument('--database-url', default=None)
+    args = parser.parse_args(argv)
+
+    app = make_app(args.database_url)
+    counts = seed(app, args.users, args.weeks, args.friends_per_user, 'cal')
+
+    from models import db, Friend, CalendarFeed
+    from routes.calendar import _feed_window
+    from services.friend_graph import friend_cache
+
+    # 友達の一番多いユーザーの購読 URL
+    with app.app_context():
+        degree = {}
+        for low_id, high_id in db.session.query(Friend.low_id, Friend.high_id).filter(Friend.status == 'accepted'):
+            degree[low_id] = degree.get(low_id, 0) + 1
+            degree[high_id] = degree.get(high_id, 0) + 1
+        hub = max(degree, key=degree.get)
+        db.session.add(CalendarFeed(user_id=hub, token='bench-calendar'))
+        db.session.commit()
+    path = '/calendar/feed/bench-calendar.ics'
+
+    with app.test_request_context():
+        _, start, end = _feed_window()
+        user_ids = [hub] + friend_cache.get_friend_ids(hub)
+        materialized = [measure(lambda: materialized_ics(user_ids, start, end)) for _ in range(args.rounds)]
+
+    client = app.test_client()
+    full, ttfbs, peaks = [], [], []
+    for _ in range(args.rounds):
+        elapsed, peak, (ttfb, size, n_chunks, resp) = measure(lambda: stream(client, path))
+        full.append(elapsed)
+        ttfbs.append(ttfb)
+        peaks.append(peak)
+    etag, last_modified = resp.headers['ETag'], resp.headers['Last-Modified']
+
+    polls = {}
+    for label, headers in (
+        ('304 If-None-Match', {'If-None-Match': etag}),
+        ('304 If-Modified-Since', {'If-Modified-Since': last_modified}),
+    ):
+        latencies = []
+        for _ in range(args.rounds):
+            with record_statements() as statements:
+                t0 = time.perf_counter()
+                r = client.get(path, headers=headers)
+                latencies.append((time.perf_counter() - t0) * 1000)
+            if r.status_code != 304:
+                print(f"FAIL: {label} -> {r.status_code}")
+                return 1
+        polls[label] = (statistics.median(latencies), len(statements))
+
+    print(f"users={counts['users']} schedules={counts['schedules']} months={counts['schedule_months']} "
+          f"feed_users={len(user_ids)} window={start}..{end}")
+    print(f"feed: {size} bytes in {n_chunks} chunks")
+    print(f"\n{'case':<28} {'p50 ms':>8} {'peak KiB':>9}")
+    print(f"{'materialized (Schedule)':<28} {statistics.median(m[0] for m in materialized):>8.2f} "
+          f"{statistics.median(m[1] for m in materialized):>9.0f}")
+    print(f"{'streamed (first chunk)':<28} {statistics.median(ttfbs):>8.2f} {'':>9}")
+    print(f"{'streamed (full body)':<28} {statistics.median(full):>8.2f} {statistics.median(peaks):>9.0f}")
+    for label, (p50, n_queries) in polls.items():
+        print(f"{label:<28} {p50:>8.2f} {'':>9}  ({n_queries} queries)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,172 @@
+# bench/db_concurrency.py
+# SQLite の PRAGMA 設定ごとの同時実行：gunicorn の複数ワーカーを模したプロセスから
+# 読み込み（自分＋友達の予定）と書き込み（予定の保存）を混ぜて流し、
+# 「database is locked」の件数と書き込みスループットを比べる
+#
+#   python -m bench.db_concurrency [--workers 4] [--seconds 10] [--write-ratio 0.3] [--no-stream-reader]
+#
+# 既定では（--no-stream-reader で無効）、保持期限ジョブや ScheduleMonth.rebuild のような
+# 長い流し読み（カーソルを開いたまま少しずつ読む）を 1 プロセス追加する。
+#
+# legacy は変更前と同じ状態（rollback journal / synchronous=FULL / PRAGMA なし）、
+# tuned は create_app の既定（WAL / synchronous=NORMAL / busy_timeout ほか）。
+
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+
+from bench.harness import make_app
+from bench.seed import seed
+
+SLOTS = ('昼', '夜', '両方', '')
+
+PROFILES = {
+    'legacy': {
+        'SQLITE_JOURNAL_MODE': 'DELETE',
+        'SQLITE_SYNCHRONOUS': '',
+        'SQLITE_BUSY_TIMEOUT': '',
+        'SQLITE_CACHE_SIZE': '',
+        'SQLITE_MMAP_SIZE': '',
+    },
+    'tuned': {},  # create_app の既定値
+}
+
+
+def worker(profile, groups, seconds, write_ratio, worker_no, results):
+    """1 プロセス分：自前の create_app で接続し、締め切りまで読み書きを繰り返す"""
+    for key in PROFILES['legacy']:
+        os.environ.pop(key, None)
+    os.environ.update(PROFILES[profile])
+
+    from app import create_app
+    from models import db
+    from routes.schedule import _apply_changes, _read_slots
+    from sqlalchemy.exc import OperationalError
+
+    app = create_app()
+    rng = random.Random(worker_no)
+    today = date.today()
+    monday = today - timedelta(days=today.weekday())
+    stats = {'reads': 0, 'writes': 0, 'locked': 0, 'write_ms': []}
+
+    with app.app_context():
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            group = rng.choice(groups)
+            try:
+                if rng.random() < write_ratio:
+                    start = monday + timedelta(weeks=rng.randrange(4))
+                    items = [(start + timedelta(days=i), rng.choice(SLOTS)) for i in range(7)]
+                    t0 = time.perf_counter()
+                    _apply_changes(group[0], items)
+                    db.session.commit()
+                    stats['write_ms'].append((time.perf_counter() - t0) * 1000)
+                    stats['writes'] += 1
+                else:
+                    _read_slots(group, monday, monday + timedelta(weeks=4, days=-1))
+                    db.session.commit()
+                    stats['reads'] += 1
+            except OperationalError as e:
+                db.session.rollback()
+                if 'locked' not in str(e.orig):
+                    raise
+                stats['locked'] += 1
+            finally:
+                db.session.remove()
+    results.put(stats)
+
+
+def stream_reader(profile, seconds, ready):
+    """schedule を 50 行ずつ間を空けて読み続ける（読んでいる間は共有ロックを持ったまま）"""
+    for key in PROFILES['legacy']:
+        os.environ.pop(key, None)
+    os.environ.update(PROFILES[profile])
+
+    from app import create_app
+    from models import db
+
+    app = create_app()
+    with app.app_context():
+        raw = db.engine.raw_connection()
+        ready.set()
+        deadline = time.monotonic() + seconds
+        try:
+            while time.monotonic() < deadline:
+                cursor = raw.cursor()
+                cursor.execute("SELECT user_id, date, time_type FROM schedule ORDER BY user_id, date")
+                while cursor.fetchmany(50) and time.monotonic() < deadline:
+                    time.sleep(0.02)
+                cursor.close()
+                raw.rollback()
+        finally:
+            raw.close()
+
+
+def run_profile(profile, groups, workers, seconds, write_ratio, streaming):
+    ctx = multiprocessing.get_context('fork')
+    results = ctx.Queue()
+    if streaming:
+        ready = ctx.Event()
+        reader = ctx.Process(target=stream_reader, args=(profile, seconds, ready))
+        reader.start()
+        ready.wait()
+    procs = [
+        ctx.Process(target=worker, args=(profile, groups, seconds, write_ratio, i, results))
+        for i in range(workers)
+    ]
+    for p in procs:
+        p.start()
+    collected = [results.get() for _ in procs]
+    for p in procs:
+        p.join()
+    if streaming:
+        reader.join()
+
+    write_ms = sorted(ms for s in collected for ms in s['write_ms'])
+    return {
+        'reads': sum(s['reads'] for s in collected),
+        'writes': sum(s['writes'] for s in collected),
+        'locked': sum(s['locked'] for s in collected),
+        'p95': write_ms[int(len(write_ms) * 0.95) - 1] if write_ms else 0.0,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="SQLite の PRAGMA 設定ごとの同時書き込み比較")
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--write-ratio', type=float, default=0.3)
+    parser.add_argument('--users', type=int, default=300)
+    parser.add_argument('--no-stream-reader', dest='streaming', action='store_false')
+    args = parser.parse_args(argv)
+
+    app = make_app()
+    seed(app, args.users, 4, 10, 'conc')
+
+    from models import db, User, Friend
+    with app.app_context():
+        ids = [uid for (uid,) in db.session.query(User.id).filter(User.username.like('conc%')).all()]
+        friends = {}
+        for a, b in db.session.query(Friend.low_id, Friend.high_id).filter(Friend.status == 'accepted'):
+            friends.setdefault(a, []).append(b)
+            friends.setdefault(b, []).append(a)
+        groups = [[uid] + friends.get(uid, []) for uid in ids]
+        db.session.remove()
+        db.engine.dispose()
+
+    print(f"users={len(ids)} workers={args.workers} seconds={args.seconds} "
+          f"write_ratio={args.write_ratio} stream_reader={args.streaming}")
+    print(f"{'profile':<8} {'reads/s':>9} {'writes/s':>9} {'locked':>7} {'write p95 ms':>13}")
+    for profile in PROFILES:
+        r = run_profile(profile, groups, args.workers, args.seconds, args.write_ratio, args.streaming)
+        print(f"{profile:<8} {r['reads'] / args.seconds:>9.1f} {r['writes'] / args.seconds:>9.1f} "
+              f"{r['locked']:>7} {r['p95']:>13.2f}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,99 @@
+# bench/friend_pairs.py
+# 友達関係（1 組 1 行・low_id < high_id）の検索：
+#   - 2 人の関係（Friend.between）が一意索引の等価検索 1 回になっているか
+#   - 友達一覧（Friend.adjacency の UNION ALL）と、OR でまとめた書き方との比較
+# EXPLAIN QUERY PLAN と、友達の多い順に選んだユーザーでの所要時間を出す。
+#
+#   python -m bench.friend_pairs [--users 2000] [--friends-per-user 10] [--rounds 200]
+
+import argparse
+import statistics
+import sys
+import time
+
+from bench.harness import make_app
+from bench.seed import seed
+
+
+def or_adjacency(user_id):
+    """比較用：low 側・high 側を OR でまとめた友達一覧"""
+    from models import db, Friend
+
+    return db.session.query(Friend.low_id, Friend.high_id).filter(
+        db.or_(Friend.low_id == user_id, Friend.high_id == user_id),
+        Friend.status == 'accepted'
+    ).order_by(Friend.id).all()
+
+
+def plan(statement):
+    from models import db
+
+    sql = str(statement.compile(db.engine, compile_kwargs={'literal_binds': True}))
+    return [row[-1] for row in db.session.execute(db.text('EXPLAIN QUERY PLAN ' + sql))]
+
+
+def timed(fn, args_list):
+    latencies = []
+    for args in args_list:
+        t0 = time.perf_counter()
+        fn(*args)
+        latencies.append((time.perf_counter() - t0) * 1000)
+    latencies.sort()
+    return statistics.median(latencies), latencies[int(len(latencies) * 0.95) - 1]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="友達関係の検索（一意索引・UNION）のベンチマーク")
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--friends-per-user', type=int, default=10)
+    parser.add_argument('--rounds', type=int, default=200)
+    parser.add_argument('--database-url', default=None)
+    args = parser.parse_args(argv)
+
+    app = make_app(args.database_url)
+    counts = seed(app, args.users, 1, args.friends_per_user, 'pair')
+
+    from models import db, Friend
+
+    with app.app_context():
+        rows = db.session.query(Friend.low_id, Friend.high_id).all()
+        duplicates = len(rows) - len(set(rows))
+
+        degree = {}
+        for low_id, high_id in rows:
+            degree[low_id] = degree.get(low_id, 0) + 1
+            degree[high_id] = degree.get(high_id, 0) + 1
+        hubs = sorted(degree, key=degree.get, reverse=True)[:args.rounds]
+        pairs = rows[:args.rounds]
+
+        print(f"users={counts['users']} friend_rows={len(rows)} duplicate_pairs={duplicates} "
+              f"max_degree={degree[hubs[0]]}")
+
+        u, (a, b) = hubs[0], pairs[0]
+        for label, stmt in (
+            ('between (pair probe)', db.select(Friend.id).where(Friend.between(a, b))),
+            ('adjacency (UNION ALL)', Friend.adjacency(u)),
+            ('adjacency (OR)', db.select(Friend.id).where(
+                db.or_(Friend.low_id == u, Friend.high_id == u), Friend.status == 'accepted')),
+            ('incoming pending', Friend.adjacency(u, 'pending', incoming_only=True)),
+        ):
+            print(f"\n{label}")
+            for detail in plan(stmt):
+                print(f"  {detail}")
+
+        def probe(x, y):
+            db.session.query(Friend.id).filter(Friend.between(x, y)).first()
+
+        print(f"\n{'query':<24} {'p50 ms':>8} {'p95 ms':>8}")
+        for label, fn, call_args in (
+            ('between', probe, pairs),
+            ('get_friend_ids (UNION)', Friend.get_friend_ids, [(h,) for h in hubs]),
+            ('adjacency (OR)', or_adjacency, [(h,) for h in hubs]),
+        ):
+            p50, p95 = timed(fn, call_args)
+            print(f"{label:<24} {p50:>8.3f} {p95:>8.3f}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
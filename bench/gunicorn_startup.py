@@ -0,0 +1,150 @@
+# bench/gunicorn_startup.py
+# gunicorn.conf.py の起動比較：preload の有無 × ワーカークラス（sync / gthread）
+#   - 起動から最初の 200 が返るまでの時間と、全ワーカーがそろうまでの時間
+#   - ワーカーごとのメモリ（RSS と、共有ページを按分した PSS・自分だけのページ USS）
+#
+#   python -m bench.gunicorn_startup [--workers 4] [--requests 200]
+#
+# preload ではワーカーが親のページを共有するので、RSS はほぼ同じでも PSS / USS が下がる。
+# Linux（/proc/<pid>/smaps_rollup）専用。
+
+import argparse
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+from bench.harness import make_app, BASE_DIR
+
+CASES = (
+    ('sync', False),
+    ('sync', True),
+    ('gthread', False),
+    ('gthread', True),
+)
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def children(pid):
+    """親 pid の子プロセス一覧（/proc を走査）"""
+    found = []
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                # comm に空白が入りうるので最後の ')' 以降を読む
+                fields = f.read().rsplit(')', 1)[1].split()
+        except OSError:
+            continue
+        if int(fields[1]) == pid:
+            found.append(int(entry))
+    return found
+
+
+def memory_kb(pid):
+    """smaps_rollup から {'rss', 'pss', 'uss'}（KiB）"""
+    values = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[1].isdigit():
+                values[parts[0].rstrip(':')] = int(parts[1])
+    return {
+        'rss': values.get('Rss', 0),
+        'pss': values.get('Pss', 0),
+        'uss': values.get('Private_Clean', 0) + values.get('Private_Dirty', 0),
+    }
+
+
+def get(url):
+    try:
+        with urllib.request.urlopen(url, timeout=5) as resp:
+            return resp.status
+    except OSError:
+        return None
+
+
+def run_case(worker_class, preload, workers, n_requests):
+    port = free_port()
+    env = dict(
+        os.environ,
+        PORT=str(port),
+        WEB_WORKER_CLASS=worker_class,
+        WEB_CONCURRENCY=str(workers),
+        GUNICORN_PRELOAD='true' if preload else 'false',
+        WEB_ACCESSLOG='',
+    )
+    url = f'http://127.0.0.1:{port}/landing'
+
+    t0 = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'wsgi:app'],
+        cwd=BASE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        first = None
+        ready = None
+        deadline = time.monotonic() + 60
+        while time.monotonic() < deadline and (first is None or ready is None):
+            if first is None and get(url) == 200:
+                first = time.perf_counter() - t0
+            if ready is None and len(children(proc.pid)) >= workers:
+                ready = time.perf_counter() - t0
+            time.sleep(0.01)
+        if first is None:
+            raise RuntimeError(f"{worker_class} preload={preload}: 起動しませんでした")
+
+        # 全ワーカーにテンプレートなどを読み込ませてから測る
+        for _ in range(n_requests):
+            get(url)
+
+        pids = children(proc.pid)
+        mem = [memory_kb(pid) for pid in pids]
+        master = memory_kb(proc.pid)
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        proc.wait(timeout=30)
+
+    n = max(len(mem), 1)
+    return {
+        'first': first * 1000,
+        'ready': (ready or 0) * 1000,
+        'workers': len(mem),
+        'rss': sum(m['rss'] for m in mem) / n,
+        'pss': sum(m['pss'] for m in mem) / n,
+        'uss': sum(m['uss'] for m in mem) / n,
+        'total_pss': sum(m['pss'] for m in mem) + master['pss'],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="gunicorn の起動時間とワーカーごとのメモリ")
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--requests', type=int, default=200)
+    args = parser.parse_args(argv)
+
+    # マイグレーション済みの一時 DB（DATABASE_URL は make_app が環境変数に入れる）
+    make_app()
+
+    print(f"workers={args.workers} requests={args.requests}")
+    print(f"{'class':<8} {'preload':<8} {'first ms':>9} {'ready ms':>9} "
+          f"{'RSS/wkr MiB':>12} {'PSS/wkr MiB':>12} {'USS/wkr MiB':>12} {'total PSS MiB':>14}")
+    for worker_class, preload in CASES:
+        r = run_case(worker_class, preload, args.workers, args.requests)
+        print(f"{worker_class:<8} {str(preload):<8} {r['first']:>9.0f} {r['ready']:>9.0f} "
+              f"{r['rss'] / 1024:>12.1f} {r['pss'] / 1024:>12.1f} {r['uss'] / 1024:>12.1f} "
+              f"{r['total_pss'] / 1024:>14.1f}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
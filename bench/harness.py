@@ -0,0 +1,105 @@
+# bench/harness.py
+# 検証スクリプト共通：一時 DB でアプリを起動し、最小データを投入する
+
+import os
+import tempfile
+from contextlib import contextmanager
+from datetime import date, timedelta
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+MIGRATIONS_DIR = os.path.join(BASE_DIR, 'migrations')
+
+DEFAULT_PIN = "1234"
+
+
+def make_app(database_url=None):
+    """
+    検証用アプリを生成し、マイグレーションを最新まで適用する。
+    database_url 省略時は一時ディレクトリの SQLite を使う。
+    """
+    if database_url is None:
+        tmpdir = tempfile.mkdtemp(prefix='jantomo-bench-')
+        database_url = f"sqlite:///{os.path.join(tmpdir, 'bench.db')}"
+    os.environ['DATABASE_URL'] = database_url
+    os.environ.setdefault('JOBS_ENABLED', 'false')
+
+    from app import create_app
+    from flask_migrate import upgrade
+
+    app = create_app()
+    app.config.update(TESTING=True, WTF_CSRF_ENABLED=False)
+
+    with app.app_context():
+        upgrade(directory=MIGRATIONS_DIR)
+
+    return app
+
+
+def hash_pin(pin=DEFAULT_PIN):
+    """ハッシュ化は重いので、投入データでは 1 回だけ計算して使い回す"""
+    from services.hashing import pin_hasher
+    return pin_hasher.hash(pin)
+
+
+def seed_minimal(app):
+    """
+    全ルートを一通り叩けるだけの最小データを投入する。
+
+    alice ↔ bob（承認済み） / carol → alice（承認待ち） / dave（無関係）
+    """
+    from models import db, User, Schedule, ScheduleMonth, Friend
+
+    hashed = hash_pin()
+    today = date.today()
+    monday = today - timedelta(days=today.weekday())
+
+    with app.app_context():
+        users = {}
+        for name in ('alice', 'bob', 'carol', 'dave'):
+            u = User(username=name, pin=hashed)
+            db.session.add(u)
+            users[name] = u
+        db.session.flush()
+
+        db.session.add(Friend(**Friend.values(users['alice'].id, users['bob'].id, 'accepted')))
+        db.session.add(Friend(**Friend.values(users['carol'].id, users['alice'].id, 'pending')))
+
+        for i, slot in enumerate(('昼', '夜', '両方')):
+            d = monday + timedelta(days=i)
+            db.session.add(Schedule(user_id=users['alice'].id, date=d, time_type=slot))
+            db.session.add(Schedule(user_id=users['bob'].id, date=d, time_type=slot))
+
+        old = today - timedelta(days=120)
+        db.session.add(Schedule(user_id=users['dave'].id, date=old, time_type='昼'))
+        db.session.flush()
+        ScheduleMonth.rebuild()
+
+        db.session.commit()
+        return {name: u.id for name, u in users.items()}
+
+
+def login(client, username, pin=DEFAULT_PIN):
+    return client.post('/login', data={'username': username, 'pin': pin})
+
+
+@contextmanager
+def record_statements():
+    """
+    実行された SQL を (statement, parameters) のリストに記録する。
+    create_app を呼び直すルートもあるため、Engine クラス全体に仕掛ける。
+    """
+    statements = []
+
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        if executemany and parameters:
+            parameters = parameters[0]
+        statements.append((statement, parameters))
+
+    event.listen(Engine, 'before_cursor_execute', _before)
+    try:
+        yield statements
+    finally:
+        event.remove(Engine, 'before_cursor_execute', _before)
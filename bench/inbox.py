@@ -0,0 +1,114 @@
+# bench/inbox.py
+# 承認待ちが大量（既定 1000 件）のユーザーの /friend/inbox
+#   - 表示：全件 + 1 件ずつ User を引く（旧実装）と JOIN + keyset ページング（現実装）
+#   - 承認：1 件ずつ POST（旧操作）と選択をまとめて 1 回の POST（一括）
+#
+#   python -m bench.inbox [--pending 1000] [--rounds 20] [--database-url URL]
+
+import argparse
+import statistics
+import sys
+import time
+
+from bench.harness import make_app, hash_pin, login, record_statements
+
+
+def legacy_inbox(user_id):
+    """変更前の friend_inbox と同じ読み込み（承認待ちを全件取り、申請元を 1 件ずつ）"""
+    from models import db, Friend, User
+
+    requests = Friend.query.filter(
+        db.or_(Friend.low_id == user_id, Friend.high_id == user_id),
+        Friend.requester_id != user_id,
+        Friend.status == 'pending'
+    ).all()
+    return [u for u in (db.session.get(User, r.requester_id) for r in requests) if u]
+
+
+def seed(app, n_pending):
+    from models import db, User, Friend
+
+    hashed = hash_pin()
+    with app.app_context():
+        owner = User(username='popular', pin=hashed)
+        db.session.add(owner)
+        db.session.flush()
+        db.session.execute(db.insert(User), [
+            {'username': f'fan{i}', 'pin': hashed} for i in range(n_pending)
+        ])
+        fan_ids = db.session.execute(
+            db.select(User.id).where(User.username.like('fan%')).order_by(User.id)
+        ).scalars().all()
+        db.session.execute(db.insert(Friend), [
+            Friend.values(fid, owner.id, 'pending') for fid in fan_ids
+        ])
+        db.session.commit()
+        return owner.id, fan_ids
+
+
+def measure(fn, rounds):
+    latencies, counts = [], []
+    for _ in range(rounds):
+        with record_statements() as statements:
+            t0 = time.perf_counter()
+            fn()
+            latencies.append((time.perf_counter() - t0) * 1000)
+        counts.append(len(statements))
+    return statistics.mean(counts), statistics.median(latencies), max(latencies)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="大量の友達申請がある受信箱のベンチマーク")
+    parser.add_argument('--pending', type=int, default=1000)
+    parser.add_argument('--rounds', type=int, default=20)
+    parser.add_argument('--database-url', default=None)
+    args = parser.parse_args(argv)
+
+    app = make_app(args.database_url)
+    owner_id, fan_ids = seed(app, args.pending)
+
+    from models import db
+    from routes.friend import INBOX_PAGE_SIZE
+
+    client = app.test_client()
+    login(client, 'popular')
+
+    print(f"pending={args.pending} page_size={INBOX_PAGE_SIZE} rounds={args.rounds}")
+    print(f"{'case':<28} {'queries':>8} {'median ms':>10} {'max ms':>8}")
+
+    def legacy():
+        with app.app_context():
+            legacy_inbox(owner_id)
+            db.session.remove()
+
+    rows = [
+        ('read: legacy (all + N+1)', measure(legacy, args.rounds)),
+        ('read: first page (GET)', measure(lambda: client.get('/friend/inbox'), args.rounds)),
+        ('read: deep page (GET)', measure(
+            lambda: client.get(f'/friend/inbox?after={fan_ids[-INBOX_PAGE_SIZE]}'), args.rounds)),
+    ]
+
+    # 承認：1 ページ分を 1 件ずつ POST と、別の 1 ページ分をまとめて POST
+    single_ids = fan_ids[:INBOX_PAGE_SIZE]
+    bulk_ids = fan_ids[INBOX_PAGE_SIZE:INBOX_PAGE_SIZE * 2]
+
+    with record_statements() as statements:
+        t0 = time.perf_counter()
+        for fid in single_ids:
+            client.post('/friend/inbox', data={'action': 'accept', 'from_user_id': fid})
+        elapsed = (time.perf_counter() - t0) * 1000
+    rows.append((f'accept {len(single_ids)}: one by one', (len(statements), elapsed, elapsed)))
+
+    with record_statements() as statements:
+        t0 = time.perf_counter()
+        client.post('/friend/inbox', data={'action': 'accept', 'from_user_id': bulk_ids})
+        elapsed = (time.perf_counter() - t0) * 1000
+    rows.append((f'accept {len(bulk_ids)}: bulk', (len(statements), elapsed, elapsed)))
+
+    for name, (queries, median, worst) in rows:
+        print(f"{name:<28} {queries:>8.1f} {median:>10.2f} {worst:>8.2f}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,168 @@
+# bench/load.py
+# 起動中のサーバーへ、実際の利用に近い操作の混在で負荷をかける
+#
+#   # 1) データ投入（bench.seed）
+#   python -m bench.seed --database-url sqlite:////tmp/load.db --users 2000
+#   # 2) サーバー起動（同じ DB を指す）
+#   DATABASE_URL=sqlite:////tmp/load.db WEB_CONCURRENCY=4 gunicorn -c gunicorn.conf.py wsgi:app
+#   # 3) 負荷
+#   python -m bench.load --base-url http://127.0.0.1:8000 --concurrency 16 --seconds 30
+#
+# 仮想ユーザーごとに /login からログインし、週間表示・保存・承認待ち件数・受信箱を
+# 重み付きで繰り返す。エンドポイントごとの p50/p95/p99 と毎秒件数を表示する。
+
+import argparse
+import http.cookiejar
+import json
+import random
+import re
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+from datetime import date, timedelta
+
+from bench.harness import DEFAULT_PIN
+
+CSRF_INPUT = re.compile(r'name="csrf_token" value="([^"]+)"')
+CSRF_WINDOW = re.compile(r'window\.CSRF_TOKEN = "([^"]+)"')
+
+# (名前, 重み)
+MIX = (
+    ('weekly', 50),
+    ('pending_count', 25),
+    ('save', 15),
+    ('inbox', 10),
+)
+
+SLOTS = ('昼', '夜', '両方', '')
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    """リダイレクト先までは計測に含めない"""
+
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class VirtualUser:
+    def __init__(self, base_url, username, rng):
+        self.base_url = base_url.rstrip('/')
+        self.username = username
+        self.rng = rng
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()),
+            _NoRedirect(),
+        )
+        self.csrf = None
+
+    def request(self, path, data=None):
+        body = urllib.parse.urlencode(data).encode('utf-8') if data is not None else None
+        try:
+            with self.opener.open(self.base_url + path, data=body, timeout=30) as resp:
+                return resp.status, resp.read().decode('utf-8', 'replace')
+        except urllib.error.HTTPError as e:
+            return e.code, e.read().decode('utf-8', 'replace')
+
+    def login(self):
+        _, html = self.request('/login')
+        token = CSRF_INPUT.search(html).group(1)
+        status, _ = self.request('/login', {'username': self.username, 'pin': DEFAULT_PIN, 'csrf_token': token})
+        if status != 302:
+            raise RuntimeError(f"login failed for {self.username}: {status}")
+        # 保存用の CSRF トークンは日程入力画面から取る
+        _, html = self.request('/schedule')
+        self.csrf = CSRF_WINDOW.search(html).group(1)
+
+    def weekly(self):
+        return self.request(f'/schedule/weekly?week={self.rng.randint(-1, 2)}')[0]
+
+    def pending_count(self):
+        return self.request('/friend/pending-count')[0]
+
+    def inbox(self):
+        return self.request('/friend/inbox')[0]
+
+    def save(self):
+        monday = date.today() - timedelta(days=date.today().weekday())
+        payload = [
+            {'date': (monday + timedelta(days=d)).isoformat(), 'slot': self.rng.choice(SLOTS)}
+            for d in self.rng.sample(range(7), self.rng.randint(1, 3))
+        ]
+        return self.request('/schedule/save?week=0', {'payload': json.dumps(payload), 'csrf_token': self.csrf})[0]
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    idx = min(len(sorted_values) - 1, max(0, int(round(q * len(sorted_values))) - 1))
+    return sorted_values[idx]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="エンドツーエンド負荷試験")
+    parser.add_argument('--base-url', default='http://127.0.0.1:5000')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=30)
+    parser.add_argument('--users', type=int, default=200, help="ログインに使う投入済みユーザー数")
+    parser.add_argument('--prefix', default='load')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    names = [n for n, _ in MIX]
+    weights = [w for _, w in MIX]
+
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    lock = threading.Lock()
+
+    vusers = [
+        VirtualUser(args.base_url, f"{args.prefix}{rng.randrange(args.users)}", random.Random(args.seed + i))
+        for i in range(args.concurrency)
+    ]
+    for vu in vusers:
+        vu.login()
+
+    deadline = time.perf_counter() + args.seconds
+
+    def run(vu):
+        while time.perf_counter() < deadline:
+            name = vu.rng.choices(names, weights)[0]
+            t0 = time.perf_counter()
+            try:
+                status = getattr(vu, name)()
+            except OSError:
+                status = 0
+            elapsed = (time.perf_counter() - t0) * 1000
+            with lock:
+                latencies[name].append(elapsed)
+                if status >= 400 or status == 0:
+                    errors[name] += 1
+
+    threads = [threading.Thread(target=run, args=(vu,)) for vu in vusers]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - started
+
+    print(f"base_url={args.base_url} concurrency={args.concurrency} seconds={wall:.1f}")
+    print(f"{'endpoint':<15} {'count':>7} {'req/s':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'errors':>7}")
+    total = 0
+    for name in names:
+        values = sorted(latencies[name])
+        total += len(values)
+        print(f"{name:<15} {len(values):>7} {len(values) / wall:>8.1f} "
+              f"{percentile(values, 0.50):>8.1f} {percentile(values, 0.95):>8.1f} "
+              f"{percentile(values, 0.99):>8.1f} {errors[name]:>7}")
+    print(f"{'total':<15} {total:>7} {total / wall:>8.1f}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,95 @@
+# bench/login.py
+# 1 プロセス（= gunicorn ワーカー 1 つ相当）での /login スループット
+# bcrypt コストと計算スレッド数の組み合わせごとに、同時ログインを流して計測する。
+#
+#   python -m bench.login [--concurrency 16] [--seconds 5] [--rounds 10 12] [--workers 1 2 4]
+
+import argparse
+import statistics
+import sys
+import threading
+import time
+
+from bench.harness import make_app, DEFAULT_PIN
+
+
+def seed_users(app, n, rounds):
+    from models import db, User
+    from services.hashing import pin_hasher
+
+    pin_hasher.rounds = rounds
+    hashed = pin_hasher.hash(DEFAULT_PIN)
+    prefix = f"login{rounds}_"
+    with app.app_context():
+        db.session.execute(db.insert(User), [
+            {'username': f'{prefix}{i}', 'pin': hashed} for i in range(n)
+        ])
+        db.session.commit()
+    return [f'{prefix}{i}' for i in range(n)]
+
+
+def run(app, usernames, concurrency, seconds):
+    deadline = time.perf_counter() + seconds
+    latencies, statuses = [], []
+    lock = threading.Lock()
+
+    def worker(idx):
+        client = app.test_client()
+        n = 0
+        while time.perf_counter() < deadline:
+            name = usernames[(idx + n * concurrency) % len(usernames)]
+            n += 1
+            t0 = time.perf_counter()
+            resp = client.post('/login', data={'username': name, 'pin': DEFAULT_PIN})
+            elapsed = (time.perf_counter() - t0) * 1000
+            with lock:
+                latencies.append(elapsed)
+                statuses.append(resp.status_code)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - started
+
+    ok = [l for l, s in zip(latencies, statuses) if s == 302]
+    shed = sum(1 for s in statuses if s == 503)
+    return len(ok) / wall, shed, ok
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="ログインのスループット計測")
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--rounds', type=int, nargs='+', default=[10, 12])
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--queue', type=int, default=8)
+    parser.add_argument('--database-url', default=None)
+    args = parser.parse_args(argv)
+
+    app = make_app(args.database_url)
+
+    from services.hashing import pin_hasher
+
+    print(f"concurrency={args.concurrency} queue={args.queue}")
+    print(f"{'rounds':>6} {'threads':>7} {'logins/s':>9} {'503':>5} {'p50 ms':>8} {'p95 ms':>8}")
+    for rounds in args.rounds:
+        usernames = seed_users(app, args.concurrency * 4, rounds)
+        for workers in args.workers:
+            pin_hasher.rounds = rounds
+            pin_hasher.workers = workers
+            pin_hasher.queue = args.queue
+            pin_hasher._executor = None
+
+            throughput, shed, ok = run(app, usernames, args.concurrency, args.seconds)
+            ok.sort()
+            p50 = statistics.median(ok) if ok else 0
+            p95 = ok[int(len(ok) * 0.95) - 1] if len(ok) >= 20 else (ok[-1] if ok else 0)
+            print(f"{rounds:>6} {workers:>7} {throughput:>9.1f} {shed:>5} {p50:>8.1f} {p95:>8.1f}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
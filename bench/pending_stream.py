@@ -0,0 +1,157 @@
+# bench/pending_stream.py
+# 承認待ち件数の SSE（/friend/pending-stream）の動作確認
+#   - 同じプロセスでの申請：別スレッドからの POST がすぐ届く（pending_hub.publish）
+#   - 他ワーカーでの申請：publish なしで DB だけ変えても、ハートビートの数え直しで届く
+#   - 接続数の上限：超えたら 503 + Retry-After（クライアントはポーリングに切り替える）
+#   - 切断すると購読が外れる
+#
+#   python -m bench.pending_stream [--heartbeat 0.5] [--max-connections 2]
+
+import argparse
+import json
+import queue
+import sys
+import threading
+import time
+
+from bench.harness import make_app, seed_minimal, login, hash_pin
+
+
+class Stream:
+    """SSE を別スレッドで読み、count イベントをキューに積む"""
+
+    def __init__(self, client):
+        self.resp = client.get('/friend/pending-stream', buffered=False)
+        self.events = queue.Queue()
+        self.heartbeats = 0
+        self._stop = threading.Event()
+        self._thread = None
+        if self.resp.status_code == 200:
+            self._thread = threading.Thread(target=self._read, daemon=True)
+            self._thread.start()
+
+    def _read(self):
+        try:
+            for chunk in self.resp.response:
+                text = chunk.decode() if isinstance(chunk, bytes) else chunk
+                if text.startswith(': heartbeat'):
+                    self.heartbeats += 1
+                elif text.startswith('event: count'):
+                    data = text.split('data: ', 1)[1]
+                    self.events.put((time.perf_counter(), json.loads(data)['count']))
+                if self._stop.is_set():
+                    break
+        finally:
+            # ジェネレーターは読んでいるスレッドで閉じる（finally で購読が外れる）
+            self.resp.close()
+
+    def next_count(self, timeout):
+        """(届いた時刻, 件数)。timeout 秒以内に来なければ None"""
+        try:
+            return self.events.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self, timeout):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="承認待ち件数の SSE の動作確認")
+    parser.add_argument('--heartbeat', type=float, default=0.5)
+    parser.add_argument('--max-connections', type=int, default=2)
+    parser.add_argument('--database-url', default=None)
+    args = parser.parse_args(argv)
+
+    app = make_app(args.database_url)
+    app.config.update(
+        PENDING_STREAM_HEARTBEAT=args.heartbeat,
+        PENDING_STREAM_MAX_SECONDS=60,
+        PENDING_STREAM_MAX_CONNECTIONS=args.max_connections,
+    )
+    ids = seed_minimal(app)
+
+    from models import db, User, Friend
+    from services.pubsub import pending_hub
+
+    with app.app_context():
+        erin = User(username='erin', pin=hash_pin())
+        db.session.add(erin)
+        db.session.commit()
+        ids['erin'] = erin.id
+
+    clients = {}
+    for name in ('alice', 'bob', 'carol', 'dave'):
+        clients[name] = app.test_client()
+        login(clients[name], name)
+
+    failures = []
+    wait = args.heartbeat * 3 + 1
+
+    def check(label, ok, detail=''):
+        print(f"{'ok  ' if ok else 'FAIL'} {label}{'  ' + detail if detail else ''}")
+        if not ok:
+            failures.append(label)
+
+    # 1) 接続直後の件数（carol → alice の 1 件）
+    alice = Stream(clients['alice'])
+    check("alice: 200 text/event-stream",
+          alice.resp.status_code == 200 and alice.resp.mimetype == 'text/event-stream',
+          str(alice.resp.status_code))
+    first = alice.next_count(wait)
+    check("alice: 接続直後の件数", first is not None and first[1] == 1, str(first and first[1]))
+
+    # 2) 同じプロセスでの申請：別スレッドから dave が申請する
+    def publisher():
+        publisher.t0 = time.perf_counter()
+        clients['dave'].post('/friend/request', data={'username': 'alice'})
+
+    t = threading.Thread(target=publisher)
+    t.start()
+    t.join()
+    pushed = alice.next_count(wait)
+    check("同じプロセスの申請が届く", pushed is not None and pushed[1] == 2,
+          f"{(pushed[0] - publisher.t0) * 1000:.1f} ms" if pushed else 'timeout')
+
+    # 3) 他ワーカーでの申請：publish せずに DB だけ変える
+    def other_worker():
+        with app.app_context():
+            db.session.add(Friend(**Friend.values(ids['erin'], ids['alice'], 'pending')))
+            db.session.commit()
+        other_worker.t0 = time.perf_counter()
+
+    t = threading.Thread(target=other_worker)
+    t.start()
+    t.join()
+    polled = alice.next_count(wait)
+    check("他ワーカーの申請がハートビートで届く", polled is not None and polled[1] == 3,
+          f"{(polled[0] - other_worker.t0) * 1000:.1f} ms (heartbeat {args.heartbeat}s)" if polled else 'timeout')
+    check("変化がないときはハートビートだけ", alice.next_count(args.heartbeat * 2) is None and alice.heartbeats > 0,
+          f"heartbeats={alice.heartbeats}")
+
+    # 4) 接続数の上限
+    extra = [Stream(clients[name]) for name in ('bob', 'carol', 'dave')]
+    statuses = [alice.resp.status_code] + [s.resp.status_code for s in extra]
+    opened = statuses.count(200)
+    rejected = [s for s in extra if s.resp.status_code == 503]
+    check(f"上限 {args.max_connections} 本まで接続できる", opened == args.max_connections, str(statuses))
+    check("上限を超えたら 503 + Retry-After",
+          bool(rejected) and all(s.resp.headers.get('Retry-After') for s in rejected))
+    check("hub の接続数 = 上限", pending_hub.stats()['connections'] == args.max_connections,
+          str(pending_hub.stats()))
+
+    # 5) 切断すると購読が外れ、また接続できる
+    for s in [alice] + extra:
+        s.close(wait)
+    check("切断で購読が外れる", pending_hub.stats()['connections'] == 0, str(pending_hub.stats()))
+    again = Stream(clients['carol'])
+    check("切断後はまた接続できる", again.resp.status_code == 200, str(again.resp.status_code))
+    again.close(wait)
+
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
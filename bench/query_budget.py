@@ -0,0 +1,155 @@
+# bench/query_budget.py
+# 全 Blueprint のルートが 1 リクエストで発行する SQL の件数を数え、
+#   - 宣言した上限（QUERY_BUDGETS）を超えたら失敗
+#   - 同じ形のクエリを 1 リクエスト内で繰り返していたら（N+1）失敗
+#
+#   python -m bench.query_budget
+#
+# シナリオは bench.query_plans と共通。友達や申請が 1 件だけだと N+1 が見えないので、
+# 最小データに加えて alice へ複数の承認待ち・承認済みを入れてから実行する。
+
+import re
+import sys
+
+from bench.harness import make_app, seed_minimal, hash_pin
+from bench.query_plans import run_scenarios, missing_endpoints
+
+# エンドポイントごとの 1 リクエストあたりの上限（シナリオ中の最大値で判定）
+QUERY_BUDGETS = {
+    'main.landing': 1,
+    'index': 1,
+    'service_worker': 1,
+    'auth.register': 4,
+    'auth.login': 4,
+    'auth.logout': 2,
+    'schedule.schedule': 2,
+    'schedule.save_schedule': 6,
+    'schedule.api_schedule_patch': 7,
+    'schedule.api_csrf_token': 1,
+    'schedule.weekly': 3,
+    'schedule.api_weekly': 3,
+    'availability.availability': 4,
+    'availability.api_availability': 4,
+    'profile.profile': 1,
+    'friend.friend_list': 2,
+    'friend.friend_list_page': 2,
+    'friend.friend_request': 3,
+    'friend.friend_search': 1,
+    'friend.pending_count': 1,
+    'friend.pending_stream': 1,
+    'friend.friend_inbox': 2,
+    'friend.friend_delete': 2,
+    'calendar.calendar': 1,
+    'calendar.issue_token': 2,
+    'calendar.revoke_token': 1,
+    'calendar.feed': 5,
+    'maintenance.cleanup': 10,
+    'maintenance.stats': 1,
+}
+
+# Cookie だけで来た端末は auto_login のトークン照合（Device JOIN User）が 1 件増える
+AUTO_LOGIN_ALLOWANCE = {'cookie': 1}
+
+# IN (?, ?, ?) や VALUES (...), (...) の個数違いは同じ形とみなす
+_PLACEHOLDER_LIST = re.compile(r'\((?:\s*\?\s*,)+\s*\?\s*\)')
+_VALUES_LIST = re.compile(r'(\(\?\))(?:\s*,\s*\(\?\))+')
+_WHITESPACE = re.compile(r'\s+')
+
+# 同じ形でも繰り返しが正当なもの（バッチ削除のループなど）
+REPEAT_ALLOWED = {
+    'maintenance.cleanup',
+}
+
+EXTRA_FRIENDS = 5
+
+
+def shape(statement):
+    s = _WHITESPACE.sub(' ', statement.strip())
+    s = _PLACEHOLDER_LIST.sub('(?)', s)
+    return _VALUES_LIST.sub(r'\1', s)
+
+
+def seed_fanout(app, ids, n=EXTRA_FRIENDS):
+    """alice に承認待ちと承認済みを n 件ずつ足す（1 件だと N+1 が見えない）"""
+    from models import db, User, Friend
+
+    hashed = hash_pin()
+    with app.app_context():
+        for i in range(n):
+            pending = User(username=f'pending{i}', pin=hashed)
+            accepted = User(username=f'accepted{i}', pin=hashed)
+            db.session.add_all([pending, accepted])
+            db.session.flush()
+            db.session.add(Friend(**Friend.values(pending.id, ids['alice'], 'pending')))
+            db.session.add(Friend(**Friend.values(ids['alice'], accepted.id, 'accepted')))
+        db.session.commit()
+
+
+def check(results):
+    """
+    (違反メッセージのリスト, エンドポイントごとの (最大件数, そのときの上乗せ分)) を返す。
+    件数が同じなら上乗せの少ないほうを残す（表の max と limit を見比べられるように）。
+    """
+    failures = []
+    worst = {}
+
+    for route, endpoint, status, statements, client_name in results:
+        count = len(statements)
+        allowance = AUTO_LOGIN_ALLOWANCE.get(client_name, 0)
+        if endpoint not in worst or (count, -allowance) > (worst[endpoint][0], -worst[endpoint][1]):
+            worst[endpoint] = (count, allowance)
+
+        budget = QUERY_BUDGETS.get(endpoint)
+        if budget is None:
+            failures.append(f"[{route}] {endpoint} の上限が QUERY_BUDGETS にありません")
+        elif count > budget + allowance:
+            failures.append(f"[{route}] {count} queries > budget {budget}" +
+                            (f" + auto-login {allowance}" if allowance else ""))
+
+        if endpoint in REPEAT_ALLOWED:
+            continue
+        shapes = {}
+        for statement, _ in statements:
+            key = shape(statement)
+            shapes[key] = shapes.get(key, 0) + 1
+        for key, n in shapes.items():
+            if n > 1:
+                failures.append(f"[{route}] 同じ形のクエリが {n} 回（N+1 の疑い）\n  {key}")
+
+    return failures, worst
+
+
+def main():
+    app = make_app()
+    ids = seed_minimal(app)
+    seed_fanout(app, ids)
+
+    results = run_scenarios(app, ids)
+    for route, _, status, _, _ in results:
+        if status >= 500:
+            print(f"ERROR {route} -> {status}")
+            return 1
+
+    missing = missing_endpoints(app, results)
+    if missing:
+        print("シナリオ未登録のルート: " + ", ".join(missing))
+        return 1
+
+    failures, worst = check(results)
+
+    # limit = budget + 最大件数を出したクライアントの上乗せ分（Cookie だけの端末は auto_login の 1 件）
+    print(f"{'endpoint':<30} {'max':>4} {'budget':>6} {'limit':>6}")
+    for endpoint in sorted(worst):
+        count, allowance = worst[endpoint]
+        budget = QUERY_BUDGETS.get(endpoint)
+        limit = '-' if budget is None else budget + allowance
+        note = f"  (budget + auto-login {allowance})" if budget is not None and allowance else ""
+        print(f"{endpoint:<30} {count:>4} {budget if budget is not None else '-':>6} {limit:>6}{note}")
+    for message in failures:
+        print("\n" + message)
+
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
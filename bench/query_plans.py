@@ -0,0 +1,200 @@
+# bench/query_plans.py
+# 全 Blueprint が発行するクエリに EXPLAIN QUERY PLAN をかけ、
+# テーブルのフルスキャンが 1 つでもあれば失敗する（SQLite）。
+#
+#   python -m bench.query_plans
+
+import json
+import re
+import sys
+from datetime import date, timedelta
+
+from bench.harness import make_app, seed_minimal, login, record_statements
+
+# SCAN friend / SCAN friend AS f はフルスキャン（USING INDEX 付きは除外）
+TABLE_SCAN = re.compile(r'^SCAN (\w+)(?: AS \w+)?$')
+# UNION などのサブクエリ（CO-ROUTINE / MATERIALIZE）の結果を読む SCAN はテーブルではない
+SUBQUERY = re.compile(r'^(?:CO-ROUTINE|MATERIALIZE) (\w+)$')
+
+CLEANUP_KEY = "cleanup_0423_secret"
+
+
+def build_scenarios(ids):
+    """
+    (クライアント名, メソッド, パス, フォーム) の一覧（PATCH のフォームは JSON で送る）。
+    新しいルートを追加したらここにも追加すること（未実行のルートがあると失敗する）。
+    """
+    today = date.today()
+    monday = today - timedelta(days=today.weekday())
+
+    return [
+        ('anon', 'GET', '/landing', None),
+        ('anon', 'GET', '/register', None),
+        ('anon', 'GET', '/login', None),
+        ('anon', 'POST', '/register', {'username': 'erin', 'pin': '1234'}),
+        ('alice', 'POST', '/login', {'username': 'alice', 'pin': '1234'}),
+
+        ('alice', 'GET', '/', None),
+        ('alice', 'GET', '/sw.js', None),
+        ('alice', 'GET', '/schedule', None),
+        ('alice', 'GET', '/schedule?week=1', None),
+        ('alice', 'POST', '/schedule/save?week=0', {
+            # 更新・新規・削除をすべて通す
+            'payload': json.dumps([
+                {'date': monday.isoformat(), 'slot': '両方'},
+                {'date': (monday + timedelta(days=1)).isoformat(), 'slot': ''},
+                {'date': (monday + timedelta(days=6)).isoformat(), 'slot': '昼'},
+            ])
+        }),
+        ('alice', 'PATCH', '/api/schedule', {
+            # 2 週にまたがる差分（更新・新規・削除）
+            'changes': [
+                {'date': (monday + timedelta(days=2)).isoformat(), 'slot': '夜'},
+                {'date': (monday + timedelta(days=8)).isoformat(), 'slot': '昼'},
+                {'date': (monday + timedelta(days=6)).isoformat(), 'slot': ''},
+            ]
+        }),
+        ('alice', 'PATCH', '/api/schedule', {'changes': [{'date': monday.isoformat(), 'slot': '両方'}]}),
+        ('alice', 'GET', '/api/csrf-token', None),
+        ('alice', 'GET', '/schedule/weekly', None),
+        ('alice', 'GET', '/api/weekly?weeks=4', None),
+        ('alice', 'GET', '/availability?k=1', None),
+        ('alice', 'GET', '/api/availability?weeks=12&k=1', None),
+        ('alice', 'GET', '/profile', None),
+        ('alice', 'GET', '/friends', None),
+        ('alice', 'GET', '/friends?sort=date&q=b&after=100', None),
+        ('alice', 'GET', '/friends/page?after=1&after_name=a', None),
+        ('alice', 'GET', '/friend/request', None),
+        ('alice', 'POST', '/friend/request', {'username': 'dave'}),
+        ('alice', 'GET', '/friend/search?q=B', None),
+        ('alice', 'GET', '/friend/search?q=', None),
+        ('alice', 'GET', '/friend/pending-count', None),
+        ('alice', 'GET', '/friend/pending-stream', None),
+        ('alice', 'GET', '/friend/inbox', None),
+        ('alice', 'GET', '/friend/inbox?after=1', None),
+        ('alice', 'POST', '/friend/inbox', {'action': 'accept', 'from_user_id': ids['carol']}),
+        ('alice', 'POST', '/friend/inbox', {'action': 'reject', 'from_user_id': [ids['carol'], ids['dave']]}),
+        ('alice', 'POST', '/friend/delete', {'friend_id': ids['bob']}),
+        ('alice', 'GET', '/calendar', None),
+        ('calendar', 'GET', f"/calendar/feed/{ids['calendar_token']}.ics", None),
+        ('calendar', 'GET', '/calendar/feed/unknown.ics', None),
+        ('alice', 'POST', '/calendar/token', {}),
+        ('alice', 'POST', '/calendar/token/revoke', {}),
+        ('alice', 'GET', f'/__cleanup?key={CLEANUP_KEY}', None),
+        ('anon', 'GET', f'/__stats?key={CLEANUP_KEY}', None),
+
+        # Cookie だけ持っている端末（auto_login 経由）
+        ('cookie', 'GET', '/schedule/weekly', None),
+        ('alice', 'GET', '/logout', None),
+    ]
+
+
+def explain(conn, statement, parameters):
+    rows = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, tuple(parameters or ())).fetchall()
+    return [row[-1] for row in rows]
+
+
+def run_scenarios(app, ids):
+    """
+    build_scenarios を順に実行し、リクエストごとに
+    (ルート表示, エンドポイント, ステータス, [(statement, parameters)], クライアント名) を返す。
+    """
+    from models import db, Device, CalendarFeed
+
+    clients = {
+        'anon': app.test_client(), 'alice': app.test_client(), 'cookie': app.test_client(),
+        # カレンダーアプリ（Cookie もセッションも持たない）
+        'calendar': app.test_client(),
+    }
+    login(clients['alice'], 'alice')
+    login(clients['cookie'], 'bob')
+
+    # セッションを捨てて Cookie のトークンだけを残す
+    with app.app_context():
+        token = Device.query.filter_by(user_id=ids['bob'], is_revoked=False).first().token
+    clients['cookie'] = app.test_client()
+    clients['cookie'].set_cookie('device_token', token)
+
+    # カレンダー購読のトークン（フィードの URL に埋め込む）
+    ids = dict(ids, calendar_token='calendar-token-alice')
+    with app.app_context():
+        db.session.add(CalendarFeed(user_id=ids['alice'], token=ids['calendar_token']))
+        db.session.commit()
+
+    results = []
+    adapter = app.url_map.bind('localhost')
+
+    for client_name, method, path, form in build_scenarios(ids):
+        client = clients[client_name]
+        with record_statements() as statements:
+            if method == 'GET':
+                resp = client.get(path)
+            elif method == 'PATCH':
+                resp = client.patch(path, json=form)
+            else:
+                resp = client.post(path, data=form)
+            # ストリーミング応答は最初のチャンクだけ読んで閉じる
+            if resp.is_streamed:
+                next(resp.response, None)
+            resp.close()
+        endpoint = adapter.match(path.split('?')[0], method=method)[0]
+        results.append((f"{method} {path}", endpoint, resp.status_code, list(statements), client_name))
+
+    return results
+
+
+def missing_endpoints(app, results):
+    """シナリオで一度も実行されていないエンドポイント"""
+    endpoints = {rule.endpoint for rule in app.url_map.iter_rules() if rule.endpoint != 'static'}
+    return sorted(endpoints - {r[1] for r in results})
+
+
+def main():
+    app = make_app()
+    ids = seed_minimal(app)
+
+    from models import db
+
+    results = run_scenarios(app, ids)
+    for route, _, status, _, _ in results:
+        if status >= 500:
+            print(f"ERROR {route} -> {status}")
+            return 1
+
+    # 実行されていないルートがないか
+    missing = missing_endpoints(app, results)
+    if missing:
+        print("シナリオ未登録のルート: " + ", ".join(missing))
+        return 1
+
+    captured = [
+        (route, stmt, params)
+        for route, _, _, statements, _ in results
+        for stmt, params in statements
+    ]
+
+    failures = []
+    seen = set()
+    with app.app_context():
+        with db.engine.connect() as conn:
+            for route, statement, params in captured:
+                head = statement.lstrip().split(None, 1)[0].upper()
+                if head not in ('SELECT', 'UPDATE', 'DELETE') or statement in seen:
+                    continue
+                seen.add(statement)
+                details = explain(conn, statement, params)
+                subqueries = {m.group(1) for m in map(SUBQUERY.match, details) if m}
+                for detail in details:
+                    scan = TABLE_SCAN.match(detail)
+                    if scan and scan.group(1) not in subqueries:
+                        failures.append((route, detail, statement))
+
+    print(f"checked {len(seen)} distinct statements over {len(results)} requests")
+    for route, detail, statement in failures:
+        print(f"\n[{route}] {detail}\n  {' '.join(statement.split())}")
+
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,186 @@
+# bench/read_replica.py
+# 読み込み用の複製 DB への振り分け（models.db.RoutingSession）の確認
+#   - ルートごとに primary / replica へ飛んだ SQL の件数
+#   - 書き込んだ本人は DB_REPLICA_PIN_SECONDS の間 primary を読む（自分の変更がすぐ見える）
+#   - 書いていない他の利用者は replica を読む（複製が遅れていれば古い値）
+#   - replica から読んだ値はプロセス内キャッシュに入らず、複製が追いついたら新しい値が見える
+#   - 手動の保持期限ジョブ（GET /__cleanup）は replica を読まず、消えた件数だけを数える
+#
+#   python -m bench.read_replica [--pin-seconds 1]
+#   python -m bench.read_replica --primary-url postgresql://localhost/jantomo --replica-url postgresql://localhost/jantomo_replica
+#
+# SQLite 同士なら primary のファイルを backup API で replica に写して「複製」の代わりにする
+# （写した後の書き込みは replica に届かない＝遅れている複製。最後にもう一度写して追いつかせる）。Postgres 同士のときは
+# replica 側を実際のレプリケーションで追従させておくこと。
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import date, timedelta
+
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+from bench.harness import make_app, seed_minimal, login
+
+
+def copy_sqlite(primary_url, replica_url):
+    src = sqlite3.connect(make_url(primary_url).database)
+    dst = sqlite3.connect(make_url(replica_url).database)
+    with dst:
+        src.backup(dst)
+    src.close()
+    dst.close()
+
+
+@contextmanager
+def count_by_bind(app):
+    """bind（None=primary / 'replica'）ごとの SQL 件数を数える"""
+    from models import db
+
+    counts = {}
+    listeners = []
+    with app.app_context():
+        engines = dict(db.engines)
+    for key, engine in engines.items():
+        name = key or 'primary'
+
+        def _before(conn, cursor, statement, parameters, context, executemany, name=name):
+            counts[name] = counts.get(name, 0) + 1
+
+        event.listen(engine, 'before_cursor_execute', _before)
+        listeners.append((engine, _before))
+    try:
+        yield counts
+    finally:
+        for engine, fn in listeners:
+            event.remove(engine, 'before_cursor_execute', fn)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="読み込み用の複製 DB への振り分けの確認")
+    parser.add_argument('--primary-url', default=None)
+    parser.add_argument('--replica-url', default=None)
+    parser.add_argument('--pin-seconds', type=float, default=1.0)
+    parser.add_argument('--catchup-seconds', type=float, default=2.0,
+                        help="Postgres 同士のとき、複製が追いつくまで待つ秒数")
+    args = parser.parse_args(argv)
+
+    if args.primary_url is None:
+        tmpdir = tempfile.mkdtemp(prefix='jantomo-replica-')
+        args.primary_url = f"sqlite:///{os.path.join(tmpdir, 'primary.db')}"
+        args.replica_url = f"sqlite:///{os.path.join(tmpdir, 'replica.db')}"
+
+    # primary を作ってデータを入れ、replica に写す
+    ids = seed_minimal(make_app(args.primary_url))
+    sqlite_pair = all(make_url(u).get_backend_name() == 'sqlite' for u in (args.primary_url, args.replica_url))
+    if sqlite_pair:
+        copy_sqlite(args.primary_url, args.replica_url)
+
+    os.environ['DATABASE_REPLICA_URL'] = args.replica_url
+    os.environ['DB_REPLICA_PIN_SECONDS'] = str(args.pin_seconds)
+    app = make_app(args.primary_url)
+
+    monday = date.today() - timedelta(days=date.today().weekday())
+    day = (monday + timedelta(days=5)).isoformat()
+    alice, bob = app.test_client(), app.test_client()
+    login(alice, 'alice')
+    login(bob, 'bob')
+    time.sleep(args.pin_seconds)  # ログインの書き込みによる固定が外れるのを待つ
+
+    from services.friend_graph import friend_cache
+    from services.weekly_matrix import weekly_cache
+    from services.jobs import job_runner
+
+    def cache_sizes():
+        return friend_cache.stats()['size'] + weekly_cache.stats()['size']
+
+    def alice_slot(client):
+        data = client.get('/api/weekly').get_json()
+        return data['slots'][day][data['order'].index(ids['alice'])]
+
+    seen = {}
+
+    def bob_weekly(label):
+        # 前回の ETag 付きで取る（古い表が新しい ETag で返る / 304 で残り続けるのを見る）
+        headers = {'If-None-Match': seen['etag']} if 'etag' in seen else {}
+        resp = bob.get('/schedule/weekly', headers=headers)
+        seen[label] = resp.get_data()
+        seen['etag'] = resp.headers.get('ETag')
+        return resp
+
+    def cleanup():
+        """GET /__cleanup と同じく GET のリクエスト中に保持期限ジョブを回し、削除した予定の件数を返す"""
+        with app.test_request_context('/__cleanup', method='GET'):
+            return job_runner.run_job('schedule_retention', app)['deleted']
+
+    def catch_up():
+        if sqlite_pair:
+            copy_sqlite(args.primary_url, args.replica_url)
+        else:
+            time.sleep(args.catchup_seconds)
+
+    steps = [
+        ('bob   GET /schedule/weekly', lambda: bob_weekly('before')),
+        ('bob   GET /friends', lambda: bob.get('/friends')),
+        ('bob   GET /friend/pending-count', lambda: bob.get('/friend/pending-count')),
+        ('alice GET /profile', lambda: alice.get('/profile')),
+        ('alice POST /schedule/save', lambda: alice.post('/schedule/save', data={
+            'payload': json.dumps([{'date': day, 'slot': '両方'}])})),
+        ('alice GET /api/weekly (pinned)', lambda: alice_slot(alice)),
+        ('bob   GET /api/weekly', lambda: alice_slot(bob)),
+        ('bob   GET /schedule/weekly (lagging)', lambda: bob_weekly('lagging')),
+        ('(wait pin-seconds)', lambda: time.sleep(args.pin_seconds)),
+        ('alice GET /api/weekly (unpinned)', lambda: alice_slot(alice)),
+        # dave の 120 日前の予定は保持期限切れ。1 回目で primary から消え、replica には残る
+        ('maint GET /__cleanup', cleanup),
+        ('maint GET /__cleanup (again, lagging)', cleanup),
+        ('(replica catches up)', catch_up),
+        ('bob   GET /api/weekly (caught up)', lambda: alice_slot(bob)),
+        ('bob   GET /schedule/weekly (caught up)', lambda: bob_weekly('caught_up')),
+    ]
+
+    print(f"primary={args.primary_url}\nreplica={args.replica_url}\npin_seconds={args.pin_seconds}")
+    print(f"\n{'step':<40} {'primary':>8} {'replica':>8}  result")
+    failures = []
+    for label, fn in steps:
+        sizes = cache_sizes()
+        with count_by_bind(app) as counts:
+            result = fn()
+        shown = result if isinstance(result, int) else getattr(result, 'status_code', '')
+        print(f"{label:<40} {counts.get('primary', 0):>8} {counts.get('replica', 0):>8}  {shown}")
+
+        if label.startswith(('bob   GET', 'alice GET /profile')) and counts.get('primary', 0):
+            failures.append(f"{label}: 書き込んでいない GET が primary を読んだ")
+        if counts.get('replica', 0) and cache_sizes() > sizes:
+            failures.append(f"{label}: replica から読んだ値をプロセス内キャッシュに入れた")
+        if label == 'alice POST /schedule/save' and counts.get('replica', 0):
+            failures.append(f"{label}: POST が replica に飛んだ")
+        if label.startswith('maint') and counts.get('replica', 0):
+            failures.append(f"{label}: 削除対象を replica で選んだ")
+        if label == 'maint GET /__cleanup' and result != 1:
+            failures.append(f"{label}: 期限切れの予定を消せていない（{result} 件）")
+        if label == 'maint GET /__cleanup (again, lagging)' and result != 0:
+            failures.append(f"{label}: primary では消えている行を {result} 件削除したと数えた")
+        if label == 'alice GET /api/weekly (pinned)' and (counts.get('replica', 0) or result != 3):
+            failures.append(f"{label}: 書いた直後に自分の変更が見えない")
+        if label == 'bob   GET /api/weekly (caught up)' and result != 3:
+            failures.append(f"{label}: 複製が追いついた後も保存前の値（{result}）")
+        if label == 'bob   GET /schedule/weekly (caught up)' and (
+                result.status_code != 200 or seen['caught_up'] == seen['before']):
+            failures.append(f"{label}: 複製が追いついた後も保存前の表（{result.status_code}）")
+
+    if sqlite_pair:
+        print("\n（SQLite の replica は最後に写し直すまで保存前のままなので、bob と固定が外れた alice には保存前の値が見える）")
+    for f in failures:
+        print(f"FAIL: {f}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
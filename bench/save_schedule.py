@@ -0,0 +1,128 @@
+# bench/save_schedule.py
+# /schedule/save の反映処理：1件ずつ（旧実装）と一括 UPSERT（現実装）の比較
+# と、リクエスト全体での form POST（リダイレクト後に schedule.html を描画し直す）と
+# PATCH /api/schedule（差分だけ送って JSON を受け取る）の比較
+#
+#   python -m bench.save_schedule [--rounds 50] [--database-url URL]
+
+import argparse
+import json
+import statistics
+import sys
+import time
+from datetime import date, timedelta
+
+from bench.harness import make_app, hash_pin, record_statements, login
+
+SLOTS = ('昼', '夜', '両方', '')
+
+
+def legacy_apply(user_id, items):
+    """変更前の save_schedule と同じ 1 件ずつの処理"""
+    from models import db, Schedule
+
+    change_count = 0
+    for selected_date, slot in items:
+        existing = Schedule.query.filter_by(user_id=user_id, date=selected_date).first()
+
+        if slot == "":
+            if existing:
+                db.session.delete(existing)
+                change_count += 1
+            continue
+
+        if existing:
+            if existing.time_type != slot:
+                existing.time_type = slot
+                change_count += 1
+        else:
+            db.session.add(Schedule(user_id=user_id, date=selected_date, time_type=slot))
+            change_count += 1
+    return change_count
+
+
+def build_payload(start, days, round_no):
+    """回ごとに値をずらして、新規・更新・削除が混ざるようにする"""
+    return [
+        (start + timedelta(days=i), SLOTS[(i + round_no) % len(SLOTS)])
+        for i in range(days)
+    ]
+
+
+def run(app, user_id, apply_fn, days, rounds):
+    from models import db
+
+    start = date.today() - timedelta(days=date.today().weekday())
+    latencies = []
+    statement_counts = []
+
+    with app.app_context():
+        for r in range(rounds):
+            items = build_payload(start, days, r)
+            with record_statements() as statements:
+                t0 = time.perf_counter()
+                apply_fn(user_id, items)
+                db.session.commit()
+                latencies.append((time.perf_counter() - t0) * 1000)
+            statement_counts.append(len(statements))
+
+    return statistics.mean(statement_counts), statistics.median(latencies), max(latencies)
+
+
+def run_requests(client, mode, days, rounds):
+    """(SQL 件数, p50 ms, 受信バイト数)。form はリダイレクト先の GET /schedule まで含める"""
+    start = date.today() - timedelta(days=date.today().weekday())
+    latencies, statement_counts, received = [], [], []
+
+    for r in range(rounds):
+        changes = [{'date': d.isoformat(), 'slot': slot} for d, slot in build_payload(start, days, r)]
+        with record_statements() as statements:
+            t0 = time.perf_counter()
+            if mode == 'form':
+                resp = client.post('/schedule/save', data={'payload': json.dumps(changes)}, follow_redirects=True)
+            else:
+                resp = client.patch('/api/schedule', json={'changes': changes})
+            latencies.append((time.perf_counter() - t0) * 1000)
+        statement_counts.append(len(statements))
+        received.append(len(resp.get_data()))
+
+    return statistics.mean(statement_counts), statistics.median(latencies), statistics.mean(received)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="/schedule/save の反映処理ベンチマーク")
+    parser.add_argument('--rounds', type=int, default=50)
+    parser.add_argument('--database-url', default=None)
+    args = parser.parse_args(argv)
+
+    app = make_app(args.database_url)
+
+    from models import db, User
+    from routes.schedule import _apply_changes
+
+    with app.app_context():
+        hashed = hash_pin()
+        legacy_user = User(username='bench_legacy', pin=hashed)
+        bulk_user = User(username='bench_bulk', pin=hashed)
+        db.session.add_all([legacy_user, bulk_user])
+        db.session.commit()
+        legacy_id, bulk_id = legacy_user.id, bulk_user.id
+
+    print(f"{'payload':>8} {'impl':>7} {'stmts/save':>11} {'p50 ms':>8} {'max ms':>8}")
+    for days in (7, 28, 84):
+        for label, fn, uid in (('legacy', legacy_apply, legacy_id), ('bulk', _apply_changes, bulk_id)):
+            stmts, p50, worst = run(app, uid, fn, days, args.rounds)
+            print(f"{days:>8} {label:>7} {stmts:>11.1f} {p50:>8.2f} {worst:>8.2f}")
+
+    client = app.test_client()
+    login(client, 'bench_bulk')
+    print(f"\n{'payload':>8} {'request':>7} {'stmts/save':>11} {'p50 ms':>8} {'bytes':>8}")
+    for days in (1, 7, 84):
+        for mode in ('form', 'patch'):
+            stmts, p50, size = run_requests(client, mode, days, args.rounds)
+            print(f"{days:>8} {mode:>7} {stmts:>11.1f} {p50:>8.2f} {size:>8.0f}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,103 @@
+# bench/schedule_storage.py
+# 予定の持ち方の比較：1 日 1 行（schedule）と 1 か月 1 行のビット列（schedule_month）
+#   - 容量：テーブル＋索引のサイズ（SQLite は dbstat、Postgres は pg_total_relation_size）
+#   - 読み込み：自分＋友達の 1 週 / 12 週ぶんを取り出す時間
+#
+#   python -m bench.schedule_storage [--users 2000] [--weeks 12] [--viewers 50] [--database-url URL]
+
+import argparse
+import statistics
+import sys
+import time
+from datetime import date, timedelta
+
+from bench.harness import make_app
+from bench.seed import seed
+
+
+def table_bytes(table):
+    from models import db
+
+    bind = db.session.get_bind()
+    if bind.dialect.name == 'postgresql':
+        return db.session.execute(db.text("SELECT pg_total_relation_size(:t)"), {'t': table}).scalar()
+
+    # テーブル本体と、そのテーブルに付いている索引（自動索引を含む）のページ合計
+    return db.session.execute(db.text(
+        "SELECT COALESCE(SUM(d.pgsize), 0) FROM dbstat d "
+        "JOIN sqlite_master m ON m.name = d.name WHERE m.tbl_name = :t"
+    ), {'t': table}).scalar()
+
+
+def read_rows(user_ids, start, end):
+    """1 日 1 行のまま読む（変更前の読み方）"""
+    from models import db, Schedule
+
+    return db.session.query(Schedule.user_id, Schedule.date, Schedule.time_type).filter(
+        Schedule.user_id.in_(user_ids),
+        Schedule.date.between(start, end)
+    ).all()
+
+
+def measure(fn, viewers, start, end):
+    from models import db
+
+    latencies = []
+    for user_ids in viewers:
+        t0 = time.perf_counter()
+        fn(user_ids, start, end)
+        latencies.append((time.perf_counter() - t0) * 1000)
+        db.session.remove()
+    latencies.sort()
+    return statistics.median(latencies), latencies[int(len(latencies) * 0.95) - 1]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="予定の保存形式の容量・読み込み比較")
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--weeks', type=int, default=12)
+    parser.add_argument('--friends-per-user', type=int, default=25)
+    parser.add_argument('--viewers', type=int, default=50)
+    parser.add_argument('--database-url', default=None)
+    args = parser.parse_args(argv)
+
+    app = make_app(args.database_url)
+    counts = seed(app, args.users, args.weeks, args.friends_per_user, 'store')
+
+    from models import db, User
+    from routes.schedule import _read_slots
+    from services.friend_graph import friend_cache
+
+    with app.app_context():
+        sizes = {t: table_bytes(t) for t in ('schedule', 'schedule_month')}
+
+        # 友達の多い順に閲覧者を選ぶ（自分＋友達の id 一覧）
+        ids = [uid for (uid,) in db.session.query(User.id).filter(User.username.like('store%')).all()]
+        groups = sorted(([uid] + friend_cache.get_friend_ids(uid) for uid in ids), key=len, reverse=True)
+        viewers = groups[:args.viewers]
+
+        today = date.today()
+        monday = today - timedelta(days=today.weekday())
+        ranges = {
+            '1 week': (monday, monday + timedelta(days=6)),
+            f'{args.weeks} weeks': (monday - timedelta(weeks=1), monday + timedelta(weeks=args.weeks - 1, days=6)),
+        }
+
+        print(f"users={counts['users']} schedules={counts['schedules']} months={counts['schedule_months']} "
+              f"viewers={len(viewers)} avg_group={statistics.mean(len(v) for v in viewers):.0f}")
+        print(f"{'table':<16} {'rows':>8} {'bytes':>12} {'bytes/day':>10}")
+        print(f"{'schedule':<16} {counts['schedules']:>8} {sizes['schedule']:>12} "
+              f"{sizes['schedule'] / max(counts['schedules'], 1):>10.1f}")
+        print(f"{'schedule_month':<16} {counts['schedule_months']:>8} {sizes['schedule_month']:>12} "
+              f"{sizes['schedule_month'] / max(counts['schedules'], 1):>10.1f}")
+
+        print(f"\n{'read':<24} {'p50 ms':>8} {'p95 ms':>8}")
+        for label, (start, end) in ranges.items():
+            for name, fn in (('schedule rows', read_rows), ('month bits', _read_slots)):
+                p50, p95 = measure(fn, viewers, start, end)
+                print(f"{label + ': ' + name:<24} {p50:>8.2f} {p95:>8.2f}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,134 @@
+# bench/seed.py
+# 負荷試験用の合成データを、実際のモデル（models/）経由で投入する
+#
+#   python -m bench.seed --database-url sqlite:////tmp/load.db --users 2000 --weeks 8
+#   python -m bench.seed --database-url postgresql://localhost/jantomo_load --users 2000
+#
+# ユーザー名は <prefix><番号>、PIN はすべて 1234（bench.load からこの名前でログインする）。
+
+import argparse
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta, timezone
+
+from bench.harness import make_app, hash_pin
+
+SLOTS = ('昼', '夜', '両方')
+
+
+def power_law_edges(n_users, m, rng):
+    """
+    優先的選択（Barabási–Albert）で友達グラフを作る。
+    新しいユーザーは、既存ユーザーを「友達の多さ」に比例した確率で m 人選んでつながる。
+    """
+    edges = []
+    targets = list(range(min(m, n_users)))
+    repeated = []  # 次数の分だけ同じ番号が入る
+    for new in range(len(targets), n_users):
+        chosen = set()
+        while len(chosen) < min(m, new):
+            pool = repeated if repeated and rng.random() < 0.9 else targets
+            chosen.add(rng.choice(pool))
+        for t in chosen:
+            edges.append((new, t))
+            repeated.extend((new, t))
+        targets.append(new)
+    return edges
+
+
+def chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def seed(app, n_users, weeks, friends_per_user, prefix, pending_ratio=0.1, seed_value=1):
+    from models import db, User, Friend, Schedule, ScheduleMonth, Device
+
+    rng = random.Random(seed_value)
+    hashed = hash_pin()
+    now = datetime.now(timezone.utc)
+    today = date.today()
+    start = today - timedelta(days=today.weekday() + 7)
+
+    counts = {}
+    with app.app_context():
+        # --- User ---
+        users = [User(username=f"{prefix}{i}", pin=hashed) for i in range(n_users)]
+        for batch in chunks(users, 1000):
+            db.session.add_all(batch)
+            db.session.flush()
+        db.session.commit()
+        ids = [u.id for u in users]
+        counts['users'] = len(ids)
+
+        # --- Friend（べき分布・一部は承認待ち） ---
+        edges = power_law_edges(n_users, friends_per_user, rng)
+        for batch in chunks(edges, 2000):
+            db.session.add_all([
+                Friend(**Friend.values(
+                    ids[a], ids[b],
+                    'pending' if rng.random() < pending_ratio else 'accepted'
+                ))
+                for a, b in batch
+            ])
+            db.session.commit()
+        counts['friends'] = len(edges)
+
+        # --- Schedule（ユーザーごとに予定の入れやすさが違う） ---
+        n_schedules = 0
+        for batch in chunks(ids, 200):
+            rows = []
+            for uid in batch:
+                activity = rng.betavariate(2, 3)
+                for d in range(weeks * 7):
+                    if rng.random() < activity:
+                        rows.append(Schedule(user_id=uid, date=start + timedelta(days=d), time_type=rng.choice(SLOTS)))
+            db.session.add_all(rows)
+            db.session.commit()
+            n_schedules += len(rows)
+        counts['schedules'] = n_schedules
+        counts['schedule_months'] = ScheduleMonth.rebuild()
+        db.session.commit()
+
+        # --- Device（1〜3 台、古いものは失効・期限切れ） ---
+        n_devices = 0
+        for batch in chunks(ids, 500):
+            rows = []
+            for uid in batch:
+                for k in range(rng.randint(1, 3)):
+                    created = now - timedelta(days=rng.randint(0, 60))
+                    rows.append(Device(
+                        user_id=uid,
+                        token=f"{prefix}{uid}-{k}-{rng.getrandbits(64):016x}",
+                        created_at=created,
+                        expires_at=created + timedelta(days=30),
+                        is_revoked=k > 0,
+                    ))
+            db.session.add_all(rows)
+            db.session.commit()
+            n_devices += len(rows)
+        counts['devices'] = n_devices
+
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="負荷試験用データの投入")
+    parser.add_argument('--database-url', required=True)
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--weeks', type=int, default=8)
+    parser.add_argument('--friends-per-user', type=int, default=5,
+                        help="新規ユーザーが張る友達の数（平均次数はこの約 2 倍）")
+    parser.add_argument('--prefix', default='load')
+    args = parser.parse_args(argv)
+
+    app = make_app(args.database_url)
+    t0 = time.perf_counter()
+    counts = seed(app, args.users, args.weeks, args.friends_per_user, args.prefix)
+    print(" ".join(f"{k}={v}" for k, v in counts.items()) + f" ({time.perf_counter() - t0:.1f}s)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,128 @@
+# bench/user_search.py
+# ユーザー名の入力補完（/friend/search）：100 万ユーザーでの前方一致
+#   - 素朴な lower(username) LIKE 'ab%'（索引なし・全件走査）
+#   - username_key の範囲検索（キャッシュなし）
+#   - プロセス内 LRU 経由（入力中に同じ prefix が繰り返し来る想定）
+#   - GET /friend/search のリクエスト全体
+#
+#   python -m bench.user_search [--users 1000000] [--queries 300] [--database-url URL]
+
+import argparse
+import random
+import statistics
+import sys
+import time
+
+from bench.harness import make_app, hash_pin, login
+
+STEMS = (
+    'taro', 'hanako', 'kenji', 'yuki', 'sakura', 'haruto', 'aoi', 'ren', 'mio', 'sota',
+    'riku', 'yui', 'kaito', 'hina', 'mahjong', 'ron', 'tsumo', 'riichi', 'dora', 'pon',
+    'Tanaka', 'Suzuki', 'Sato', 'Ito', 'Watanabe', 'Nakamura', 'Kobayashi', 'Kato',
+    'たろう', 'はなこ', 'ゆき', 'さくら', 'まーじゃん', 'ロン', 'ツモ',
+)
+
+
+def make_names(n, rng):
+    """STEMS + 数字で重複しない名前を n 個（大文字小文字・ひらがな混在）"""
+    names = set()
+    while len(names) < n:
+        names.add(f"{rng.choice(STEMS)}{rng.randrange(10 ** 7)}")
+    return list(names)
+
+
+def seed(app, n_users, rng):
+    from models import db, User
+    from models.models import normalize_username
+
+    hashed = hash_pin()
+    names = make_names(n_users, rng)
+    with app.app_context():
+        for i in range(0, len(names), 50000):
+            db.session.execute(db.insert(User), [
+                {'username': name, 'username_key': normalize_username(name), 'pin': hashed}
+                for name in names[i:i + 50000]
+            ])
+        db.session.add(User(username='searcher', pin=hashed))
+        db.session.commit()
+    return names
+
+
+def naive_prefix(prefix, limit):
+    from models import db, User
+
+    return db.session.query(User.id, User.username).filter(
+        db.func.lower(User.username).like(prefix + '%')
+    ).order_by(User.username).limit(limit).all()
+
+
+def timed(fn, prefixes):
+    latencies = []
+    for prefix in prefixes:
+        t0 = time.perf_counter()
+        fn(prefix)
+        latencies.append((time.perf_counter() - t0) * 1000)
+    latencies.sort()
+    return statistics.median(latencies), latencies[int(len(latencies) * 0.95) - 1]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="ユーザー名の前方一致検索のベンチマーク")
+    parser.add_argument('--users', type=int, default=1_000_000)
+    parser.add_argument('--queries', type=int, default=300)
+    parser.add_argument('--naive-queries', type=int, default=20)
+    parser.add_argument('--database-url', default=None)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(1)
+    app = make_app(args.database_url)
+    t0 = time.perf_counter()
+    names = seed(app, args.users, rng)
+    seeded = time.perf_counter() - t0
+
+    from models import User
+    from models.models import normalize_username
+    from services.user_search import user_search_cache
+
+    # 入力途中の prefix（1〜4 文字）。打鍵のたびに 1 文字ずつ伸びる
+    prefixes = []
+    while len(prefixes) < args.queries:
+        name = normalize_username(rng.choice(names))
+        prefixes.extend(name[:i] for i in range(1, 5))
+    prefixes = prefixes[:args.queries]
+    limit = user_search_cache.limit + 1
+
+    with app.app_context():
+        results = {}
+        results['naive lower() LIKE'] = timed(lambda p: naive_prefix(p, limit), prefixes[:args.naive_queries])
+        results['range scan (no cache)'] = timed(lambda p: User.search_prefix(p, limit), prefixes)
+
+        user_search_cache.backend.clear()
+        results['LRU (first pass)'] = timed(user_search_cache.search, prefixes)
+        results['LRU (warm)'] = timed(user_search_cache.search, prefixes)
+
+        # 結果が一致すること（素朴な方は username 順なので集合で比べる）
+        for p in prefixes[:args.naive_queries]:
+            want = {r.id for r in User.query.filter(User.username_key.startswith(p)).limit(10 ** 6)}
+            got = {uid for uid, _ in User.search_prefix(p, len(want) + 1)}
+            if want != got:
+                print(f"MISMATCH: prefix={p!r}")
+                return 1
+
+    client = app.test_client()
+    login(client, 'searcher')
+    user_search_cache.backend.clear()
+    results['GET /friend/search'] = timed(
+        lambda p: client.get('/friend/search', query_string={'q': p}), prefixes)
+
+    print(f"users={args.users} seeded_in={seeded:.1f}s prefixes={len(prefixes)} "
+          f"distinct={len(set(prefixes))} limit={limit - 1}")
+    print(f"{'case':<24} {'p50 ms':>8} {'p95 ms':>8}")
+    for label, (p50, p95) in results.items():
+        print(f"{label:<24} {p50:>8.3f} {p95:>8.3f}")
+    print(f"cache: {user_search_cache.stats()}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,127 @@
+# bench/weekly_cache.py
+# /schedule/weekly：表キャッシュなし（毎回作成）/ あり / 友達の保存直後 の比較
+# 500 ユーザー × 友達 50 人の合成データで計測する。
+#
+#   python -m bench.weekly_cache [--users 500] [--friends 50] [--viewers 20]
+
+import argparse
+import itertools
+import random
+import statistics
+import sys
+import time
+from datetime import date, timedelta
+
+from bench.harness import make_app, hash_pin, login, record_statements
+
+SLOTS = ('昼', '夜', '両方')
+
+
+def seed(app, n_users, n_friends, weeks=3):
+    """リング状に前後 n_friends/2 人と承認済みでつなぎ、前後の週に予定を入れる"""
+    from models import db, User, Friend, Schedule, ScheduleMonth
+
+    rng = random.Random(42)
+    hashed = hash_pin()
+    today = date.today()
+    start = today - timedelta(days=today.weekday() + 7)
+
+    with app.app_context():
+        db.session.execute(db.insert(User), [
+            {'username': f'bench{i}', 'pin': hashed} for i in range(n_users)
+        ])
+        ids = [u.id for u in User.query.order_by(User.id).all()]
+
+        friends = []
+        half = n_friends // 2
+        for i, uid in enumerate(ids):
+            for k in range(1, half + 1):
+                friends.append(Friend.values(uid, ids[(i + k) % n_users], 'accepted'))
+        db.session.execute(db.insert(Friend), friends)
+
+        schedules = []
+        for uid in ids:
+            for d in range(weeks * 7):
+                if rng.random() < 0.5:
+                    schedules.append({'user_id': uid, 'date': start + timedelta(days=d), 'time_type': rng.choice(SLOTS)})
+        db.session.execute(db.insert(Schedule), schedules)
+        ScheduleMonth.rebuild()
+        db.session.commit()
+        return ids, len(friends), len(schedules)
+
+
+_saves = itertools.count()
+
+
+def save_as(app, user_id):
+    """user_id の今週の月曜日の予定を毎回違う値に書き換える（保存と同じ _apply_changes + commit）"""
+    from models import db
+    from routes.schedule import _apply_changes
+
+    monday = date.today() - timedelta(days=date.today().weekday())
+    with app.app_context():
+        _apply_changes(user_id, [(monday, (SLOTS + ('',))[next(_saves) % 4])])
+        db.session.commit()
+
+
+def measure(client, before=None, rounds=1):
+    latencies, statements_per_req = [], []
+    for _ in range(rounds):
+        if before:
+            before()
+        with record_statements() as statements:
+            t0 = time.perf_counter()
+            resp = client.get('/schedule/weekly')
+            latencies.append((time.perf_counter() - t0) * 1000)
+        assert resp.status_code == 200, resp.status_code
+        statements_per_req.append(len(statements))
+    return latencies, statements_per_req
+
+
+def report(label, latencies, statements):
+    latencies = sorted(latencies)
+    p95 = latencies[int(len(latencies) * 0.95) - 1] if len(latencies) >= 20 else latencies[-1]
+    print(f"{label:<22} p50={statistics.median(latencies):7.2f}ms p95={p95:7.2f}ms "
+          f"sql/req={statistics.mean(statements):5.1f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="週間表キャッシュのベンチマーク")
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--friends', type=int, default=50)
+    parser.add_argument('--viewers', type=int, default=20)
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--database-url', default=None)
+    args = parser.parse_args(argv)
+
+    app = make_app(args.database_url)
+    ids, n_friend_rows, n_schedule_rows = seed(app, args.users, args.friends)
+    print(f"users={len(ids)} friend_rows={n_friend_rows} schedule_rows={n_schedule_rows}")
+
+    from services.weekly_matrix import weekly_cache
+
+    clients = []
+    for i in range(args.viewers):
+        c = app.test_client()
+        login(c, f'bench{i}')
+        clients.append(c)
+
+    cold, warm, after_save = ([], []), ([], []), ([], [])
+    for i, c in enumerate(clients):
+        for bucket, result in (
+            (cold, measure(c, before=weekly_cache.clear, rounds=args.rounds)),
+            (warm, measure(c, rounds=args.rounds)),
+            # 友達の 1 人が保存した直後（DB のスタンプが変わって作り直し）
+            (after_save, measure(c, before=lambda: save_as(app, ids[i + 1]), rounds=args.rounds)),
+        ):
+            bucket[0].extend(result[0])
+            bucket[1].extend(result[1])
+
+    report("no cache (rebuild)", *cold)
+    report("cached", *warm)
+    report("after friend's save", *after_save)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,69 @@
+# gunicorn.conf.py
+# 本番の起動設定：gunicorn -c gunicorn.conf.py wsgi:app
+#
+#   WEB_WORKER_CLASS  gthread（既定）/ sync
+#                     sync は 1 ワーカー 1 リクエストなので、SSE（/friend/pending-stream）が
+#                     つながっている間そのワーカーが塞がり、timeout で切られる。
+#   WEB_CONCURRENCY   ワーカー数（既定は CPU 数から：sync は 2×CPU+1、gthread は CPU+1）
+#   WEB_THREADS       gthread のスレッド数（既定 4）
+#   GUNICORN_PRELOAD  true（既定）で親プロセスがアプリを読み込んでから fork する
+#   SERVICE_LOG_LEVEL 計測（PROFILE_SAMPLE_RATE）・定期ジョブのログの出力レベル（既定 INFO、create_app で設定）
+#   JOBS_AUTOSTART    false なら定期ジョブを起動しない（既定 true。起動は post_fork まで遅らせる）
+#
+# 定期ジョブの重複防止（JOBS_LOCK_PATH の flock）は同じホストのワーカー同士にしか効かない。
+# Render でインスタンスを複数にするときは、1 つ以外を JOBS_ENABLED=false にするか、
+# 全インスタンスで止めて外部の cron から /__cleanup を叩くこと（重ねて走っても削除が二重になるだけで壊れはしない）。
+
+import os
+
+WORKER_CLASSES = ('sync', 'gthread')
+
+
+def _cpu_count():
+    """コンテナで割り当てられた CPU 数（取れなければ OS 全体）"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+worker_class = os.environ.get("WEB_WORKER_CLASS", "gthread")
+if worker_class not in WORKER_CLASSES:
+    raise ValueError(f"WEB_WORKER_CLASS は {', '.join(WORKER_CLASSES)} のいずれか")
+
+_default_workers = 2 * _cpu_count() + 1 if worker_class == 'sync' else _cpu_count() + 1
+workers = int(os.environ.get("WEB_CONCURRENCY", _default_workers))
+threads = int(os.environ.get("WEB_THREADS", 4)) if worker_class == 'gthread' else 1
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+timeout = int(os.environ.get("WEB_TIMEOUT", 30))
+graceful_timeout = int(os.environ.get("WEB_GRACEFUL_TIMEOUT", 30))
+keepalive = int(os.environ.get("WEB_KEEPALIVE", 5))
+
+preload_app = os.environ.get("GUNICORN_PRELOAD", "true") == "true"
+
+# 定期ジョブのスレッドは親プロセスでは起動しない（fork で引き継がれないため）。
+# 運用側の JOBS_AUTOSTART は覚えておき、post_fork で各ワーカーがそれに従って start する
+JOBS_AUTOSTART = os.environ.get("JOBS_AUTOSTART", "true") == "true"
+os.environ["JOBS_AUTOSTART"] = "false"
+
+accesslog = os.environ.get("WEB_ACCESSLOG", "-") or None
+
+
+def post_fork(server, worker):
+    """
+    fork 直後のワーカーで 1 回だけ呼ばれる。
+    親から受け継いだプールの接続は親と共有になってしまうので、閉じずに手放してから
+    （close=False：親の接続を巻き込まない）ワーカー自身の接続を作り直させる。
+    PIN ハッシュのスレッドプールは pid が変わったことを見て作り直す。
+    """
+    from wsgi import app
+    from models.db import db
+    from services.jobs import job_runner
+
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+
+    if app.config["JOBS_ENABLED"] and JOBS_AUTOSTART:
+        job_runner.start()
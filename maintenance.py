@@ -1,12 +1,109 @@
-from flask import Blueprint, request
-from datetime import date, timedelta
-from app import create_app, db
-from models import Schedule
+from flask import Blueprint, request, jsonify, current_app
+from datetime import date, datetime, timedelta, timezone
+import time
+from models import db, Schedule, ScheduleMonth, Device
+from services.friend_graph import friend_cache
+from services.weekly_matrix import weekly_cache
+from services.identity import identity_cache
+from services.user_search import user_search_cache
+from services.hashing import pin_hasher
+from services.pubsub import pending_hub
+from services.jobs import job_runner
+from services.profiling import profiler
 
 maintenance_bp = Blueprint('maintenance', __name__)
 
 SECRET_KEY = "cleanup_0423_secret"
 
+
+# ==========================================
+# 🧹 保持期限ジョブ（バックグラウンド / 手動の両方から使う）
+# ==========================================
+def _delete_in_batches(model, condition, batch_size, pause):
+    """
+    条件に合う行を batch_size 件ずつ削除する（1 回の DELETE でテーブルを長時間ロックしない）。
+    バッチごとに commit し、pause 秒休む。
+    """
+    deleted = 0
+    batches = 0
+
+    # 主キーが複数列（schedule_month など）のときは行値の IN で消す
+    pk = list(model.__mapper__.primary_key)
+    key = pk[0] if len(pk) == 1 else db.tuple_(*pk)
+
+    while True:
+        ids = [row[0] if len(pk) == 1 else tuple(row)
+               for row in db.session.query(*pk).filter(condition).limit(batch_size).all()]
+        if not ids:
+            break
+
+        result = db.session.execute(
+            db.delete(model).where(key.in_(ids)).execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+
+        # 選んだ件数ではなく実際に消えた件数（同時に消された行は数えない）
+        deleted += result.rowcount
+        batches += 1
+        if len(ids) < batch_size:
+            break
+        time.sleep(pause)
+
+    return deleted, batches
+
+
+def purge_expired_schedules(app):
+    """保持期間（既定 90 日）より前の予定を削除"""
+    cutoff = date.today() - timedelta(days=app.config["RETENTION_DAYS"])
+
+    batch_size = app.config["CLEANUP_BATCH_SIZE"]
+    pause = app.config["CLEANUP_BATCH_PAUSE"]
+
+    deleted, batches = _delete_in_batches(Schedule, Schedule.date < cutoff, batch_size, pause)
+
+    # 月ごとのビット列：丸ごと期限前の月は削除、境目の月は期限前の日のビットだけ消す
+    boundary = ScheduleMonth.month_of(cutoff)
+    months, month_batches = _delete_in_batches(ScheduleMonth, ScheduleMonth.month < boundary, batch_size, pause)
+    expired_bits = (1 << ScheduleMonth.shift_of(cutoff)) - 1
+    if expired_bits:
+        db.session.execute(
+            db.update(ScheduleMonth)
+            .where(ScheduleMonth.month == boundary, ScheduleMonth.bits.op('&')(expired_bits) != 0)
+            .values(bits=ScheduleMonth.bits.op('&')(~expired_bits), updated_at=datetime.now(timezone.utc))
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+
+    # 削除された過去週を表示し続けないように
+    if deleted:
+        weekly_cache.clear()
+
+    return {'deleted': deleted, 'batches': batches + month_batches,
+            'months': months, 'cutoff': cutoff.isoformat()}
+
+
+def prune_devices(app):
+    """失効済み・期限切れのデバイストークンを削除"""
+    batch_size = app.config["CLEANUP_BATCH_SIZE"]
+    pause = app.config["CLEANUP_BATCH_PAUSE"]
+    now = datetime.now(timezone.utc)
+
+    revoked, revoked_batches = _delete_in_batches(Device, Device.is_revoked == True, batch_size, pause)
+    expired, expired_batches = _delete_in_batches(Device, Device.expires_at < now, batch_size, pause)
+
+    return {'deleted': revoked + expired, 'batches': revoked_batches + expired_batches,
+            'revoked': revoked, 'expired': expired}
+
+
+def register_jobs(app):
+    interval = app.config["JOBS_INTERVAL"]
+    job_runner.register('schedule_retention', purge_expired_schedules, interval)
+    job_runner.register('device_prune', prune_devices, interval)
+
+
+# ==========================================
+# 🔧 手動トリガー（同じジョブをその場で実行）
+# ==========================================
 @maintenance_bp.route('/__cleanup')
 def cleanup():
 
@@ -14,17 +111,32 @@ def cleanup():
     if request.args.get("key") != SECRET_KEY:
         return "Unauthorized", 403
 
-    # Flask アプリケーションコンテキストを強制的に生成
-    app = create_app()
-    with app.app_context():
+    app = current_app._get_current_object()
+    schedules = job_runner.run_job('schedule_retention', app)
+    devices = job_runner.run_job('device_prune', app)
 
-        cutoff = date.today() - timedelta(days=90)
-        cutoff_str = cutoff.strftime("%Y-%m-%d")
+    return (
+        f"Cleanup OK. Deleted={schedules['deleted']} "
+        f"Devices={devices['deleted']} "
+        f"({schedules['duration_ms'] + devices['duration_ms']:.0f}ms)"
+    )
 
-        deleted = Schedule.query.filter(
-            Schedule.date < cutoff_str
-        ).delete()
 
-        db.session.commit()
+@maintenance_bp.route('/__stats')
+def stats():
+    """キャッシュのヒット/ミス件数など（プロセス単位）"""
+
+    # 認証
+    if request.args.get("key") != SECRET_KEY:
+        return "Unauthorized", 403
 
-        return f"Cleanup OK. Deleted={deleted}"
+    return jsonify({
+        "friend_graph": friend_cache.stats(),
+        "weekly_matrix": weekly_cache.stats(),
+        "identity": identity_cache.stats(),
+        "user_search": user_search_cache.stats(),
+        "pin_hasher": pin_hasher.stats(),
+        "pending_stream": pending_hub.stats(),
+        "jobs": job_runner.stats(),
+        "profiling": profiler.stats(),
+    })
@@ -0,0 +1,42 @@
+"""add hot query indexes
+
+Revision ID: 3f8c1d2e9a47
+Revises: a261611024f5
+Create Date: 2026-10-18 16:02:11.482913
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f8c1d2e9a47'
+down_revision = 'a261611024f5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('schedule', schema=None) as batch_op:
+        batch_op.create_index('ix_schedule_user_id_date', ['user_id', 'date'], unique=False)
+        batch_op.create_index('ix_schedule_date', ['date'], unique=False)
+
+    with op.batch_alter_table('friend', schema=None) as batch_op:
+        batch_op.create_index('ix_friend_user_id_status', ['user_id', 'status'], unique=False)
+        batch_op.create_index('ix_friend_friend_id_status', ['friend_id', 'status'], unique=False)
+
+    with op.batch_alter_table('device', schema=None) as batch_op:
+        batch_op.create_index('ix_device_user_id_is_revoked', ['user_id', 'is_revoked'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('device', schema=None) as batch_op:
+        batch_op.drop_index('ix_device_user_id_is_revoked')
+
+    with op.batch_alter_table('friend', schema=None) as batch_op:
+        batch_op.drop_index('ix_friend_friend_id_status')
+        batch_op.drop_index('ix_friend_user_id_status')
+
+    with op.batch_alter_table('schedule', schema=None) as batch_op:
+        batch_op.drop_index('ix_schedule_date')
+        batch_op.drop_index('ix_schedule_user_id_date')
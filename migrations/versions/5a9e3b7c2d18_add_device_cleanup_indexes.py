@@ -0,0 +1,28 @@
+"""add device cleanup indexes
+
+Revision ID: 5a9e3b7c2d18
+Revises: c47d09e5b3f1
+Create Date: 2026-10-18 21:12:53.208417
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5a9e3b7c2d18'
+down_revision = 'c47d09e5b3f1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('device', schema=None) as batch_op:
+        batch_op.create_index('ix_device_is_revoked', ['is_revoked'], unique=False)
+        batch_op.create_index('ix_device_expires_at', ['expires_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('device', schema=None) as batch_op:
+        batch_op.drop_index('ix_device_expires_at')
+        batch_op.drop_index('ix_device_is_revoked')
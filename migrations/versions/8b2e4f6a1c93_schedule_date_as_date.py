@@ -0,0 +1,63 @@
+"""schedule date as DATE
+
+Revision ID: 8b2e4f6a1c93
+Revises: 3f8c1d2e9a47
+Create Date: 2026-10-18 17:25:40.117302
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b2e4f6a1c93'
+down_revision = '3f8c1d2e9a47'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 一意制約の前に (user_id, date) の重複を解消（新しい行を残す）
+    op.execute(
+        "DELETE FROM schedule WHERE id NOT IN ("
+        " SELECT keep_id FROM ("
+        "  SELECT max(id) AS keep_id FROM schedule GROUP BY user_id, date"
+        " ) AS keep"
+        ")"
+    )
+
+    if op.get_bind().dialect.name == 'sqlite':
+        # SQLite の CAST(... AS DATE) は '2025-12-06' を 2025 に数値化してしまうため、
+        # 宣言型だけ差し替えてテーブルを作り直す（値は ISO 文字列のまま Date として読める）
+        with op.batch_alter_table('schedule', schema=None, recreate='always',
+                                  reflect_args=[sa.Column('date', sa.Date(), nullable=False)]) as batch_op:
+            batch_op.drop_index('ix_schedule_user_id_date')
+            batch_op.create_unique_constraint('uq_schedule_user_id_date', ['user_id', 'date'])
+        return
+
+    with op.batch_alter_table('schedule', schema=None) as batch_op:
+        batch_op.drop_index('ix_schedule_user_id_date')
+        batch_op.alter_column('date',
+               existing_type=sa.String(length=20),
+               type_=sa.Date(),
+               existing_nullable=False,
+               postgresql_using='"date"::date')
+        batch_op.create_unique_constraint('uq_schedule_user_id_date', ['user_id', 'date'])
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'sqlite':
+        with op.batch_alter_table('schedule', schema=None, recreate='always',
+                                  reflect_args=[sa.Column('date', sa.String(length=20), nullable=False)]) as batch_op:
+            batch_op.drop_constraint('uq_schedule_user_id_date', type_='unique')
+            batch_op.create_index('ix_schedule_user_id_date', ['user_id', 'date'], unique=False)
+        return
+
+    with op.batch_alter_table('schedule', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_schedule_user_id_date', type_='unique')
+        batch_op.alter_column('date',
+               existing_type=sa.Date(),
+               type_=sa.String(length=20),
+               existing_nullable=False,
+               postgresql_using="to_char(\"date\", 'YYYY-MM-DD')")
+        batch_op.create_index('ix_schedule_user_id_date', ['user_id', 'date'], unique=False)
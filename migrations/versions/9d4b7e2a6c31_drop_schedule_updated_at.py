@@ -0,0 +1,29 @@
+"""drop schedule updated_at
+
+Revision ID: 9d4b7e2a6c31
+Revises: f3b8e6d1a472
+Create Date: 2026-10-19 02:05:47.218930
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9d4b7e2a6c31'
+down_revision = 'f3b8e6d1a472'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # ETag のスタンプは schedule_month.updated_at から作るので、schedule 側は使っていない
+    with op.batch_alter_table('schedule', schema=None) as batch_op:
+        batch_op.drop_column('updated_at')
+
+
+def downgrade():
+    with op.batch_alter_table('schedule', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
+
+    op.execute("UPDATE schedule SET updated_at = created_at")
@@ -0,0 +1,63 @@
+"""add user.username_key
+
+Revision ID: b5f0c3d9e2a8
+Revises: d2a87f41c6e9
+Create Date: 2026-10-19 00:26:44.905183
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import unicodedata
+
+
+# revision identifiers, used by Alembic.
+revision = 'b5f0c3d9e2a8'
+down_revision = 'd2a87f41c6e9'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 5000
+
+
+def _normalize(name):
+    # models.models.normalize_username と同じ（マイグレーションからはモデルを読み込まない）
+    return unicodedata.normalize('NFKC', name).lower()
+
+
+def upgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('username_key', sa.String(length=128), nullable=True))
+
+    # NFKC は SQL でできないので、id 順に読んで書き戻す
+    user = sa.table('user',
+        sa.column('id', sa.Integer()),
+        sa.column('username', sa.String()),
+        sa.column('username_key', sa.String()),
+    )
+    bind = op.get_bind()
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(user.c.id, user.c.username)
+            .where(user.c.id > last_id).order_by(user.c.id).limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        bind.execute(
+            user.update().where(user.c.id == sa.bindparam('b_id')).values(username_key=sa.bindparam('b_key')),
+            [{'b_id': uid, 'b_key': _normalize(name)} for uid, name in rows]
+        )
+        last_id = rows[-1][0]
+
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.alter_column('username_key', existing_type=sa.String(length=128), nullable=False)
+        batch_op.create_index(
+            'ix_user_username_key', ['username_key'], unique=False,
+            postgresql_ops={'username_key': 'text_pattern_ops'}
+        )
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_index('ix_user_username_key')
+        batch_op.drop_column('username_key')
@@ -0,0 +1,29 @@
+"""add schedule updated_at
+
+Revision ID: c47d09e5b3f1
+Revises: 8b2e4f6a1c93
+Create Date: 2026-10-18 19:41:06.530284
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c47d09e5b3f1'
+down_revision = '8b2e4f6a1c93'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('schedule', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
+
+    # 既存行は作成時刻を最終更新時刻とみなす
+    op.execute("UPDATE schedule SET updated_at = created_at")
+
+
+def downgrade():
+    with op.batch_alter_table('schedule', schema=None) as batch_op:
+        batch_op.drop_column('updated_at')
@@ -0,0 +1,122 @@
+"""canonical friend pairs
+
+Revision ID: d2a87f41c6e9
+Revises: e91f4a6c0b27
+Create Date: 2026-10-18 23:41:07.318254
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd2a87f41c6e9'
+down_revision = 'e91f4a6c0b27'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 1000
+
+
+def _friend_table(*columns):
+    return sa.table('friend',
+        sa.column('id', sa.Integer()),
+        sa.column('status', sa.String()),
+        *(sa.column(name, sa.Integer()) for name in columns)
+    )
+
+
+def upgrade():
+    with op.batch_alter_table('friend', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('low_id', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('high_id', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('requester_id', sa.Integer(), nullable=True))
+
+    friend = _friend_table('user_id', 'friend_id', 'low_id', 'high_id', 'requester_id')
+    bind = op.get_bind()
+
+    # 自分自身との関係は作れないはずだが、残っていれば消す
+    bind.execute(friend.delete().where(friend.c.user_id == friend.c.friend_id))
+
+    # (user_id → friend_id) を (low_id, high_id) + 申請者に
+    bind.execute(friend.update().values(
+        low_id=sa.case((friend.c.user_id < friend.c.friend_id, friend.c.user_id), else_=friend.c.friend_id),
+        high_id=sa.case((friend.c.user_id < friend.c.friend_id, friend.c.friend_id), else_=friend.c.user_id),
+        requester_id=friend.c.user_id,
+    ))
+
+    # 同じ組が複数あれば 1 行だけ残す（承認済みを優先し、その中で古い方）
+    rows = bind.execute(
+        sa.select(friend.c.id, friend.c.low_id, friend.c.high_id).order_by(
+            friend.c.low_id, friend.c.high_id,
+            sa.case((friend.c.status == 'accepted', 0), else_=1),
+            friend.c.id
+        )
+    )
+    duplicates = []
+    previous = None
+    for friend_id, low_id, high_id in rows:
+        if (low_id, high_id) == previous:
+            duplicates.append(friend_id)
+        previous = (low_id, high_id)
+
+    for i in range(0, len(duplicates), BATCH_SIZE):
+        bind.execute(friend.delete().where(friend.c.id.in_(duplicates[i:i + BATCH_SIZE])))
+
+    with op.batch_alter_table('friend', schema=None) as batch_op:
+        batch_op.drop_index('ix_friend_user_id_status')
+        batch_op.drop_index('ix_friend_friend_id_status')
+        batch_op.drop_column('user_id')
+        batch_op.drop_column('friend_id')
+        batch_op.alter_column('low_id', existing_type=sa.Integer(), nullable=False)
+        batch_op.alter_column('high_id', existing_type=sa.Integer(), nullable=False)
+        batch_op.alter_column('requester_id', existing_type=sa.Integer(), nullable=False)
+        batch_op.create_foreign_key('fk_friend_low_id_user', 'user', ['low_id'], ['id'], ondelete='CASCADE')
+        batch_op.create_foreign_key('fk_friend_high_id_user', 'user', ['high_id'], ['id'], ondelete='CASCADE')
+        batch_op.create_foreign_key('fk_friend_requester_id_user', 'user', ['requester_id'], ['id'], ondelete='CASCADE')
+        batch_op.create_unique_constraint('uq_friend_low_id_high_id', ['low_id', 'high_id'])
+        batch_op.create_check_constraint('ck_friend_low_id_lt_high_id', 'low_id < high_id')
+        batch_op.create_index('ix_friend_low_id_status', ['low_id', 'status'], unique=False)
+        batch_op.create_index('ix_friend_high_id_status', ['high_id', 'status'], unique=False)
+
+    # 使われていなかった申請テーブル（承認待ちは friend.status='pending' で持つ）
+    op.drop_table('friend_request')
+
+
+def downgrade():
+    op.create_table('friend_request',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('sender_id', sa.Integer(), nullable=False),
+    sa.Column('receiver_id', sa.Integer(), nullable=False),
+    sa.Column('status', sa.String(length=10), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['receiver_id'], ['user.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['sender_id'], ['user.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+    with op.batch_alter_table('friend', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('user_id', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('friend_id', sa.Integer(), nullable=True))
+
+    # 申請者 → 相手 の向きに戻す
+    friend = _friend_table('user_id', 'friend_id', 'low_id', 'high_id', 'requester_id')
+    op.get_bind().execute(friend.update().values(
+        user_id=friend.c.requester_id,
+        friend_id=sa.case((friend.c.requester_id == friend.c.low_id, friend.c.high_id), else_=friend.c.low_id),
+    ))
+
+    with op.batch_alter_table('friend', schema=None) as batch_op:
+        batch_op.drop_index('ix_friend_high_id_status')
+        batch_op.drop_index('ix_friend_low_id_status')
+        batch_op.drop_constraint('ck_friend_low_id_lt_high_id', type_='check')
+        batch_op.drop_constraint('uq_friend_low_id_high_id', type_='unique')
+        batch_op.drop_column('requester_id')
+        batch_op.drop_column('high_id')
+        batch_op.drop_column('low_id')
+        batch_op.alter_column('user_id', existing_type=sa.Integer(), nullable=False)
+        batch_op.alter_column('friend_id', existing_type=sa.Integer(), nullable=False)
+        batch_op.create_foreign_key('fk_friend_user_id_user', 'user', ['user_id'], ['id'], ondelete='CASCADE')
+        batch_op.create_foreign_key('fk_friend_friend_id_user', 'user', ['friend_id'], ['id'], ondelete='CASCADE')
+        batch_op.create_index('ix_friend_user_id_status', ['user_id', 'status'], unique=False)
+        batch_op.create_index('ix_friend_friend_id_status', ['friend_id', 'status'], unique=False)
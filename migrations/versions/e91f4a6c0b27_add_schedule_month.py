@@ -0,0 +1,75 @@
+"""add schedule_month
+
+Revision ID: e91f4a6c0b27
+Revises: 5a9e3b7c2d18
+Create Date: 2026-10-18 22:05:31.744120
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from datetime import datetime, timezone
+
+
+# revision identifiers, used by Alembic.
+revision = 'e91f4a6c0b27'
+down_revision = '5a9e3b7c2d18'
+branch_labels = None
+depends_on = None
+
+# models.models.SLOT_CODES と同じ（マイグレーションからはモデルを読み込まない）
+SLOT_CODES = {'昼': 1, '夜': 2, '両方': 3}
+BATCH_SIZE = 5000
+
+
+def upgrade():
+    schedule_month = op.create_table('schedule_month',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('month', sa.Date(), nullable=False),
+    sa.Column('bits', sa.BigInteger(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('user_id', 'month')
+    )
+    with op.batch_alter_table('schedule_month', schema=None) as batch_op:
+        batch_op.create_index('ix_schedule_month_month', ['month'], unique=False)
+
+    # 既存の Schedule から月ごとのビット列を作る（ユーザー・日付順に流し読み）
+    schedule = sa.table('schedule',
+        sa.column('user_id', sa.Integer()),
+        sa.column('date', sa.Date()),
+        sa.column('time_type', sa.String()),
+    )
+    bind = op.get_bind()
+    rows = bind.execute(
+        sa.select(schedule.c.user_id, schedule.c.date, schedule.c.time_type)
+        .order_by(schedule.c.user_id, schedule.c.date)
+    )
+
+    now = datetime.now(timezone.utc)
+    pending = []
+    current_key, current_bits = None, 0
+    for user_id, d, time_type in rows:
+        key = (user_id, d.replace(day=1))
+        if key != current_key:
+            if current_key is not None:
+                pending.append({'user_id': current_key[0], 'month': current_key[1],
+                                'bits': current_bits, 'updated_at': now})
+            current_key, current_bits = key, 0
+        current_bits |= SLOT_CODES.get(time_type, 0) << (2 * (d.day - 1))
+
+        if len(pending) >= BATCH_SIZE:
+            op.bulk_insert(schedule_month, pending)
+            pending = []
+
+    if current_key is not None:
+        pending.append({'user_id': current_key[0], 'month': current_key[1],
+                        'bits': current_bits, 'updated_at': now})
+    if pending:
+        op.bulk_insert(schedule_month, pending)
+
+
+def downgrade():
+    with op.batch_alter_table('schedule_month', schema=None) as batch_op:
+        batch_op.drop_index('ix_schedule_month_month')
+
+    op.drop_table('schedule_month')
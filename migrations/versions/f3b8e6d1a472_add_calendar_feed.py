@@ -0,0 +1,38 @@
+"""add calendar_feed
+
+Revision ID: f3b8e6d1a472
+Revises: b5f0c3d9e2a8
+Create Date: 2026-10-19 01:12:09.561377
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3b8e6d1a472'
+down_revision = 'b5f0c3d9e2a8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('calendar_feed',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('token', sa.String(length=64), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('is_revoked', sa.Boolean(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('token')
+    )
+    with op.batch_alter_table('calendar_feed', schema=None) as batch_op:
+        batch_op.create_index('ix_calendar_feed_user_id_is_revoked', ['user_id', 'is_revoked'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('calendar_feed', schema=None) as batch_op:
+        batch_op.drop_index('ix_calendar_feed_user_id_is_revoked')
+
+    op.drop_table('calendar_feed')
@@ -1,6 +1,6 @@
 # models/__init__.py
 from .db import db
-from .models import User, Schedule
+from .models import User, Schedule, ScheduleMonth
 from .friend import Friend
-from .friend_request import FriendRequest
 from .device import Device
+from .calendar_feed import CalendarFeed
@@ -0,0 +1,27 @@
+from datetime import datetime, timezone
+from .db import db
+
+class CalendarFeed(db.Model):
+    """
+    カレンダーアプリ購読用の .ics URL のトークン（Device と同じく推測できない乱数）。
+    ログイン Cookie を送れないカレンダーアプリからは、URL に含めたこのトークンで本人を特定する。
+    発行し直したら古いトークンは is_revoked にする。
+    """
+    __tablename__ = "calendar_feed"
+    __table_args__ = (
+        # 発行し直し時の一括失効用
+        db.Index('ix_calendar_feed_user_id_is_revoked', 'user_id', 'is_revoked'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(
+        db.Integer,
+        db.ForeignKey('user.id', ondelete='CASCADE'),
+        nullable=False
+    )
+    token = db.Column(db.String(64), unique=True, nullable=False)
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    is_revoked = db.Column(db.Boolean, default=False)
+
+    def __repr__(self):
+        return f"<CalendarFeed user={self.user_id} revoked={self.is_revoked}>"
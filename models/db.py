@@ -1,3 +1,153 @@
+import time
+from contextlib import contextmanager
+
+from flask import current_app, has_request_context, request, session
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+# 読み込み専用の複製 DB の bind キー（SQLALCHEMY_BINDS に設定があるときだけ使う）
+REPLICA_BIND = 'replica'
+# 書き込んだ利用者を、この時刻（UNIX 秒）まで primary に固定する（Flask セッションに保存）
+PIN_SESSION_KEY = '_db_primary_until'
+# このセッション（= リクエスト）で replica を読んだかどうか（Session.info のキー）
+REPLICA_READ_KEY = 'read_replica'
+# use_primary() の入れ子の深さ（Session.info のキー）
+PRIMARY_ONLY_KEY = 'primary_only'
+
+
+class RoutingSession(Session):
+    """
+    GET / HEAD のリクエスト中の読み込みは replica へ、それ以外は primary へ送る Session。
+    - 書き込み（flush・INSERT/UPDATE/DELETE）は常に primary。書き込んだ後は同じリクエストの読み込みも primary
+    - 書き込みを commit した利用者は DB_REPLICA_PIN_SECONDS 秒間、GET でも primary を読む（自分の変更がすぐ見える）
+    - リクエスト外（定期ジョブ・マイグレーション・CLI）は primary
+    - use_primary() の中は GET でも primary（読んだ結果を元に書き込む GET・手動メンテナンス）
+    replica を読んだリクエストでは、プロセス内キャッシュに書き込まない（read_replica_used を見ること）。
+    遅れている複製の値をキャッシュすると、複製が追いついた後もキャッシュが古いまま残るため。
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None:
+            if self._flushing or getattr(clause, 'is_dml', False):
+                self.info['wrote'] = True
+            elif self._reads_from_replica():
+                replica = self._db.engines.get(REPLICA_BIND)
+                if replica is not None:
+                    self.info[REPLICA_READ_KEY] = True
+                    return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def _reads_from_replica(self):
+        if self.info.get('wrote') or self.info.get(PRIMARY_ONLY_KEY) or not has_request_context():
+            return False
+        if request.method not in ('GET', 'HEAD'):
+            return False
+        return session.get(PIN_SESSION_KEY, 0) <= time.time()
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _pin_to_primary(db_session):
+    if db_session.info.pop('wrote', False) and has_request_context():
+        session[PIN_SESSION_KEY] = time.time() + current_app.config.get("DB_REPLICA_PIN_SECONDS", 5)
+
+
+@event.listens_for(RoutingSession, 'after_rollback')
+def _forget_writes(db_session):
+    db_session.info.pop('wrote', None)
+
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+
+@contextmanager
+def use_primary():
+    """
+    この中の読み込みは GET のリクエスト中でも primary へ送る。
+    遅れている複製で読んだ値を元に書き込むと、消えた行を数えたり消し漏らしたりするため。
+    ビューのデコレーターとしても使える（@use_primary()）。
+    """
+    info = db.session.info
+    depth = info.get(PRIMARY_ONLY_KEY, 0)
+    info[PRIMARY_ONLY_KEY] = depth + 1
+    try:
+        yield
+    finally:
+        info[PRIMARY_ONLY_KEY] = depth
+
+
+def read_replica_used():
+    """このリクエストで replica を読んだか（True ならその値をプロセス内キャッシュに入れない）"""
+    return bool(db.session.info.get(REPLICA_READ_KEY))
+
+# PRAGMA には値をバインドできないので、取りうる値をここで絞る
+SQLITE_JOURNAL_MODES = ('DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY', 'WAL', 'OFF')
+SQLITE_SYNCHRONOUS = ('OFF', 'NORMAL', 'FULL', 'EXTRA')
+
+
+def engine_options(config, url):
+    """
+    url のエンジンに渡すオプション（SQLALCHEMY_ENGINE_OPTIONS / SQLALCHEMY_BINDS 用）。
+    Postgres（Render）はコネクションプールの上限・待ち時間・作り直し・生存確認、
+    SQLite は接続時の PRAGMA（init_sqlite_pragmas で設定）なのでここでは何もしない。
+    """
+    if make_url(url).get_backend_name() == 'sqlite':
+        return {}
+
+    return {
+        'pool_size': config["DB_POOL_SIZE"],
+        'max_overflow': config["DB_MAX_OVERFLOW"],
+        'pool_timeout': config["DB_POOL_TIMEOUT"],
+        # Render 側で切られる前に作り直す（-1 で無効）
+        'pool_recycle': config["DB_POOL_RECYCLE"],
+        # 切れた接続をリクエストに渡さない（借りるたびに軽い確認を 1 回）
+        'pool_pre_ping': config["DB_POOL_PRE_PING"],
+    }
+
+
+def sqlite_pragmas(config):
+    """
+    SQLite の接続ごとに流す PRAGMA の一覧。値が空の項目は設定しない（SQLite の既定のまま）。
+    WAL なら読み込みが書き込みを待たず、busy_timeout の間はロック解除を待ってから失敗する。
+    """
+    pragmas = []
+
+    journal_mode = config["SQLITE_JOURNAL_MODE"].upper()
+    if journal_mode:
+        if journal_mode not in SQLITE_JOURNAL_MODES:
+            raise ValueError(f"SQLITE_JOURNAL_MODE は {', '.join(SQLITE_JOURNAL_MODES)} のいずれか")
+        pragmas.append(f"PRAGMA journal_mode={journal_mode}")
+
+    synchronous = config["SQLITE_SYNCHRONOUS"].upper()
+    if synchronous:
+        if synchronous not in SQLITE_SYNCHRONOUS:
+            raise ValueError(f"SQLITE_SYNCHRONOUS は {', '.join(SQLITE_SYNCHRONOUS)} のいずれか")
+        pragmas.append(f"PRAGMA synchronous={synchronous}")
+
+    for name, key in (('busy_timeout', "SQLITE_BUSY_TIMEOUT"),
+                      ('cache_size', "SQLITE_CACHE_SIZE"),
+                      ('mmap_size', "SQLITE_MMAP_SIZE")):
+        if config[key] not in (None, ''):
+            pragmas.append(f"PRAGMA {name}={int(config[key])}")
+
+    return pragmas
+
+
+def init_sqlite_pragmas(app):
+    """db.init_app の後に呼ぶ。SQLite のエンジンに接続時の PRAGMA を仕掛ける"""
+    pragmas = sqlite_pragmas(app.config)
+
+    def _on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in pragmas:
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
 
-db = SQLAlchemy()
+    with app.app_context():
+        engines = list(db.engines.values())
+    for engine in engines:
+        if engine.dialect.name == 'sqlite':
+            event.listen(engine, 'connect', _on_connect)
@@ -3,6 +3,13 @@ from .db import db
 
 class Device(db.Model):
     __tablename__ = "device"
+    __table_args__ = (
+        # ログイン時の一括失効用
+        db.Index('ix_device_user_id_is_revoked', 'user_id', 'is_revoked'),
+        # 失効済み・期限切れトークンの定期削除用
+        db.Index('ix_device_is_revoked', 'is_revoked'),
+        db.Index('ix_device_expires_at', 'expires_at'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     # ondelete='CASCADE' を追加
@@ -2,34 +2,101 @@ from datetime import datetime, timezone
 from .db import db
 
 class Friend(db.Model):
+    """
+    友達関係は 1 組につき 1 行（小さい方の id を low_id、大きい方を high_id に正規化）。
+    申請した側が requester_id、承認待ちの受け手はもう一方。
+    2 人の関係は (low_id, high_id) の一意索引 1 回、ある人の友達は low 側・high 側の索引 2 本の UNION で引く。
+    """
     __tablename__ = 'friend'
+    __table_args__ = (
+        # 1 組 1 行（逆向きの重複申請もここで弾く）
+        db.UniqueConstraint('low_id', 'high_id', name='uq_friend_low_id_high_id'),
+        db.CheckConstraint('low_id < high_id', name='ck_friend_low_id_lt_high_id'),
+        # 友達一覧・承認待ち（low 側 / high 側それぞれ）
+        db.Index('ix_friend_low_id_status', 'low_id', 'status'),
+        db.Index('ix_friend_high_id_status', 'high_id', 'status'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
-    # 両方の外部キーに ondelete='CASCADE' を追加
-    user_id = db.Column(
+    low_id = db.Column(
+        db.Integer,
+        db.ForeignKey('user.id', ondelete='CASCADE', name='fk_friend_low_id_user'),
+        nullable=False
+    )
+    high_id = db.Column(
         db.Integer,
-        db.ForeignKey('user.id', ondelete='CASCADE'),
+        db.ForeignKey('user.id', ondelete='CASCADE', name='fk_friend_high_id_user'),
         nullable=False
     )
-    friend_id = db.Column(
+    requester_id = db.Column(
         db.Integer,
-        db.ForeignKey('user.id', ondelete='CASCADE'),
+        db.ForeignKey('user.id', ondelete='CASCADE', name='fk_friend_requester_id_user'),
         nullable=False
     )
     status = db.Column(db.String(20), default='pending')  # 承認状態を管理
     created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
 
     def __repr__(self):
-        return f'<Friend {self.user_id} ↔ {self.friend_id} ({self.status})>'
+        return f'<Friend {self.low_id} ↔ {self.high_id} by {self.requester_id} ({self.status})>'
+
+    # --- 正規化 ---
+    @staticmethod
+    def pair(a, b):
+        """2 人の id を (low_id, high_id) にする"""
+        a, b = int(a), int(b)
+        return (a, b) if a < b else (b, a)
+
+    @staticmethod
+    def values(requester_id, addressee_id, status='pending'):
+        """requester_id → addressee_id の申請 1 件分の列の値（Friend(**...) や一括 INSERT 用）"""
+        low_id, high_id = Friend.pair(requester_id, addressee_id)
+        return {'low_id': low_id, 'high_id': high_id, 'requester_id': int(requester_id), 'status': status}
+
+    @classmethod
+    def between(cls, a, b):
+        """2 人の関係を引く条件（一意索引の等価検索 1 回）"""
+        low_id, high_id = cls.pair(a, b)
+        return db.and_(cls.low_id == low_id, cls.high_id == high_id)
+
+    @classmethod
+    def between_any(cls, user_id, other_ids):
+        """user_id と other_ids の誰かとの関係を引く条件（相手ごとに一意索引の等価検索）"""
+        lows = [o for o in other_ids if o < user_id]
+        highs = [o for o in other_ids if o > user_id]
+        return db.or_(
+            db.and_(cls.high_id == user_id, cls.low_id.in_(lows)),
+            db.and_(cls.low_id == user_id, cls.high_id.in_(highs))
+        )
+
+    def other_id(self, user_id):
+        return self.high_id if self.low_id == user_id else self.low_id
+
+    # --- 隣接（low 側と high 側の索引をそれぞれ引いて UNION ALL） ---
+    @classmethod
+    def adjacency(cls, user_id, status='accepted', incoming_only=False):
+        """
+        user_id の相手を (uid, fid=Friend.id) で返す SELECT。
+        incoming_only=True なら相手から届いた申請（requester_id が相手）だけ。
+        """
+        low_side = db.select(cls.high_id.label('uid'), cls.id.label('fid')).where(
+            cls.low_id == user_id, cls.status == status
+        )
+        high_side = db.select(cls.low_id.label('uid'), cls.id.label('fid')).where(
+            cls.high_id == user_id, cls.status == status
+        )
+        if incoming_only:
+            low_side = low_side.where(cls.requester_id == cls.high_id)
+            high_side = high_side.where(cls.requester_id == cls.low_id)
+        return db.union_all(low_side, high_side)
 
     # --- 双方向検索（承認済みのみ） ---
     @staticmethod
     def get_friend_ids(user_id):
         """
-        特定ユーザーの friend_id 一覧を取得（双方向対応・承認済みのみ）。
+        特定ユーザーの友達の id 一覧を承認順（Friend.id 昇順）で取得（双方向対応・承認済みのみ）。
+        ルートからは services.friend_graph.friend_cache 経由で呼ぶこと。
         """
-        friends_as_user = Friend.query.filter_by(user_id=user_id, status='accepted').all()
-        friends_as_friend = Friend.query.filter_by(friend_id=user_id, status='accepted').all()
-
-        ids = {f.friend_id for f in friends_as_user} | {f.user_id for f in friends_as_friend}
-        return list(ids)
+        # サブクエリで包まず UNION ALL に直接 ORDER BY を付ける（包むと一時表を挟んで倍遅い）
+        return db.session.execute(
+            Friend.adjacency(user_id).order_by('fid')
+        ).scalars().all()
@@ -1,14 +1,35 @@
 from flask_login import UserMixin
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
+import unicodedata
 from .db import db  # app.pyからdbをインポート
 
+def normalize_username(name):
+    """検索用の表記ゆれ吸収（全角英数→半角、大文字→小文字）"""
+    return unicodedata.normalize('NFKC', name).lower()
+
+
 # --- Userモデル ---
 class User(db.Model, UserMixin):
+    __table_args__ = (
+        # 前方一致の範囲検索用（Postgres は LIKE 'abc%' を索引で引けるよう pattern_ops）
+        db.Index(
+            'ix_user_username_key', 'username_key',
+            postgresql_ops={'username_key': 'text_pattern_ops'}
+        ),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
 
     # 🔹 名前（ユニーク）
     username = db.Column(db.String(64), unique=True, nullable=False)
 
+    # 🔹 検索用の正規化した名前（username から自動で入る）
+    username_key = db.Column(
+        db.String(128),
+        nullable=False,
+        default=lambda ctx: normalize_username(ctx.get_current_parameters()['username'])
+    )
+
     # 🔹 PIN（4〜6桁）
     pin = db.Column(db.String(6), nullable=False)
 
@@ -19,11 +40,44 @@ class User(db.Model, UserMixin):
 
     schedules = db.relationship('Schedule', backref='user', lazy=True)
 
+    @classmethod
+    def username_prefix(cls, prefix):
+        """
+        username_key の前方一致条件（prefix は正規化済み）。
+        SQLite の LIKE は大文字小文字を区別せず索引を使えないので、範囲（prefix 以上・次の文字列未満）で引く。
+        """
+        if db.session.get_bind().dialect.name == 'postgresql':
+            return cls.username_key.startswith(prefix, autoescape=True)
+        upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+        return db.and_(cls.username_key >= prefix, cls.username_key < upper)
+
+    @classmethod
+    def search_prefix(cls, prefix, limit):
+        """正規化済み prefix で始まるユーザーを (id, username) で limit 件（username_key 順）"""
+        return db.session.query(cls.id, cls.username).filter(
+            cls.username_prefix(prefix)
+        ).order_by(cls.username_key, cls.id).limit(limit).all()
+
     def __repr__(self):
         return f'<User {self.username}>'
 
+# --- 時間帯の表記 ↔ 数値コード（ビット：1=昼, 2=夜） ---
+SLOT_CODES = {'昼': 1, '夜': 2, '両方': 3}
+SLOT_LABELS = {code: label for label, code in SLOT_CODES.items()}
+
 # --- Scheduleモデル ---
 class Schedule(db.Model):
+    """
+    予定の正本（1ユーザー1日1行）。書き込みはすべてここに入れ、同じトランザクションで ScheduleMonth も更新する。
+    画面・API の読み込みは ScheduleMonth から行い、食い違ったら ScheduleMonth.rebuild() でここから作り直す。
+    """
+    __table_args__ = (
+        # 1ユーザー1日1行。週表示の範囲検索（user_id + 日付）もこの索引を使う
+        db.UniqueConstraint('user_id', 'date', name='uq_schedule_user_id_date'),
+        # 保持期限の削除（日付のみ）用
+        db.Index('ix_schedule_date', 'date'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     # ondelete='CASCADE' を追加
     user_id = db.Column(
@@ -31,9 +85,104 @@ class Schedule(db.Model):
         db.ForeignKey('user.id', ondelete='CASCADE'),
         nullable=False
     )
-    date = db.Column(db.String(20), nullable=False)
+    date = db.Column(db.Date, nullable=False)
     time_type = db.Column(db.String(10), nullable=False)  # '昼', '夜', '両方'
     created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
 
     def __repr__(self):
         return f'<Schedule {self.date} ({self.time_type})>'
+
+
+# --- ScheduleMonthモデル（1ユーザー1か月1行の予定ビット列） ---
+class ScheduleMonth(db.Model):
+    """
+    bits の 2*(日-1) ビット目から 2 ビットがその日の SLOT_CODES（0=なし / 1=昼 / 2=夜 / 3=両方）。
+    Schedule から作れる読み込み用の写し。Schedule と同じトランザクションで更新し、読み込みはこちらから行う。
+    updated_at は ETag のスタンプ（_schedule_stamp）の材料。
+    """
+    __tablename__ = 'schedule_month'
+    __table_args__ = (
+        # 保持期限の削除（月のみ）用
+        db.Index('ix_schedule_month_month', 'month'),
+    )
+
+    user_id = db.Column(
+        db.Integer,
+        db.ForeignKey('user.id', ondelete='CASCADE'),
+        primary_key=True
+    )
+    month = db.Column(db.Date, primary_key=True)  # 月初日
+    bits = db.Column(db.BigInteger, nullable=False, default=0)
+    updated_at = db.Column(
+        db.DateTime,
+        default=lambda: datetime.now(timezone.utc),
+        onupdate=lambda: datetime.now(timezone.utc)
+    )
+
+    @staticmethod
+    def month_of(d):
+        return d.replace(day=1)
+
+    @staticmethod
+    def shift_of(d):
+        return 2 * (d.day - 1)
+
+    @staticmethod
+    def encode(day_codes):
+        """{日付: コード}（同じ月）を bits に詰める"""
+        bits = 0
+        for d, code in day_codes.items():
+            bits |= code << ScheduleMonth.shift_of(d)
+        return bits
+
+    @staticmethod
+    def decode(rows, start, end):
+        """(user_id, month, bits) の行から、start〜end の (user_id, 日付, コード) を取り出す"""
+        for user_id, month, bits in rows:
+            # 範囲外の日のビットを先に落としておく
+            first = max((start - month).days, 0)
+            last = min((end - month).days, 30)
+            if last < first:
+                continue
+            bits = (bits >> (2 * first)) & ((1 << (2 * (last - first + 1))) - 1)
+            first_day = month + timedelta(days=first)
+
+            while bits:
+                shift = (bits & -bits).bit_length() - 1
+                shift -= shift & 1
+                yield user_id, first_day + timedelta(days=shift // 2), (bits >> shift) & 3
+                bits &= ~(3 << shift)
+
+    @classmethod
+    def in_range(cls, user_ids, start, end):
+        """start〜end を含む月の行を取る条件"""
+        return db.and_(
+            cls.user_id.in_(user_ids),
+            cls.month.between(cls.month_of(start), end)
+        )
+
+    @classmethod
+    def rebuild(cls, user_ids=None):
+        """Schedule から作り直す（Schedule に直接書き込んだ投入データ用。commit は呼び出し側）"""
+        query = db.session.query(Schedule.user_id, Schedule.date, Schedule.time_type)
+        delete = db.delete(cls)
+        if user_ids is not None:
+            query = query.filter(Schedule.user_id.in_(user_ids))
+            delete = delete.where(cls.user_id.in_(user_ids))
+
+        months = {}
+        for user_id, d, time_type in query.yield_per(5000):
+            key = (user_id, cls.month_of(d))
+            months[key] = months.get(key, 0) | (SLOT_CODES.get(time_type, 0) << cls.shift_of(d))
+
+        db.session.execute(delete)
+        if months:
+            now = datetime.now(timezone.utc)
+            db.session.execute(db.insert(cls), [
+                {'user_id': user_id, 'month': month, 'bits': bits, 'updated_at': now}
+                for (user_id, month), bits in months.items()
+            ])
+        return len(months)
+
+    def __repr__(self):
+        return f'<ScheduleMonth {self.user_id} {self.month:%Y-%m} {self.bits:#x}>'
@@ -4,13 +4,15 @@ from flask import Blueprint, render_template, request, redirect, url_for, flash,
 from flask_login import login_user, logout_user, login_required, current_user
 from datetime import datetime, timedelta, timezone
 from models import db
-from models.models import User
+from models.db import use_primary
+from models.models import User, normalize_username
 from models.device import Device
+from services.identity import identity_cache
+from services.user_search import user_search_cache
 import secrets
-from flask_bcrypt import Bcrypt
+from services.hashing import pin_hasher, HashPoolBusy
 
 auth_bp = Blueprint('auth', __name__)
-bcrypt = Bcrypt()
 
 COOKIE_NAME = "device_token"
 TOKEN_TTL_DAYS = 30
@@ -70,6 +72,12 @@ def _validate_pin(pin: str, redirect_target: str):
     return None
 
 
+def _busy_response(mode):
+    """ハッシュ計算の待ち行列が一杯 → 503 で早めに断る"""
+    flash('ただいま混み合っています。少し時間をおいて再度お試しください。', 'error')
+    return render_template('register.html', mode=mode), 503, {'Retry-After': '2'}
+
+
 # ======================================================
 # 自動ログイン（app.py で before_request に登録する）
 # ======================================================
@@ -81,22 +89,24 @@ def auto_login():
     if not token:
         return
 
-    device = Device.query.filter_by(token=token, is_revoked=False).first()
-    if not device:
+    # Device + User を 1 回の JOIN で（検証済みトークンはキャッシュから）
+    found = identity_cache.lookup_token(token)
+    if not found:
         return
 
-    expires_at = device.expires_at
+    user, expires_at = found
     if expires_at and expires_at.tzinfo is None:
         expires_at = expires_at.replace(tzinfo=timezone.utc)
 
     now = datetime.now(timezone.utc)
 
     if expires_at and expires_at <= now:
+        identity_cache.forget_tokens(token)
         resp = make_response(redirect(url_for('auth.login')))
         resp.delete_cookie(COOKIE_NAME)
         return resp
 
-    login_user(device.user)
+    login_user(user)
 
 
 # ======================================================
@@ -113,7 +123,9 @@ def force_register_if_not_logged_in():
         '/login',
         '/static',
         '/__cleanup',
+        '/__stats',
         '/landing',
+        '/calendar/feed',   # カレンダーアプリは Cookie を送れない（URL のトークンで確認）
     ]
 
     if any(path.startswith(p) for p in allowed_paths):
@@ -146,11 +158,16 @@ def register():
             return redirect(url_for('auth.register'))
 
         # ★ PIN をハッシュ化して保存
-        hashed_pin = bcrypt.generate_password_hash(pin).decode('utf-8')
+        try:
+            hashed_pin = pin_hasher.hash(pin)
+        except HashPoolBusy:
+            return _busy_response('register')
 
         new_user = User(username=username, pin=hashed_pin, device_token=None)
         db.session.add(new_user)
         db.session.commit()
+        # 入力補完のキャッシュに新しい名前を出す
+        user_search_cache.invalidate_name(normalize_username(username))
 
         login_user(new_user)
 
@@ -191,16 +208,37 @@ def login():
             return res
 
         # ★ ハッシュ比較
-        if not bcrypt.check_password_hash(user.pin, pin):
+        try:
+            pin_ok = pin_hasher.check(user.pin, pin)
+        except HashPoolBusy:
+            return _busy_response('login')
+
+        if not pin_ok:
             flash('PIN が正しくありません。', 'error')
             return redirect(url_for('auth.login'))
 
-        login_user(user)
+        # ★ コスト設定が変わっていれば、平文 PIN が手元にある今のうちに再ハッシュ
+        if pin_hasher.needs_rehash(user.pin):
+            try:
+                user.pin = pin_hasher.hash(pin)
+            except HashPoolBusy:
+                pass  # 次回ログイン時に再挑戦
 
-        Device.query.filter_by(user_id=user.id, is_revoked=False).update({'is_revoked': True})
+        login_user(user)
+        user_id = user.id  # commit 後に user を再読み込みさせない
+
+        # 既存トークンを一括失効（RETURNING で失効したトークンを受け取りキャッシュからも消す）
+        revoked = db.session.execute(
+            db.update(Device)
+            .where(Device.user_id == user_id, Device.is_revoked == False)
+            .values(is_revoked=True)
+            .returning(Device.token)
+        ).scalars().all()
         db.session.commit()
+        identity_cache.forget_tokens(*revoked)
+        identity_cache.forget_user(user_id)
 
-        token = _issue_device_token(user.id)
+        token = _issue_device_token(user_id)
         resp = make_response(redirect(url_for('schedule.weekly')))
         _set_login_cookie(resp, token)
         return resp
@@ -213,6 +251,7 @@ def login():
 # ======================================================
 @auth_bp.route('/logout')
 @login_required
+@use_primary()  # GET だが Device を読んで失効させるので primary を読む
 def logout():
     token = request.cookies.get(COOKIE_NAME)
 
@@ -221,6 +260,7 @@ def logout():
         if device:
             device.is_revoked = True
             db.session.commit()
+        identity_cache.forget_tokens(token)
 
     logout_user()
     flash('ログアウトしました。', 'info')
@@ -0,0 +1,209 @@
+from flask import Blueprint, render_template, request, jsonify, make_response
+from datetime import date, timedelta
+from flask_login import login_required, current_user
+from models import db
+from services.friend_graph import friend_cache
+from routes.schedule import _schedule_stamp, _read_slots, _make_etag, _not_modified, _with_etag
+
+# Blueprint設定
+availability_bp = Blueprint('availability', __name__)
+
+MAX_WEEKS = 12
+DEFAULT_WEEKS = 4
+DEFAULT_MIN_FRIENDS = 3  # 自分＋3 人で卓が立つ
+
+# 昼・夜それぞれのビット（SLOT_CODES の 1=昼 / 2=夜 / 3=両方 と対応）
+SLOT_BITS = (('昼', 1), ('夜', 2))
+
+
+# ==========================================
+# 🧮 空き日の集計エンジン（ビットマスク）
+# ==========================================
+def build_masks(rows, start, days):
+    """
+    (user_id, date, コード) の行から、ユーザーごとに
+    {'昼': int, '夜': int}（ビット i = start + i 日目に空いている）を作る。
+    """
+    base = start.toordinal()
+    noon, night = {}, {}
+    for uid, d, code in rows:
+        offset = d.toordinal() - base
+        if not 0 <= offset < days:
+            continue
+        bit = 1 << offset
+        if code & 1:
+            noon[uid] = noon.get(uid, 0) | bit
+        if code & 2:
+            night[uid] = night.get(uid, 0) | bit
+    return {
+        uid: {'昼': noon.get(uid, 0), '夜': night.get(uid, 0)}
+        for uid in noon.keys() | night.keys()
+    }
+
+
+def count_bits(masks):
+    """
+    ビットスライス加算器：日ごとの人数を、桁ごとの int（counters[j] = 人数の 2^j の桁）で持つ。
+    1 人分の加算は桁数ぶんの AND/XOR だけで、全日分を同時に処理できる。
+    """
+    counters = []
+    for mask in masks:
+        carry = mask
+        for j in range(len(counters)):
+            if not carry:
+                break
+            counters[j], carry = counters[j] ^ carry, counters[j] & carry
+        if carry:
+            counters.append(carry)
+    return counters
+
+
+def at_least(counters, k, days):
+    """人数が k 以上の日のビットを返す（上の桁から比較）"""
+    full = (1 << days) - 1
+    if k <= 0:
+        return full
+    if k >= 1 << len(counters):
+        return 0
+
+    greater, equal = 0, full
+    for j in reversed(range(len(counters))):
+        if (k >> j) & 1:
+            equal &= counters[j]
+        else:
+            greater |= equal & counters[j]
+            equal &= ~counters[j]
+    return (greater | equal) & full
+
+
+def find_common_days(masks, friend_ids, me, k, days):
+    """
+    友達が k 人以上空いている (日オフセット, 枠) を列挙する。
+    戻り値: [(offset, slot, [空いている友達の id], 自分も空いているか)]
+    """
+    results = []
+    for slot, _ in SLOT_BITS:
+        friend_masks = [(uid, masks[uid][slot]) for uid in friend_ids if uid in masks]
+        hits = at_least(count_bits([m for _, m in friend_masks]), k, days)
+        if not hits:
+            continue
+        mine = masks.get(me, {}).get(slot, 0)
+
+        # 該当日に空いている友達の一覧（立っているビットだけをたどる）
+        free = {}
+        for uid, mask in friend_masks:
+            rest = mask & hits
+            while rest:
+                low = rest & -rest
+                free.setdefault(low.bit_length() - 1, []).append(uid)
+                rest ^= low
+
+        for offset, uids in free.items():
+            results.append((offset, slot, uids, bool(mine >> offset & 1)))
+
+    results.sort(key=lambda r: (r[0], r[1] != '昼'))
+    return results
+
+
+def _parse_args():
+    """(開始日, 週数, 最低人数) を返す。不正なら ValueError"""
+    start = date.fromisoformat(request.args['from']) if 'from' in request.args else date.today()
+    weeks = int(request.args.get('weeks', DEFAULT_WEEKS))
+    k = int(request.args.get('k', DEFAULT_MIN_FRIENDS))
+    if not 1 <= weeks <= MAX_WEEKS or k < 1:
+        raise ValueError()
+    return start, weeks, k
+
+
+def _common_days(start, weeks, k):
+    """ETag と、結果を組み立てる関数を返す（304 のときは組み立てない）"""
+    days = 7 * weeks
+    end = start + timedelta(days=days - 1)
+    friend_ids = friend_cache.get_friend_ids(current_user.id)
+    user_ids = [current_user.id] + friend_ids
+
+    etag = _make_etag(
+        'availability', current_user.id, start, weeks, k,
+        user_ids, _schedule_stamp(user_ids, start, end)
+    )
+
+    def build():
+        from models.models import User
+
+        # 範囲検索 1 回でマスクを作り、集計はビット演算だけで行う
+        masks = build_masks(_read_slots(user_ids, start, end), start, days)
+        found = find_common_days(masks, friend_ids, current_user.id, k, days)
+
+        free_ids = {uid for _, _, free, _ in found for uid in free}
+        names = {}
+        if free_ids:
+            names = dict(db.session.query(User.id, User.username).filter(User.id.in_(free_ids)).all())
+
+        results = [
+            {
+                'date': start + timedelta(days=offset),
+                'slot': slot,
+                'count': len(free),
+                'friends': free,
+                'me': me_free,
+            }
+            for offset, slot, free, me_free in found
+        ]
+        return end, results, names
+
+    return etag, build
+
+
+# ==========================================
+# 🀄 卓が立ちそうな日（自分＋友達 k 人）
+# ==========================================
+@availability_bp.route('/availability')
+@login_required
+def availability():
+    """これから数週間で、友達が k 人以上空いている日と枠を一覧表示"""
+    try:
+        start, weeks, k = _parse_args()
+    except ValueError:
+        start, weeks, k = date.today(), DEFAULT_WEEKS, DEFAULT_MIN_FRIENDS
+
+    etag, build = _common_days(start, weeks, k)
+    cached = _not_modified(etag)
+    if cached:
+        return cached
+
+    end, results, names = build()
+    return _with_etag(make_response(render_template(
+        'availability.html',
+        results=results, names=names, start=start, end=end, weeks=weeks, k=k, max_weeks=MAX_WEEKS
+    )), etag)
+
+
+@availability_bp.route('/api/availability')
+@login_required
+def api_availability():
+    """
+    JSON 版（from=YYYY-MM-DD, weeks=1〜12, k=最低人数）。
+    days は [{date, slot, count, friends: [id...], me}]、名前は users に id → 名前で返す。
+    """
+    try:
+        start, weeks, k = _parse_args()
+    except ValueError:
+        return jsonify({"error": f"from は YYYY-MM-DD、weeks は 1〜{MAX_WEEKS}、k は 1 以上の整数で指定してください。"}), 400
+
+    etag, build = _common_days(start, weeks, k)
+    cached = _not_modified(etag)
+    if cached:
+        return cached
+
+    end, results, names = build()
+    for r in results:
+        r['date'] = r['date'].isoformat()
+
+    # 名前は users 表に 1 回だけ、各日は友達 id の並び（/api/weekly と同じ形）
+    return _with_etag(jsonify({
+        "from": start.isoformat(),
+        "to": end.isoformat(),
+        "k": k,
+        "users": {str(uid): name for uid, name in names.items()},
+        "days": results,
+    }), etag)
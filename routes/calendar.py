@@ -0,0 +1,217 @@
+from flask import Blueprint, render_template, request, redirect, url_for, flash, make_response, current_app, Response, stream_with_context, abort
+from datetime import date, datetime, time, timedelta, timezone
+from flask_login import login_required, current_user
+from werkzeug.http import is_resource_modified
+from models import db
+from models import ScheduleMonth, CalendarFeed
+from models.models import User, SLOT_LABELS
+from services.friend_graph import friend_cache
+from routes.schedule import _format_stamp, _make_etag, _with_etag
+import secrets
+
+calendar_bp = Blueprint('calendar', __name__)
+
+# カレンダーアプリの再取得間隔の目安（REFRESH-INTERVAL / X-PUBLISHED-TTL）
+REFRESH_INTERVAL = 'PT15M'
+# ストリーミング時に 1 回で取り出す schedule_month の行数
+FEED_FETCH_SIZE = 500
+# 1 回の書き込みにまとめる文字数（1 行ずつ送ると書き込み回数が増える）
+FEED_CHUNK_SIZE = 16 * 1024
+
+
+# ======================================================
+# 共通：購読用トークン
+# ======================================================
+def _active_token(user_id):
+    return db.session.query(CalendarFeed.token).filter(
+        CalendarFeed.user_id == user_id,
+        CalendarFeed.is_revoked.is_(False)
+    ).order_by(CalendarFeed.id.desc()).limit(1).scalar()
+
+
+def _revoke_tokens(user_id):
+    db.session.execute(
+        db.update(CalendarFeed).where(
+            CalendarFeed.user_id == user_id,
+            CalendarFeed.is_revoked.is_(False)
+        ).values(is_revoked=True)
+    )
+
+
+def _feed_owner(token):
+    """有効なトークンの持ち主の user_id（なければ None）"""
+    return db.session.query(CalendarFeed.user_id).filter(
+        CalendarFeed.token == token,
+        CalendarFeed.is_revoked.is_(False)
+    ).scalar()
+
+
+# ======================================================
+# iCalendar（RFC 5545）の書き出し
+# ======================================================
+def _ics_text(value):
+    """TEXT 値のエスケープ（\\ ; , 改行）"""
+    return (value.replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+            .replace('\r\n', '\\n').replace('\n', '\\n'))
+
+
+def _ics_line(line):
+    """75 オクテットで折り返して CRLF を付ける（UTF-8 の文字の途中では切らない）"""
+    if len(line.encode('utf-8')) <= 75:
+        return line + '\r\n'
+    parts, current, size, limit = [], [], 0, 75
+    for ch in line:
+        n = len(ch.encode('utf-8'))
+        if size + n > limit:
+            parts.append(''.join(current))
+            # 2 行目以降は先頭の空白 1 オクテットを含めて 75
+            current, size, limit = [], 0, 74
+        current.append(ch)
+        size += n
+    parts.append(''.join(current))
+    return '\r\n '.join(parts) + '\r\n'
+
+
+def _feed_window():
+    """配信する範囲（今日の CALENDAR_PAST_DAYS 日前〜CALENDAR_WEEKS 週後）"""
+    today = date.today()
+    start = today - timedelta(days=current_app.config.get("CALENDAR_PAST_DAYS", 7))
+    end = today + timedelta(weeks=current_app.config.get("CALENDAR_WEEKS", 8))
+    return today, start, end
+
+
+def _last_modified(latest, today):
+    """
+    予定の最終更新時刻。配信範囲は日ごとにずれるので、少なくとも今日の 0 時にする。
+    友達の増減は ETag にしか表れない（If-Modified-Since だけの購読側には翌日までに届く）。
+    """
+    floor = datetime.combine(today, time.min, tzinfo=timezone.utc)
+    if latest is None:
+        return floor
+    if latest.tzinfo is None:
+        latest = latest.replace(tzinfo=timezone.utc)
+    return max(latest, floor)
+
+
+def _generate_ics(user_ids, names, start, end, stamp):
+    """
+    VCALENDAR を FEED_CHUNK_SIZE 文字ずつまとめて返す。schedule_month は yield_per で
+    サーバー側カーソルから少しずつ取り出し、日ごとの予定もその場で復元する（全件をメモリに載せない）。
+    """
+    rows = db.session.query(ScheduleMonth.user_id, ScheduleMonth.month, ScheduleMonth.bits).filter(
+        ScheduleMonth.in_range(user_ids, start, end)
+    ).order_by(ScheduleMonth.user_id, ScheduleMonth.month).execution_options(yield_per=FEED_FETCH_SIZE)
+    # 最初のチャンクを返す前に実行しておく（失敗するならヘッダー送信前に）
+    result = iter(rows)
+
+    buf = [
+        _ics_line('BEGIN:VCALENDAR'),
+        _ics_line('VERSION:2.0'),
+        _ics_line('PRODID:-//jantomo//schedule feed//JA'),
+        _ics_line('CALSCALE:GREGORIAN'),
+        _ics_line('METHOD:PUBLISH'),
+        _ics_line('X-WR-CALNAME:' + _ics_text('じゃんとも')),
+        _ics_line('X-WR-TIMEZONE:Asia/Tokyo'),
+        _ics_line('REFRESH-INTERVAL;VALUE=DURATION:' + REFRESH_INTERVAL),
+        _ics_line('X-PUBLISHED-TTL:' + REFRESH_INTERVAL),
+    ]
+    size = sum(map(len, buf))
+
+    dtstamp = stamp.strftime('%Y%m%dT%H%M%SZ')
+    for uid, d, code in ScheduleMonth.decode(result, start, end):
+        label = SLOT_LABELS.get(code)
+        if not label:
+            continue
+        day = d.strftime('%Y%m%d')
+        event = (
+            'BEGIN:VEVENT\r\n'
+            f'UID:{uid}-{day}@jantomo\r\n'
+            f'DTSTAMP:{dtstamp}\r\n'
+            f'DTSTART;VALUE=DATE:{day}\r\n'
+            f'DTEND;VALUE=DATE:{(d + timedelta(days=1)):%Y%m%d}\r\n'
+            + _ics_line('SUMMARY:' + _ics_text(f"{names.get(uid, '')}（{label}）"))
+            + 'TRANSP:TRANSPARENT\r\n'
+            'END:VEVENT\r\n'
+        )
+        buf.append(event)
+        size += len(event)
+        if size >= FEED_CHUNK_SIZE:
+            yield ''.join(buf)
+            buf, size = [], 0
+
+    buf.append(_ics_line('END:VCALENDAR'))
+    yield ''.join(buf)
+
+
+# ==========================================
+# 📅 カレンダー購読の設定画面
+# ==========================================
+@calendar_bp.route('/calendar')
+@login_required
+def calendar():
+    token = _active_token(current_user.id)
+    feed_url = url_for('calendar.feed', token=token, _external=True) if token else None
+    webcal_url = 'webcal://' + feed_url.split('://', 1)[1] if feed_url else None
+    return render_template('calendar.html', feed_url=feed_url, webcal_url=webcal_url)
+
+
+@calendar_bp.route('/calendar/token', methods=['POST'])
+@login_required
+def issue_token():
+    """購読 URL を発行する（発行済みなら古い URL を無効にして作り直す）"""
+    _revoke_tokens(current_user.id)
+    db.session.add(CalendarFeed(user_id=current_user.id, token=secrets.token_hex(32)))
+    db.session.commit()
+    flash('購読用の URL を発行しました。', 'success')
+    return redirect(url_for('calendar.calendar'))
+
+
+@calendar_bp.route('/calendar/token/revoke', methods=['POST'])
+@login_required
+def revoke_token():
+    _revoke_tokens(current_user.id)
+    db.session.commit()
+    flash('購読用の URL を無効にしました。', 'success')
+    return redirect(url_for('calendar.calendar'))
+
+
+# ==========================================
+# 📡 iCalendar フィード（ログイン不要・URL のトークンで本人確認）
+# ==========================================
+@calendar_bp.route('/calendar/feed/<token>.ics')
+def feed(token):
+    """
+    自分＋友達の予定を終日の予定として配信する。
+    カレンダーアプリは数十分おきに取りに来るので、変わっていなければ
+    ETag / Last-Modified で 304 を返し、本文を作らない。
+    """
+    user_id = _feed_owner(token)
+    if user_id is None:
+        abort(404)
+
+    today, start, end = _feed_window()
+    user_ids = [user_id] + friend_cache.get_friend_ids(user_id)
+
+    count, latest = db.session.query(
+        db.func.count(), db.func.max(ScheduleMonth.updated_at)
+    ).filter(ScheduleMonth.in_range(user_ids, start, end)).one()
+    etag = _make_etag('ics', user_id, start, end, user_ids, _format_stamp(count, latest))
+    last_modified = _last_modified(latest, today)
+
+    if not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        resp = make_response('', 304)
+        resp.last_modified = last_modified
+        return _with_etag(resp, etag)
+
+    names = dict(
+        db.session.query(User.id, User.username).filter(User.id.in_(user_ids)).all()
+    )
+
+    resp = Response(
+        stream_with_context(_generate_ics(user_ids, names, start, end, last_modified)),
+        mimetype='text/calendar'
+    )
+    resp.headers['Content-Type'] = 'text/calendar; charset=utf-8'
+    resp.headers['Content-Disposition'] = 'inline; filename="jantomo.ics"'
+    resp.last_modified = last_modified
+    return _with_etag(resp, etag)
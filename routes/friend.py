@@ -1,8 +1,15 @@
-from flask import Blueprint, render_template, flash
+from flask import Blueprint, render_template, flash, Response, current_app, jsonify
 from flask_login import login_required, current_user
 from models import db
 from models.friend import Friend
-from models.models import User  # Userテーブルを参照
+from sqlalchemy.exc import IntegrityError
+from models.models import User, normalize_username  # Userテーブルを参照
+from services.friend_graph import friend_cache
+from services.user_search import user_search_cache
+from services.pubsub import pending_hub
+import json
+import queue
+import time
 
 # Blueprint設定
 friend_bp = Blueprint('friend', __name__)
@@ -10,25 +17,82 @@ friend_bp = Blueprint('friend', __name__)
 # ==========================================
 # 👥 友達一覧ページ
 # ==========================================
+FRIEND_PAGE_SIZE = 30
+FRIEND_SORTS = ('name', 'date')
+
+
+def _friend_page(user_id, sort='name', prefix='', after=None, after_name=None, limit=FRIEND_PAGE_SIZE):
+    """
+    承認済みの友達を 1 ページ分返す（keyset ページング）。
+    sort='name' は (username, User.id) の昇順、sort='date' は友達になった順（Friend.id）の新しい順。
+    戻り値: ([{'id', 'username'}], 次ページのカーソル or None)
+    """
+    # low 側・high 側をそれぞれのインデックスで引いて UNION ALL
+    pairs = Friend.adjacency(user_id).subquery()
+
+    query = db.select(User.id, User.username, pairs.c.fid).join(pairs, pairs.c.uid == User.id)
+
+    if prefix:
+        query = query.where(User.username.startswith(prefix, autoescape=True))
+
+    if sort == 'date':
+        if after is not None:
+            query = query.where(pairs.c.fid < after)
+        query = query.order_by(pairs.c.fid.desc())
+    else:
+        if after is not None and after_name is not None:
+            query = query.where(db.or_(
+                User.username > after_name,
+                db.and_(User.username == after_name, User.id > after)
+            ))
+        query = query.order_by(User.username, User.id)
+
+    rows = db.session.execute(query.limit(limit + 1)).all()
+    items = [{'id': uid, 'username': name} for uid, name, _ in rows[:limit]]
+
+    cursor = None
+    if len(rows) > limit:
+        uid, name, fid = rows[limit - 1]
+        cursor = {'after': fid} if sort == 'date' else {'after': uid, 'after_name': name}
+    return items, cursor
+
+
+def _friend_page_args():
+    """クエリ文字列から (sort, prefix, after, after_name) を取り出す"""
+    sort = request.args.get('sort', 'name')
+    if sort not in FRIEND_SORTS:
+        sort = 'name'
+    prefix = request.args.get('q', '').strip()
+    after = request.args.get('after', type=int)
+    after_name = request.args.get('after_name')
+    return sort, prefix, after, after_name
+
+
 @friend_bp.route('/friends')
 @login_required
 def friend_list():
     """
-    承認済みの友達一覧を表示。
+    承認済みの友達一覧を 1 ページ分表示（続きは /friends/page から読み込む）。
     """
+    sort, prefix, after, after_name = _friend_page_args()
     try:
-        # Friendテーブルから承認済みフレンドIDを取得
-        friend_ids = Friend.get_friend_ids(current_user.id)
-
-        # 該当ユーザー情報をUserテーブルから取得
-        friends = User.query.filter(User.id.in_(friend_ids)).all()
+        friends, cursor = _friend_page(current_user.id, sort, prefix, after, after_name)
 
     except Exception as e:
         db.session.rollback()
         flash("友達情報の取得に失敗しました。", "error")
-        friends = []
+        friends, cursor = [], None
+
+    return render_template('friends.html', friends=friends, cursor=cursor, sort=sort, q=prefix)
 
-    return render_template('friends.html', friends=friends)
+
+@friend_bp.route('/friends/page')
+@login_required
+def friend_list_page():
+    """友達一覧の続き（JSON）"""
+    sort, prefix, after, after_name = _friend_page_args()
+    friends, cursor = _friend_page(current_user.id, sort, prefix, after, after_name)
+    return jsonify({'friends': friends, 'next': cursor})
 
 # ==========================================
 # 🗑️ 友達削除処理
@@ -40,21 +104,16 @@ from flask import request, redirect, url_for
 def friend_delete():
     """
     友達関係を削除する。
-    双方向のどちら側に自分がいても削除できるようにする。
+    どちらが申請した関係でも (low_id, high_id) の 1 行を消す。
     """
-    target_id = request.form.get('friend_id')
+    target_id = request.form.get('friend_id', type=int)
 
     if not target_id:
         flash("削除対象が指定されていません。", "error")
         return redirect(url_for('friend.friend_list'))
 
-    # 双方向で検索
-    relation = Friend.query.filter(
-        db.or_(
-            db.and_(Friend.user_id == current_user.id, Friend.friend_id == target_id),
-            db.and_(Friend.user_id == target_id, Friend.friend_id == current_user.id)
-        )
-    ).first()
+    # 2 人の組は一意索引で 1 回引くだけ
+    relation = Friend.query.filter(Friend.between(current_user.id, target_id)).first()
 
     if not relation:
         flash("友達関係が見つかりません。", "error")
@@ -63,6 +122,7 @@ def friend_delete():
     # 削除実行
     db.session.delete(relation)
     db.session.commit()
+    friend_cache.invalidate(relation.low_id, relation.high_id)
 
     flash("友達を削除しました。", "info")
     return redirect(url_for('friend.friend_list'))
@@ -83,8 +143,14 @@ def friend_request():
             flash("ユーザー名を入力してください。", "error")
             return redirect(url_for('friend.friend_request'))
 
-        # --- 対象ユーザーを検索 ---
+        # --- 対象ユーザーを検索（完全一致がなければ、大文字小文字・全角半角違いが 1 人だけのときそれを使う） ---
         target_user = User.query.filter_by(username=target_name).first()
+        if not target_user:
+            candidates = User.query.filter(
+                User.username_key == normalize_username(target_name)
+            ).limit(2).all()
+            if len(candidates) == 1:
+                target_user = candidates[0]
 
         if not target_user:
             flash("ユーザーが見つかりません。", "error")
@@ -95,82 +161,220 @@ def friend_request():
             flash("自分自身には申請できません。", "error")
             return redirect(url_for('friend.friend_request'))
 
-        # --- 既にフレンド関係がある場合を確認 ---
-        existing = Friend.query.filter(
-            db.or_(
-                db.and_(Friend.user_id == current_user.id, Friend.friend_id == target_user.id),
-                db.and_(Friend.user_id == target_user.id, Friend.friend_id == current_user.id)
-            )
-        ).first()
+        # --- 既にフレンド関係がある場合を確認（申請の向きは問わない） ---
+        existing = Friend.query.filter(Friend.between(current_user.id, target_user.id)).first()
 
         if existing:
             flash("既にフレンド登録されています。", "info")
             return redirect(url_for('friend.friend_request'))
 
         # --- Friend登録（MVP: pendingで申請待ち状態に）---
-        new_friend = Friend(user_id=current_user.id, friend_id=target_user.id, status='pending')
+        # commit で期限切れになった User を読み直さないよう、先に値を控える
+        user_id, target_id, target_name = current_user.id, target_user.id, target_user.username
+
+        new_friend = Friend(**Friend.values(user_id, target_id, 'pending'))
         db.session.add(new_friend)
-        db.session.commit()
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # 相手から同時に申請が来ていた（一意制約で 1 組 1 行）
+            db.session.rollback()
+            flash("既にフレンド登録されています。", "info")
+            return redirect(url_for('friend.friend_request'))
+        friend_cache.invalidate(user_id, target_id)
+        _notify_pending(target_id)
 
-        flash(f"{target_user.username} さんに友達申請を送りました！", "success")
+        flash(f"{target_name} さんに友達申請を送りました！", "success")
         return redirect(url_for('friend.friend_list'))
 
     return render_template('friend_request.html')
 
+
+# ==========================================
+# 🔎 ユーザー名の入力補完
+# ==========================================
+SEARCH_MIN_CHARS = 1
+SEARCH_MAX_CHARS = 32
+
+
+@friend_bp.route('/friend/search')
+@login_required
+def friend_search():
+    """
+    ユーザー名の前方一致（大文字小文字・全角半角を区別しない）で最大 USER_SEARCH_LIMIT 件。
+    入力のたびに呼ばれる前提で、同じ prefix はプロセス内キャッシュから返す。
+    """
+    prefix = normalize_username(request.args.get('q', '').strip())[:SEARCH_MAX_CHARS]
+    if len(prefix) < SEARCH_MIN_CHARS:
+        return jsonify({"q": prefix, "users": []})
+
+    limit = user_search_cache.limit
+    users = [
+        {"id": uid, "username": name}
+        for uid, name in user_search_cache.search(prefix)
+        if uid != current_user.id
+    ][:limit]
+
+    resp = jsonify({"q": prefix, "users": users})
+    resp.headers["Cache-Control"] = "private, max-age=30"
+    return resp
+
 # ==========================================
 # 📬 友達申請受領ページ（inbox）
 # ==========================================
 from flask import request, redirect, url_for, jsonify
 
+INBOX_PAGE_SIZE = 50
+MAX_BULK_IDS = 500
+
+
 @friend_bp.route('/friend/inbox', methods=['GET', 'POST'])
 @login_required
 def friend_inbox():
     """
     自分宛てに届いた友達申請一覧を表示し、
-    承認または拒否を処理する。
+    承認または拒否を処理する（チェックした複数件をまとめて処理できる）。
     """
     if request.method == 'POST':
         action = request.form.get('action')
-        from_user_id = request.form.get('from_user_id')
 
-        # 申請元を検索
-        target_friend = Friend.query.filter_by(
-            user_id=from_user_id,
-            friend_id=current_user.id,
-            status='pending'
-        ).first()
+        # 1 件の承認/拒否も一括も from_user_id の並びとして受け取る
+        sender_ids = set()
+        for raw in request.form.getlist('from_user_id')[:MAX_BULK_IDS]:
+            try:
+                sender_ids.add(int(raw))
+            except ValueError:
+                pass
+        sender_ids.discard(current_user.id)
 
-        if not target_friend:
+        if action not in ('accept', 'reject') or not sender_ids:
             flash("対象データが見つかりません。", "error")
-            return redirect(url_for('friend.friend_inbox'))
+            return redirect(url_for('friend.friend_inbox', after=request.args.get('after')))
+
+        user_id = current_user.id
+        # 申請元ごとの (low_id, high_id) を一意索引で引き、相手が申請した承認待ちだけに絞る
+        target = db.and_(
+            Friend.between_any(user_id, sender_ids),
+            Friend.requester_id != user_id,
+            Friend.status == 'pending'
+        )
 
+        # 承認は UPDATE、拒否は DELETE をそれぞれ 1 文で
         if action == 'accept':
-            target_friend.status = 'accepted'
-            flash("友達申請を承認しました！", "success")
-        elif action == 'reject':
-            db.session.delete(target_friend)
-            flash("友達申請を拒否しました。", "info")
-
+            stmt = db.update(Friend).where(target).values(status='accepted')
+        else:
+            stmt = db.delete(Friend).where(target)
+        done = db.session.execute(stmt.returning(Friend.requester_id)).scalars().all()
         db.session.commit()
-        return redirect(url_for('friend.friend_inbox'))
 
-    # --- 承認待ち（pending）の申請一覧を取得 ---
-    requests = Friend.query.filter_by(friend_id=current_user.id, status='pending').all()
+        if not done:
+            flash("対象データが見つかりません。", "error")
+            return redirect(url_for('friend.friend_inbox', after=request.args.get('after')))
 
-    # --- 申請元ユーザー情報を取得 ---
-    request_data = []
-    for r in requests:
-        from_user = User.query.get(r.user_id)
-        if from_user:
-            request_data.append(from_user)
+        friend_cache.invalidate(user_id, *done)
+        _notify_pending(user_id)
+
+        if action == 'accept':
+            flash(f"友達申請を{len(done)}件承認しました！", "success")
+        else:
+            flash(f"友達申請を{len(done)}件拒否しました。", "info")
+        return redirect(url_for('friend.friend_inbox', after=request.args.get('after')))
+
+    # --- 届いた承認待ち（low 側・high 側の UNION）を申請元ユーザーと JOIN し、Friend.id の続きから 1 ページ分 ---
+    after = request.args.get('after', 0, type=int)
+    incoming = Friend.adjacency(current_user.id, 'pending', incoming_only=True).subquery()
+    rows = db.session.execute(
+        db.select(incoming.c.fid, User.id, User.username)
+        .join(User, User.id == incoming.c.uid)
+        .where(incoming.c.fid > after)
+        .order_by(incoming.c.fid)
+        .limit(INBOX_PAGE_SIZE + 1)
+    ).all()
+
+    has_more = len(rows) > INBOX_PAGE_SIZE
+    rows = rows[:INBOX_PAGE_SIZE]
+    request_data = [{'id': uid, 'username': name} for _, uid, name in rows]
+    next_after = rows[-1][0] if has_more else None
+
+    return render_template(
+        'friend_inbox.html',
+        requests=request_data,
+        next_after=next_after,
+        paged=after > 0,
+    )
+
+def _pending_count(user_id):
+    incoming = Friend.adjacency(user_id, 'pending', incoming_only=True).subquery()
+    return db.session.execute(db.select(db.func.count()).select_from(incoming)).scalar()
+
+
+def _notify_pending(user_id):
+    """承認待ちが変わった受信者へ、接続中なら最新件数を配信する"""
+    if pending_hub.has_subscribers(user_id):
+        pending_hub.publish(user_id, _pending_count(user_id))
 
-    return render_template('friend_inbox.html', requests=request_data)
 
 @friend_bp.route("/friend/pending-count")
 @login_required
 def pending_count():
     """
-    自分宛ての承認待ち(friend_id=current_user.id, status='pending')の件数を返す
+    自分宛ての承認待ち（相手が requester_id、status='pending'）の件数を返す
+    （SSE が使えない環境向けのポーリング用）
+    """
+    return jsonify({"count": _pending_count(current_user.id)})
+
+
+@friend_bp.route("/friend/pending-stream")
+@login_required
+def pending_stream():
     """
-    count = Friend.query.filter_by(friend_id=current_user.id, status="pending").count()
-    return jsonify({"count": count})
+    承認待ち件数の Server-Sent Events。
+    接続直後に現在の件数、その後は変化したときだけ送る。
+    同じワーカーでの変更はすぐに、他ワーカーでの変更はハートビートごとの数え直しで届く。
+    1 接続が 1 スレッドを占有するので、プロセスあたりの接続数に上限を設け、
+    超えたら 503 を返してクライアントをポーリング（/friend/pending-count）に切り替えさせる。
+    """
+    user_id = current_user.id
+    q = pending_hub.subscribe(user_id, limit=current_app.config.get("PENDING_STREAM_MAX_CONNECTIONS", 2))
+    if q is None:
+        # EventSource は 200 以外を受けると再接続せずに閉じる（friends.html がポーリングに切り替える）
+        return jsonify({"error": "接続が混み合っています。"}), 503, {"Retry-After": "30"}
+    try:
+        count = _pending_count(user_id)
+    except Exception:
+        pending_hub.unsubscribe(user_id, q)
+        raise
+
+    app = current_app._get_current_object()
+    heartbeat = app.config.get("PENDING_STREAM_HEARTBEAT", 15)
+    max_seconds = app.config.get("PENDING_STREAM_MAX_SECONDS", 300)
+
+    def recount():
+        # リクエストのコンテキストは終わっているので、数え直しごとに作って接続をすぐ返す
+        with app.app_context():
+            return _pending_count(user_id)
+
+    def generate():
+        last = count
+        deadline = time.monotonic() + max_seconds
+        try:
+            yield "retry: 5000\n"
+            yield f"event: count\ndata: {json.dumps({'count': count})}\n\n"
+            while time.monotonic() < deadline:
+                try:
+                    latest = q.get(timeout=heartbeat)
+                except queue.Empty:
+                    latest = recount()
+                    if latest == last:
+                        yield ": heartbeat\n\n"
+                        continue
+                if latest != last:
+                    last = latest
+                    yield f"event: count\ndata: {json.dumps({'count': latest})}\n\n"
+        finally:
+            pending_hub.unsubscribe(user_id, q)
+
+    resp = Response(generate(), mimetype="text/event-stream")
+    resp.headers["Cache-Control"] = "no-cache"
+    resp.headers["X-Accel-Buffering"] = "no"
+    return resp
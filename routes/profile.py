@@ -1,6 +1,6 @@
 from flask import Blueprint, render_template
 from flask_login import login_required, current_user
-from models.friend import Friend
+from services.friend_graph import friend_cache
 
 profile_bp = Blueprint('profile', __name__)
 
@@ -10,7 +10,7 @@ def profile():
     """
     プロフィール情報を表示（読み取り専用）
     """
-    friend_count = len(Friend.get_friend_ids(current_user.id))
+    friend_count = len(friend_cache.get_friend_ids(current_user.id))
     created_at_str = current_user.created_at.strftime('%Y-%m-%d')
 
     return render_template(
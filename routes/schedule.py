@@ -1,10 +1,17 @@
-from flask import Blueprint, render_template, request, jsonify, flash, redirect, url_for
-from datetime import date, timedelta
+from flask import Blueprint, render_template, request, jsonify, flash, redirect, url_for, session, make_response
+from datetime import date, datetime, timedelta, timezone
 from flask_login import login_required, current_user
+from flask_wtf.csrf import generate_csrf
 from models import db
-from models import Schedule
-from models.friend import Friend   # 友達機能利用予定
+from models import Schedule, ScheduleMonth
+from models.models import SLOT_CODES, SLOT_LABELS
+from services.friend_graph import friend_cache
+from services.weekly_matrix import weekly_cache
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+import hashlib
 import json
+import time
 
 schedule_bp = Blueprint('schedule', __name__)
 
@@ -14,6 +21,177 @@ def get_week_dates(start_date):
     return [(monday + timedelta(days=i)) for i in range(7)]
 
 
+def _upsert(table):
+    """接続先の方言に合わせた INSERT ... ON CONFLICT を返す"""
+    if db.session.get_bind().dialect.name == 'postgresql':
+        return pg_insert(table)
+    return sqlite_insert(table)
+
+
+def _apply_changes(user_id, items):
+    """
+    [(date, slot), ...] をまとめて反映し、変更件数を返す（commit は呼び出し側）。
+    slot が空なら削除。件数に関係なく SELECT / UPSERT / DELETE と月ビット列の 2 文、最大 5 文で済ませる。
+    """
+    # 同じ日付が重複していたら後勝ち
+    wanted = dict(items)
+    if not wanted:
+        return 0
+
+    existing = dict(
+        db.session.query(Schedule.date, Schedule.time_type).filter(
+            Schedule.user_id == user_id,
+            Schedule.date.in_(list(wanted))
+        ).all()
+    )
+
+    # ✏ 更新 or 新規作成（値が変わらないものは送らない）
+    upserts = [
+        {'user_id': user_id, 'date': d, 'time_type': slot}
+        for d, slot in wanted.items()
+        if slot and existing.get(d) != slot
+    ]
+    # ❌ 未選択 → 削除
+    deletes = [d for d, slot in wanted.items() if not slot and d in existing]
+
+    if upserts:
+        stmt = _upsert(Schedule).values(upserts)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['user_id', 'date'],
+            set_={'time_type': stmt.excluded.time_type}
+        )
+        db.session.execute(stmt)
+
+    if deletes:
+        db.session.execute(
+            db.delete(Schedule).where(
+                Schedule.user_id == user_id,
+                Schedule.date.in_(deletes)
+            )
+        )
+
+    # 月ごとのビット列（読み込み用の写し）にも同じ変更を反映
+    changed = {row['date']: SLOT_CODES.get(row['time_type'], 0) for row in upserts}
+    changed.update((d, 0) for d in deletes)
+    _apply_month_bits(user_id, changed, datetime.now(timezone.utc))
+
+    return len(upserts) + len(deletes)
+
+
+def _apply_month_bits(user_id, changed, now):
+    """
+    {日付: コード} を schedule_month に反映する。
+    月の数に関係なく、行の用意（INSERT ... DO NOTHING）と
+    「変える日のビットを消して新しいコードを立てる」UPDATE（executemany）の 2 文。
+    """
+    if not changed:
+        return
+
+    months = {}
+    for d, code in changed.items():
+        clear, value = months.get(ScheduleMonth.month_of(d), (0, 0))
+        shift = ScheduleMonth.shift_of(d)
+        months[ScheduleMonth.month_of(d)] = (clear | (3 << shift), value | (code << shift))
+
+    stmt = _upsert(ScheduleMonth).values([
+        {'user_id': user_id, 'month': month, 'bits': 0, 'updated_at': now} for month in months
+    ]).on_conflict_do_nothing(index_elements=['user_id', 'month'])
+    db.session.execute(stmt)
+
+    table = ScheduleMonth.__table__
+    db.session.connection().execute(
+        table.update()
+        .where(table.c.user_id == user_id, table.c.month == db.bindparam('b_month'))
+        .values(
+            bits=table.c.bits.op('&')(db.bindparam('b_keep')).op('|')(db.bindparam('b_value')),
+            updated_at=now
+        ),
+        [{'b_month': month, 'b_keep': ~clear, 'b_value': value} for month, (clear, value) in months.items()]
+    )
+
+
+def _schedule_stamp(user_ids, start, end):
+    """
+    範囲を含む月の行の「件数 + 最終更新時刻」。
+    月単位なので同じ月の別の週の変更でも変わる（取りこぼしはしない）。
+    """
+    count, latest = db.session.query(
+        db.func.count(), db.func.max(ScheduleMonth.updated_at)
+    ).filter(ScheduleMonth.in_range(user_ids, start, end)).one()
+    return _format_stamp(count, latest)
+
+
+def _format_stamp(count, latest):
+    return f"{count}:{latest.isoformat() if latest else '-'}"
+
+
+def _week_stamps(user_order_ids, mondays):
+    """
+    mondays の週ごとに (本人だけ, 本人＋友達) の _schedule_stamp を返す（本人は user_order_ids[0]）。
+    週の数だけ数えず、該当する月の行を 1 回で読んで _schedule_stamp と同じ条件で数える。
+    """
+    rows = db.session.query(ScheduleMonth.user_id, ScheduleMonth.month, ScheduleMonth.updated_at).filter(
+        ScheduleMonth.in_range(user_order_ids, mondays[0], mondays[-1] + timedelta(days=6))
+    ).all()
+
+    def stamp(in_week):
+        return _format_stamp(len(in_week), max((u for u in in_week if u is not None), default=None))
+
+    stamps = {}
+    for monday in mondays:
+        first, sunday = ScheduleMonth.month_of(monday), monday + timedelta(days=6)
+        in_week = [(uid, u) for uid, m, u in rows if first <= m <= sunday]
+        stamps[monday] = (
+            stamp([u for uid, u in in_week if uid == user_order_ids[0]]),
+            stamp([u for _, u in in_week]),
+        )
+    return stamps
+
+
+def _read_slots(user_ids, start, end):
+    """start〜end の予定を (user_id, 日付, コード) で返す（月ごとのビット列から復元）"""
+    rows = db.session.query(ScheduleMonth.user_id, ScheduleMonth.month, ScheduleMonth.bits).filter(
+        ScheduleMonth.in_range(user_ids, start, end)
+    ).all()
+    return list(ScheduleMonth.decode(rows, start, end))
+
+
+def _make_etag(*parts):
+    return hashlib.sha1("|".join(str(p) for p in parts).encode('utf-8')).hexdigest()
+
+
+def _not_modified(etag):
+    """If-None-Match が一致すれば 304 を返す（Flash 表示待ちがあるときは描画する）"""
+    if session.get('_flashes'):
+        return None
+    if not request.if_none_match.contains(etag):
+        return None
+    resp = make_response('', 304)
+    return _with_etag(resp, etag)
+
+
+def _schedule_etag(user_id, today, monday, stamp):
+    """
+    日程入力画面の ETag。
+    埋め込む CSRF トークンが期限切れにならないよう、有効期限の半分で切り替える。
+    """
+    generate_csrf()  # セッション側のトークンを先に確定させる
+    csrf_bucket = int(time.time()) // 1800
+    return _make_etag('schedule', user_id, today, monday, session.get('csrf_token'), csrf_bucket, stamp)
+
+
+def _weekly_etag(user_id, today, monday, user_order_ids, stamp):
+    """週間表示の ETag（友達構成と予定のスタンプ）"""
+    return _make_etag('weekly', user_id, today, monday, user_order_ids, stamp)
+
+
+def _with_etag(resp, etag):
+    resp.set_etag(etag)
+    # ユーザーごとのページなので共有キャッシュには載せず、毎回再検証させる
+    resp.headers['Cache-Control'] = 'private, no-cache'
+    return resp
+
+
 # ==========================================
 # 🗓️ 日程入力画面（週切り替え＋保存済み反映）
 # ==========================================
@@ -31,22 +209,28 @@ def schedule():
     # （今週より前の週なら編集不可）
     is_past_week = start_of_week < get_week_dates(today)[0]
 
-    # 🔹 ログイン中ユーザーの該当週データを取得
-    saved_schedules = Schedule.query.filter(
-        Schedule.user_id == current_user.id,
-        Schedule.date.in_([d.strftime("%Y-%m-%d") for d in dates])
-    ).all()
+    # 🔹 変更がなければ描画せずに 304
+    schedule_stamp = _schedule_stamp([current_user.id], dates[0], dates[-1])
+    etag = _schedule_etag(current_user.id, today, dates[0], schedule_stamp)
+    cached = _not_modified(etag)
+    if cached:
+        return cached
 
+    # 🔹 ログイン中ユーザーの該当週データを取得（月曜〜日曜の範囲検索）
     # 🔹 日付: 時間帯 の辞書
-    saved_dict = {s.date: s.time_type for s in saved_schedules}
+    saved_dict = {
+        d: SLOT_LABELS[code]
+        for _, d, code in _read_slots([current_user.id], dates[0], dates[-1])
+    }
 
-    return render_template(
+    return _with_etag(make_response(render_template(
         'schedule.html',
         dates=dates,
         week_offset=week_offset,
         saved_dict=saved_dict,
-        is_past_week=is_past_week
-    )
+        is_past_week=is_past_week,
+        schedule_stamp=schedule_stamp
+    )), etag)
 
 
 # ==========================================
@@ -75,40 +259,16 @@ def save_schedule():
     # どの週から遷移してきたか
     week_offset = int(request.args.get('week', 0))
 
-    change_count = 0
-
-    for item in data:
-        selected_date = item["date"]
-        slot = item.get("slot", "").strip()
-
-        existing = Schedule.query.filter_by(
-            user_id=current_user.id, date=selected_date
-        ).first()
-
-        # --------------------------
-        # ❌ 未選択 → 削除処理
-        # --------------------------
-        if slot == "":
-            if existing:
-                db.session.delete(existing)
-                change_count += 1
-            continue
-
-        # --------------------------
-        # ✏ 更新 or 新規作成
-        # --------------------------
-        if existing:
-            if existing.time_type != slot:
-                existing.time_type = slot
-                change_count += 1
-        else:
-            new_row = Schedule(
-                user_id=current_user.id,
-                date=selected_date,
-                time_type=slot
-            )
-            db.session.add(new_row)
-            change_count += 1
+    try:
+        items = [(date.fromisoformat(item["date"]), (item.get("slot") or "").strip()) for item in data]
+    except (KeyError, TypeError, ValueError, AttributeError):
+        flash("日付または予定の形式が正しくありません。", "error")
+        return redirect(url_for('schedule.schedule', week=week_offset))
+    if any(slot and slot not in SLOT_CODES for _, slot in items):
+        flash("予定の種類が正しくありません。", "error")
+        return redirect(url_for('schedule.schedule', week=week_offset))
+
+    change_count = _apply_changes(current_user.id, items)
 
     db.session.commit()
 
@@ -118,64 +278,195 @@ def save_schedule():
     else:
         flash("変更はありません。", "info")
 
-    return redirect(url_for('schedule.schedule', week=week_offset))
+    # saved=1 で戻ると、schedule.js が送信済みの draft を消す（保存できるまでは残しておく）
+    return redirect(url_for('schedule.schedule', week=week_offset, saved=1))
 
 
 # ==========================================
-# 📆 週間スケジュール表示（自分＋友達）
+# ✏ 日程の差分保存 API（schedule.js の fetch 用・ページ遷移なし）
 # ==========================================
-@schedule_bp.route('/schedule/weekly')
+MAX_PATCH_CHANGES = 100
+
+
+@schedule_bp.route('/api/schedule', methods=['PATCH'])
 @login_required
-def weekly():
-    """自分＋友達のスケジュールを週単位で表示（自分→友達登録順で左から並べる）"""
+def api_schedule_patch():
+    """
+    {"changes": [{"date": "YYYY-MM-DD", "slot": "昼" | "夜" | "両方" | ""}, ...]} を
+    1 トランザクションで反映する（複数週の下書きをまとめて送ってよい）。
+    変更がなければ 204。変更があれば日数と、送られた日を含む週ごとの
+    スタンプ・日程入力画面と週間表示の ETag（/schedule・/schedule/weekly と同じ作り方）を返す。
+    CSRF トークンは X-CSRFToken ヘッダーで送ること。
+    """
+    data = request.get_json(silent=True)
+    changes = data.get("changes") if isinstance(data, dict) else None
+    if not isinstance(changes, list) or not changes:
+        return jsonify({"error": "changes に変更内容の配列を指定してください。"}), 400
+    if len(changes) > MAX_PATCH_CHANGES:
+        return jsonify({"error": f"一度に送れる変更は {MAX_PATCH_CHANGES} 件までです。"}), 400
 
-    week_offset = int(request.args.get('week', 0))
+    try:
+        items = [(date.fromisoformat(item["date"]), (item.get("slot") or "").strip()) for item in changes]
+    except (KeyError, TypeError, ValueError, AttributeError):
+        return jsonify({"error": "date は YYYY-MM-DD で指定してください。"}), 400
+    if any(slot and slot not in SLOT_CODES for _, slot in items):
+        return jsonify({"error": "slot は 昼 / 夜 / 両方 / 空文字 のいずれかです。"}), 400
+
+    user_id = current_user.id  # commit で current_user が期限切れになり、読み直しが 1 件増えるため
+    change_count = _apply_changes(user_id, items)
+    if change_count == 0:
+        return '', 204
+
+    db.session.commit()
+
+    # 保存後の版（commit 後に読むので、次の GET が返す ETag と一致する）
     today = date.today()
-    start_of_week = today + timedelta(weeks=week_offset)
-    dates = get_week_dates(start_of_week)
-    week_strs = [d.strftime("%Y-%m-%d") for d in dates]
+    mondays = sorted({get_week_dates(d)[0] for d, _ in items})
+    user_order_ids = [user_id] + friend_cache.get_friend_ids(user_id)
+    weeks = {}
+    for monday, (own, shared) in _week_stamps(user_order_ids, mondays).items():
+        weeks[monday.isoformat()] = {
+            "stamp": own,
+            "schedule_etag": f'"{_schedule_etag(user_id, today, monday, own)}"',
+            "weekly_etag": f'"{_weekly_etag(user_id, today, monday, user_order_ids, shared)}"',
+        }
 
-    from models.friend import Friend
-    friend_records = Friend.query.filter(
-        db.or_(
-            db.and_(Friend.user_id == current_user.id, Friend.status == 'accepted'),
-            db.and_(Friend.friend_id == current_user.id, Friend.status == 'accepted')
-        )
-    ).order_by(Friend.id.asc()).all()
+    return jsonify({"changed": change_count, "weeks": weeks})
 
-    friend_ids = [
-        fr.friend_id if fr.user_id == current_user.id else fr.user_id
-        for fr in friend_records
-    ]
 
-    user_order_ids = [current_user.id] + friend_ids
+@schedule_bp.route('/api/csrf-token')
+@login_required
+def api_csrf_token():
+    """期限の切れた CSRF トークンの取り直し（schedule.js が PATCH をやり直す前に呼ぶ）"""
+    resp = jsonify({"csrf_token": generate_csrf()})
+    resp.headers['Cache-Control'] = 'no-store'
+    return resp
+
 
+def _build_weekly_data(user_order_ids, dates):
+    """{日付: [{'name', 'slot'}, ...]}（user_order_ids の順）を組み立てる"""
     from models.models import User
-    users = User.query.filter(User.id.in_(user_order_ids)).all()
-    user_name_by_id = {u.id: u.username for u in users}
 
-    schedules = Schedule.query.filter(
-        Schedule.user_id.in_(user_order_ids),
-        Schedule.date.in_(week_strs)
-    ).all()
+    # 予定のあるユーザーの名前だけ要るので、User は JOIN で一緒に取る
+    rows = db.session.query(
+        ScheduleMonth.user_id, ScheduleMonth.month, ScheduleMonth.bits, User.username
+    ).join(
+        User, User.id == ScheduleMonth.user_id
+    ).filter(ScheduleMonth.in_range(user_order_ids, dates[0], dates[-1])).all()
 
-    schedule_map = {(s.user_id, s.date): s.time_type for s in schedules}
+    user_name_by_id = {uid: name for uid, _, _, name in rows}
+    schedule_map = {
+        (uid, d): SLOT_LABELS[code]
+        for uid, d, code in ScheduleMonth.decode((r[:3] for r in rows), dates[0], dates[-1])
+    }
 
     data = {}
-    for date_str in week_strs:
+    for d in dates:
         row = []
         for uid in user_order_ids:
-            slot = schedule_map.get((uid, date_str))
+            slot = schedule_map.get((uid, d))
             if slot:
                 row.append({
                     'name': user_name_by_id.get(uid, ''),
                     'slot': slot
                 })
-        data[date_str] = row
+        data[d] = row
+    return data
+
+
+# ==========================================
+# 📆 週間スケジュール表示（自分＋友達）
+# ==========================================
+@schedule_bp.route('/schedule/weekly')
+@login_required
+def weekly():
+    """自分＋友達のスケジュールを週単位で表示（自分→友達登録順で左から並べる）"""
+
+    week_offset = int(request.args.get('week', 0))
+    today = date.today()
+    start_of_week = today + timedelta(weeks=week_offset)
+    dates = get_week_dates(start_of_week)
+
+    friend_ids = friend_cache.get_friend_ids(current_user.id)
+
+    user_order_ids = [current_user.id] + friend_ids
 
-    return render_template(
+    # 🔹 友達構成と予定が変わっていなければ描画せずに 304
+    schedule_stamp = _schedule_stamp(user_order_ids, dates[0], dates[-1])
+    etag = _weekly_etag(current_user.id, today, dates[0], user_order_ids, schedule_stamp)
+    cached = _not_modified(etag)
+    if cached:
+        return cached
+
+    # 🔹 ETag と同じスタンプで引く → 一致すればキャッシュ済みの表をそのまま使う
+    #    （保存したのが別のワーカーでも、スタンプが変われば作り直す）
+    stamp = weekly_cache.stamp(user_order_ids, schedule_stamp)
+    data = weekly_cache.get(current_user.id, dates[0], stamp)
+    if data is None:
+        data = _build_weekly_data(user_order_ids, dates)
+        weekly_cache.set(current_user.id, dates[0], stamp, data)
+
+    return _with_etag(make_response(render_template(
         'weekly.html',
         dates=dates,
         week_offset=week_offset,
         data=data
+    )), etag)
+
+
+
+# ==========================================
+# 📡 週間スケジュール API（PWA 用・列指向 JSON）
+# ==========================================
+MAX_API_WEEKS = 12
+
+
+@schedule_bp.route('/api/weekly')
+@login_required
+def api_weekly():
+    """
+    自分＋友達の予定を複数週まとめて返す。
+    users は id → 名前の表を 1 回だけ、slots は日付ごとに order の順で
+    0=なし / 1=昼 / 2=夜 / 3=両方 のコードを並べる。
+    """
+    try:
+        start = date.fromisoformat(request.args['from']) if 'from' in request.args else date.today()
+        weeks = int(request.args.get('weeks', 1))
+    except ValueError:
+        return jsonify({"error": "from は YYYY-MM-DD、weeks は整数で指定してください。"}), 400
+
+    if not 1 <= weeks <= MAX_API_WEEKS:
+        return jsonify({"error": f"weeks は 1〜{MAX_API_WEEKS} で指定してください。"}), 400
+
+    monday = get_week_dates(start)[0]
+    sunday = monday + timedelta(days=7 * weeks - 1)
+
+    user_order_ids = [current_user.id] + friend_cache.get_friend_ids(current_user.id)
+
+    etag = _make_etag(
+        'api_weekly', current_user.id, monday, weeks,
+        user_order_ids, _schedule_stamp(user_order_ids, monday, sunday)
     )
+    cached = _not_modified(etag)
+    if cached:
+        return cached
+
+    from models.models import User
+    names = dict(
+        db.session.query(User.id, User.username).filter(User.id.in_(user_order_ids)).all()
+    )
+
+    # 複数週でも範囲検索 1 回（月ごとのビット列をそのままコードに戻す）
+    column = {uid: i for i, uid in enumerate(user_order_ids)}
+    dates = [monday + timedelta(days=i) for i in range(7 * weeks)]
+    slots = {d: [0] * len(user_order_ids) for d in dates}
+    for uid, d, code in _read_slots(user_order_ids, monday, sunday):
+        slots[d][column[uid]] = code
+
+    return _with_etag(jsonify({
+        "from": monday.isoformat(),
+        "to": sunday.isoformat(),
+        "users": {str(uid): names.get(uid, '') for uid in user_order_ids},
+        "order": user_order_ids,
+        "slots": {d.isoformat(): codes for d, codes in slots.items()},
+    }), etag)
@@ -0,0 +1,2 @@
+# services/__init__.py
+# ルートから使う共通処理（キャッシュなど）
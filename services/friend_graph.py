@@ -0,0 +1,44 @@
+# services/friend_graph.py
+# ユーザーごとの承認済み友達 ID（承認順）のキャッシュ
+
+from services.cache import LRUCache
+
+
+class FriendGraphCache:
+    """
+    友達一覧の読み取りはすべてここを通す。
+    友達関係を変更したら、関係する両ユーザーを invalidate すること。
+    replica から読んだ一覧はキャッシュしない（invalidate 後に遅れた値で埋め直さないため）。
+    """
+
+    def __init__(self, backend=None):
+        self.backend = backend or LRUCache()
+
+    def init_app(self, app):
+        self.backend = LRUCache(
+            maxsize=app.config.get("FRIEND_CACHE_SIZE", 10000),
+            ttl=app.config.get("FRIEND_CACHE_TTL", 300),
+        )
+
+    @staticmethod
+    def _key(user_id):
+        return f"friends:{int(user_id)}"
+
+    def get_friend_ids(self, user_id):
+        ids = self.backend.get(self._key(user_id))
+        if ids is None:
+            from models.db import read_replica_used
+            from models.friend import Friend
+            ids = tuple(Friend.get_friend_ids(user_id))
+            if not read_replica_used():
+                self.backend.set(self._key(user_id), ids)
+        return list(ids)
+
+    def invalidate(self, *user_ids):
+        self.backend.delete(*(self._key(uid) for uid in user_ids))
+
+    def stats(self):
+        return self.backend.stats()
+
+
+friend_cache = FriendGraphCache()
@@ -0,0 +1,94 @@
+# services/hashing.py
+# PIN の bcrypt 計算を専用スレッドで行い、同時実行数と待ち行列を制限する
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from flask_bcrypt import Bcrypt
+
+bcrypt = Bcrypt()
+
+
+class HashPoolBusy(Exception):
+    """待ち行列が一杯、または待ち時間切れ（呼び出し側で 503 を返す）"""
+
+
+class PinHasher:
+    """
+    bcrypt は GIL を解放するので、専用スレッドに逃がせば同じワーカーの他のリクエストを止めない。
+    実行中＋待ちの合計が workers + queue を超えたら即座に HashPoolBusy を投げる。
+    """
+
+    def __init__(self):
+        self.rounds = 12
+        self.workers = 2
+        self.queue = 8
+        self.timeout = 5.0
+        self.rejected = 0
+        self.cancelled = 0
+        self._executor = None
+        self._slots = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        bcrypt.init_app(app)
+        self.rounds = app.config.get("BCRYPT_LOG_ROUNDS", 12)
+        self.workers = app.config.get("HASH_POOL_WORKERS", 2)
+        self.queue = app.config.get("HASH_POOL_QUEUE", 8)
+        self.timeout = app.config.get("HASH_TIMEOUT", 5.0)
+        self._executor = None
+
+    def _ensure_executor(self):
+        # fork 後の子プロセスには親のスレッドが残らないので作り直す
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix="pin-hash"
+                )
+                self._slots = threading.BoundedSemaphore(self.workers + self.queue)
+                self._pid = os.getpid()
+            return self._executor, self._slots
+
+    def _run(self, fn, *args):
+        executor, slots = self._ensure_executor()
+        if not slots.acquire(blocking=False):
+            self.rejected += 1
+            raise HashPoolBusy()
+
+        future = executor.submit(fn, *args)
+        future.add_done_callback(lambda _: slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            # まだ待ち行列にあれば取り消す（503 を返した相手の bcrypt を回さず、枠もすぐ空ける）
+            if future.cancel():
+                self.cancelled += 1
+            self.rejected += 1
+            raise HashPoolBusy()
+
+    def hash(self, pin):
+        return self._run(bcrypt.generate_password_hash, pin, self.rounds).decode('utf-8')
+
+    def check(self, hashed, pin):
+        return self._run(bcrypt.check_password_hash, hashed, pin)
+
+    def needs_rehash(self, hashed):
+        """$2b$12$... のコストが現在の設定と違えば True"""
+        try:
+            return int(hashed.split('$')[2]) != self.rounds
+        except (IndexError, ValueError):
+            return False
+
+    def stats(self):
+        return {
+            'rounds': self.rounds,
+            'workers': self.workers,
+            'queue': self.queue,
+            'rejected': self.rejected,
+            'cancelled': self.cancelled,
+        }
+
+
+pin_hasher = PinHasher()
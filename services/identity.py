@@ -0,0 +1,96 @@
+# services/identity.py
+# ログイン中ユーザーの特定（user_loader / auto_login）を 1 か所にまとめたキャッシュ
+
+import hashlib
+
+from sqlalchemy.orm import make_transient_to_detached
+
+from services.cache import LRUCache
+
+USER_COLUMNS = ('id', 'username', 'pin', 'device_token', 'created_at')
+
+
+class IdentityCache:
+    """
+    - tok:<sha256(token)> → (user_id, expires_at)   有効なデバイストークン
+    - user:<id>           → User の列の値             user_loader 用のスナップショット
+
+    トークンを失効させたら forget_tokens、User を更新したら forget_user を呼ぶこと。
+    TTL が短いので、他ワーカーでの失効もこの秒数以内に反映される。
+    replica から読んだ値はキャッシュしない（失効前のトークンを覚え直さないため）。
+    """
+
+    def __init__(self, backend=None):
+        self.backend = backend or LRUCache()
+
+    def init_app(self, app):
+        self.backend = LRUCache(
+            maxsize=app.config.get("IDENTITY_CACHE_SIZE", 10000),
+            ttl=app.config.get("IDENTITY_CACHE_TTL", 60),
+        )
+
+    @staticmethod
+    def _token_key(token):
+        return "tok:" + hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+    def _remember_user(self, user):
+        from models.db import read_replica_used
+        if read_replica_used():
+            return
+        self.backend.set(f"user:{user.id}", {c: getattr(user, c) for c in USER_COLUMNS})
+
+    def load_user(self, user_id):
+        """User を返す。スナップショットがあればクエリを発行しない"""
+        from models import db, User
+
+        snapshot = self.backend.get(f"user:{int(user_id)}")
+        if snapshot is None:
+            user = db.session.get(User, int(user_id))
+            if user:
+                self._remember_user(user)
+            return user
+
+        user = User(**snapshot)
+        make_transient_to_detached(user)
+        return db.session.merge(user, load=False)
+
+    def lookup_token(self, token):
+        """
+        有効な（未失効の）トークンなら (User, expires_at)、なければ None。
+        キャッシュにない場合も Device と User を 1 回の JOIN で引く。
+        """
+        from models import db, User, Device
+        from models.db import read_replica_used
+
+        key = self._token_key(token)
+        entry = self.backend.get(key)
+        if entry is not None:
+            user = self.load_user(entry[0])
+            return (user, entry[1]) if user else None
+
+        row = db.session.query(Device.expires_at, User).join(
+            User, Device.user_id == User.id
+        ).filter(
+            Device.token == token,
+            Device.is_revoked == False
+        ).first()
+        if row is None:
+            return None
+
+        expires_at, user = row
+        if not read_replica_used():
+            self.backend.set(key, (user.id, expires_at))
+        self._remember_user(user)
+        return user, expires_at
+
+    def forget_tokens(self, *tokens):
+        self.backend.delete(*(self._token_key(t) for t in tokens if t))
+
+    def forget_user(self, user_id):
+        self.backend.delete(f"user:{int(user_id)}")
+
+    def stats(self):
+        return self.backend.stats()
+
+
+identity_cache = IdentityCache()
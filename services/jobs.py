@@ -0,0 +1,114 @@
+# services/jobs.py
+# プロセス内の定期ジョブ実行（複数ワーカーのうち 1 つだけが回す）
+
+import logging
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows（ローカル開発）ではロックなしで動かす
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+class JobRunner:
+    """
+    register したジョブを interval 秒ごとにバックグラウンドスレッドで実行する。
+    ロックファイル（flock）を取れたプロセスだけが実行し、
+    そのプロセスが落ちればロックが外れて別のワーカーが引き継ぐ。
+    flock は同じホストの中でしか排他にならない（複数インスタンスでは gunicorn.conf.py の説明を参照）。
+    """
+
+    def __init__(self):
+        self.jobs = {}
+        self.last_results = {}
+        self._app = None
+        self._thread = None
+        self._pid = None
+        self._lock_file = None
+        self._leader = False
+        self._start_lock = threading.Lock()
+
+    def register(self, name, fn, interval):
+        """fn(app) は {'deleted': 件数, 'batches': 回数, ...} を返す"""
+        self.jobs[name] = (fn, interval)
+
+    def init_app(self, app):
+        self._app = app
+        if app.config.get("JOBS_ENABLED", True) and app.config.get("JOBS_AUTOSTART", True):
+            self.start()
+
+    def start(self):
+        """起動済みなら何もしない（fork 後の子プロセスでは作り直す）"""
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._lock_file = None
+            self._leader = False
+            self._thread = threading.Thread(target=self._loop, name="job-runner", daemon=True)
+            self._thread.start()
+
+    def _acquire_lock(self):
+        if self._leader:
+            return True
+        if fcntl is not None:
+            path = self._app.config["JOBS_LOCK_PATH"]
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            f = open(path, "a")
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                f.close()
+                return False
+            self._lock_file = f
+        self._leader = True
+        return True
+
+    def _loop(self):
+        time.sleep(self._app.config.get("JOBS_INITIAL_DELAY", 60))
+        next_run = {name: 0 for name in self.jobs}
+
+        while True:
+            if self._acquire_lock():
+                now = time.monotonic()
+                for name, (fn, interval) in self.jobs.items():
+                    if now >= next_run.get(name, 0):
+                        try:
+                            self.run_job(name)
+                        except Exception:
+                            logger.exception("job=%s failed", name)
+                        next_run[name] = time.monotonic() + interval
+            time.sleep(self._app.config.get("JOBS_TICK", 60))
+
+    def run_job(self, name, app=None):
+        """ジョブを 1 回実行して結果を返す（手動実行の HTTP エンドポイントからも使う）"""
+        app = app or self._app
+        fn, _ = self.jobs[name]
+
+        from models.db import use_primary
+
+        started = time.perf_counter()
+        # 手動実行（GET /__cleanup）でも replica は読まない（消す対象は primary で選ぶ）
+        with app.app_context(), use_primary():
+            result = fn(app)
+        result = dict(result, job=name, duration_ms=round((time.perf_counter() - started) * 1000, 1))
+
+        self.last_results[name] = result
+        logger.info(
+            "job=%s deleted=%s batches=%s duration_ms=%s",
+            name, result.get('deleted'), result.get('batches'), result['duration_ms']
+        )
+        return result
+
+    def stats(self):
+        return {
+            'leader': self._leader,
+            'last_results': self.last_results,
+        }
+
+
+job_runner = JobRunner()
@@ -0,0 +1,161 @@
+# services/profiling.py
+# リクエストごとの処理時間の内訳（SQL 件数・DB 時間・before_request・ビュー・テンプレート）
+
+import functools
+import logging
+import random
+import time
+
+from flask import g, has_request_context, request, request_started, before_render_template, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+# before_request で計測する関数（app.py で timed() に通したもの）の表示順
+HOOK_PHASES = ('auto_login', 'force_register')
+
+
+class RequestProfiler:
+    """
+    PROFILE_SAMPLE_RATE（0〜1）の割合のリクエストだけ計測し、
+    Server-Timing ヘッダーと 1 行のログ（key=value）で出す。0 なら何も登録しない。
+
+    view は before_request の後からレスポンス確定までで、その中の SQL と
+    テンプレート描画の時間も含む（db / render は内訳として別に出す）。
+    """
+
+    def __init__(self):
+        self.sample_rate = 0.0
+        self.sampled = 0
+        self._engine_hooked = False
+
+    @property
+    def enabled(self):
+        return self.sample_rate > 0
+
+    def init_app(self, app):
+        self.sample_rate = app.config.get("PROFILE_SAMPLE_RATE", 0.0)
+        if not self.enabled:
+            return
+
+        request_started.connect(self._on_request_started, app)
+        before_render_template.connect(self._on_render_start, app)
+        template_rendered.connect(self._on_render_end, app)
+        app.after_request(self._finish)
+
+        # Engine 全体に 1 回だけ登録する（bind が増えても拾える）
+        if not self._engine_hooked:
+            event.listen(Engine, "before_cursor_execute", self._before_cursor_execute)
+            event.listen(Engine, "after_cursor_execute", self._after_cursor_execute)
+            self._engine_hooked = True
+
+    # ======================================================
+    # before_request の計測
+    # ======================================================
+    def timed(self, phase, fn):
+        """before_request 用の関数を包む（無効なら fn をそのまま返す）"""
+        if not self.enabled:
+            return fn
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            prof = _current()
+            if prof is None:
+                return fn(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                prof['phases'][phase] = prof['phases'].get(phase, 0.0) + time.perf_counter() - started
+
+        return wrapper
+
+    # ======================================================
+    # シグナル / エンジンイベント
+    # ======================================================
+    def _on_request_started(self, sender, **extra):
+        if random.random() >= self.sample_rate:
+            g._profile = None
+            return
+        self.sampled += 1
+        g._profile = {
+            'started': time.perf_counter(),
+            'phases': {},
+            'sql_count': 0,
+            'sql_time': 0.0,
+            'render_started': None,
+            'render_time': 0.0,
+        }
+
+    def _on_render_start(self, sender, template, context, **extra):
+        prof = _current()
+        if prof is not None:
+            prof['render_started'] = time.perf_counter()
+
+    def _on_render_end(self, sender, template, context, **extra):
+        prof = _current()
+        if prof is not None and prof['render_started'] is not None:
+            prof['render_time'] += time.perf_counter() - prof['render_started']
+            prof['render_started'] = None
+
+    @staticmethod
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if _current() is not None:
+            conn.info.setdefault('_profile_started', []).append(time.perf_counter())
+
+    @staticmethod
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        prof = _current()
+        stack = conn.info.get('_profile_started')
+        if prof is None or not stack:
+            return
+        prof['sql_count'] += 1
+        prof['sql_time'] += time.perf_counter() - stack.pop()
+
+    # ======================================================
+    # 集計して出力
+    # ======================================================
+    def _finish(self, response):
+        prof = _current()
+        if prof is None:
+            return response
+
+        total = time.perf_counter() - prof['started']
+        hooks = sum(prof['phases'].values())
+        timings = [(name, prof['phases'][name]) for name in HOOK_PHASES if name in prof['phases']]
+        timings += [
+            ('view', max(total - hooks, 0.0)),
+            ('db', prof['sql_time']),
+            ('render', prof['render_time']),
+            ('total', total),
+        ]
+
+        response.headers.add(
+            'Server-Timing',
+            ", ".join(
+                f'{name};dur={secs * 1000:.1f}' + (f';desc="{prof["sql_count"]} queries"' if name == 'db' else '')
+                for name, secs in timings
+            ),
+        )
+        logger.info(
+            "profile method=%s path=%s endpoint=%s status=%s queries=%d %s",
+            request.method, request.path, request.endpoint, response.status_code, prof['sql_count'],
+            " ".join(f"{name}_ms={secs * 1000:.1f}" for name, secs in timings),
+        )
+        return response
+
+    def stats(self):
+        return {
+            'sample_rate': self.sample_rate,
+            'sampled': self.sampled,
+        }
+
+
+def _current():
+    if not has_request_context():
+        return None
+    return g.get('_profile')
+
+
+profiler = RequestProfiler()
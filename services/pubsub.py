@@ -0,0 +1,66 @@
+# services/pubsub.py
+# 承認待ち件数のプロセス内 pub/sub（SSE 接続ごとにキューを 1 つ持つ）
+
+import queue
+import threading
+from collections import defaultdict
+
+
+class PendingCountHub:
+    """
+    subscribe したキューに、publish された最新の件数を配る。
+    プロセス内だけで完結するため、他ワーカーでの変更は届かない
+    （その分は SSE 側がハートビートごとに件数を数え直して補う）。
+    """
+
+    def __init__(self):
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, user_id, limit=None):
+        """キューを返す。プロセス全体の接続数が limit に達していたら None"""
+        q = queue.Queue(maxsize=1)
+        with self._lock:
+            if limit is not None and self._connections() >= limit:
+                return None
+            self._subscribers[user_id].add(q)
+        return q
+
+    def unsubscribe(self, user_id, q):
+        with self._lock:
+            subs = self._subscribers.get(user_id)
+            if subs is not None:
+                subs.discard(q)
+                if not subs:
+                    del self._subscribers[user_id]
+
+    def has_subscribers(self, user_id):
+        with self._lock:
+            return bool(self._subscribers.get(user_id))
+
+    def publish(self, user_id, count):
+        with self._lock:
+            subs = list(self._subscribers.get(user_id, ()))
+        for q in subs:
+            # 読まれていない古い値は捨てて最新だけ残す
+            try:
+                q.get_nowait()
+            except queue.Empty:
+                pass
+            try:
+                q.put_nowait(count)
+            except queue.Full:
+                pass
+
+    def _connections(self):
+        return sum(len(s) for s in self._subscribers.values())
+
+    def stats(self):
+        with self._lock:
+            return {
+                'users': len(self._subscribers),
+                'connections': self._connections(),
+            }
+
+
+pending_hub = PendingCountHub()
@@ -0,0 +1,48 @@
+# services/user_search.py
+# ユーザー名の前方一致検索（友達申請の入力補完）と、よく引かれる prefix のキャッシュ
+
+from services.cache import LRUCache
+
+
+class UserSearchCache:
+    """
+    正規化済み prefix → ((id, username), ...) を持つ。
+    入力補完は 1 文字ごとに同じ prefix が何度も来るので、短い TTL でも十分に当たる。
+    新規登録があったら、その名前の prefix をすべて invalidate すること。
+    replica から読んだ結果はキャッシュしない（登録直後の名前が TTL の間見つからなくなるため）。
+    """
+
+    def __init__(self, backend=None):
+        self.backend = backend or LRUCache()
+        self.limit = 8
+
+    def init_app(self, app):
+        self.backend = LRUCache(
+            maxsize=app.config.get("USER_SEARCH_CACHE_SIZE", 5000),
+            ttl=app.config.get("USER_SEARCH_CACHE_TTL", 60),
+        )
+        self.limit = app.config.get("USER_SEARCH_LIMIT", 8)
+
+    @staticmethod
+    def _key(prefix):
+        return f"search:{prefix}"
+
+    def search(self, prefix):
+        """自分を除く前に使えるよう limit + 1 件引いておく"""
+        rows = self.backend.get(self._key(prefix))
+        if rows is None:
+            from models import User
+            from models.db import read_replica_used
+            rows = tuple(tuple(r) for r in User.search_prefix(prefix, self.limit + 1))
+            if not read_replica_used():
+                self.backend.set(self._key(prefix), rows)
+        return list(rows)
+
+    def invalidate_name(self, username_key):
+        self.backend.delete(*(self._key(username_key[:i]) for i in range(1, len(username_key) + 1)))
+
+    def stats(self):
+        return self.backend.stats()
+
+
+user_search_cache = UserSearchCache()
@@ -0,0 +1,55 @@
+# services/weekly_matrix.py
+# /schedule/weekly の「日付 × ユーザー」表のキャッシュ（キー：閲覧者 × 週の月曜日）
+
+from services.cache import LRUCache
+
+
+class WeeklyMatrixCache:
+    """
+    表を作った時点の「並び順（自分＋友達）」と「DB のスタンプ（_schedule_stamp）」を一緒に保存し、
+    読み出し時にどちらかが変わっていたら捨てる。
+
+    スタンプは ETag の材料と同じなので、どのワーカーでも
+    「表を作ったときのスタンプ」と違う ETag で古い表を返すことはない。
+    スタンプは表を作る前に取ること（作成中の保存は次のスタンプで作り直される）。
+    replica を読んだリクエストの表は保存しない（スタンプと表が別の DB から来ることがあるため）。
+    """
+
+    def __init__(self, backend=None):
+        self.backend = backend or LRUCache()
+        self.stale = 0
+
+    def init_app(self, app):
+        self.backend = LRUCache(
+            maxsize=app.config.get("WEEKLY_CACHE_SIZE", 5000),
+            ttl=app.config.get("WEEKLY_CACHE_TTL", 600),
+        )
+
+    @staticmethod
+    def stamp(user_order_ids, schedule_stamp):
+        return tuple(user_order_ids), schedule_stamp
+
+    def get(self, viewer_id, monday, stamp):
+        entry = self.backend.get(f"week:{int(viewer_id)}:{monday.isoformat()}")
+        if entry is None:
+            return None
+        if entry[0] != stamp:
+            # バックエンド上はヒットだが中身が古い
+            self.stale += 1
+            return None
+        return entry[1]
+
+    def set(self, viewer_id, monday, stamp, data):
+        from models.db import read_replica_used
+        if read_replica_used():
+            return
+        self.backend.set(f"week:{int(viewer_id)}:{monday.isoformat()}", (stamp, data))
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self):
+        return dict(self.backend.stats(), stale=self.stale)
+
+
+weekly_cache = WeeklyMatrixCache()
@@ -4,12 +4,25 @@
 // ・Safari の DOM レースバグ完全回避
 // ・Flash 成功表示安定化
 // ・週またぎの draft 保存/反映
-// ・差分のみ送信（POST form 方式）
+// ・差分のみ送信（PATCH /api/schedule、失敗時は POST form 方式）
 // ======================================================
 
-// Flask 側の schedule.html で window に埋め込んだ値
-const csrf_token = window.CSRF_TOKEN || "";
+// Flask 側の schedule.html で window に埋め込んだ値（期限切れなら /api/csrf-token で取り直す）
+let csrf_token = window.CSRF_TOKEN || "";
 const WEEK_OFFSET = window.WEEK_OFFSET;
+const WEEK_MONDAY = window.WEEK_MONDAY;
+
+// この画面が表している保存状態（PATCH で保存したら差し替える）
+let pageStamp = window.SCHEDULE_STAMP || "";
+
+// PATCH が返した週ごとの版（月曜日 → スタンプ）。タブの中だけで共有する
+const VERSIONS_KEY = "schedule-versions";
+
+// form POST で送った draft のキー（保存できたページ（?saved=1）で消す）
+const SUBMITTED_KEY = "schedule-submitted-drafts";
+
+// PATCH 1 回で送れる件数（routes/schedule.py の MAX_PATCH_CHANGES）。超えたら form POST で送る
+const MAX_PATCH_CHANGES = 100;
 
 // ======================================================
 // DOMContentLoaded
@@ -22,6 +35,9 @@ document.addEventListener("DOMContentLoaded", () => {
   // ローカル draft のキー
   const DRAFT_KEY = `schedule-draft-week${WEEK_OFFSET}`;
 
+  // form POST の保存が済んでいれば、送った draft をここで消す
+  clearSubmittedDrafts();
+
   // ---- draft 読み込み ----
   let draft = {};
   try {
@@ -86,9 +102,9 @@ document.addEventListener("DOMContentLoaded", () => {
   });
 
   // ======================================================
-  // 📌 決定ボタン：差分のみ送信（form POST + CSRF hidden）
+  // 📌 決定ボタン：差分のみ送信（PATCH /api/schedule、失敗時は form POST）
   // ======================================================
-  saveBtn?.addEventListener("click", () => {
+  saveBtn?.addEventListener("click", async () => {
 
     const payload = [];
 
@@ -110,47 +126,221 @@ document.addEventListener("DOMContentLoaded", () => {
       }
     });
 
+    // 他の週の draft（今週以降の選択だけ。削除は draft に残らないので送らない）
+    const pageDates = new Set(Array.from(rows, (row) => row.dataset.date));
+    const otherDraftKeys = [];
+    otherWeekDraftKeys(DRAFT_KEY).forEach((key) => {
+      let other = {};
+      try {
+        other = JSON.parse(localStorage.getItem(key)) || {};
+      } catch {
+        return;
+      }
+      otherDraftKeys.push(key);
+      Object.keys(other).forEach((date) => {
+        if (date >= currentMonday() && !pageDates.has(date)) {
+          payload.push({ date, slot: convertSlotLabel(other[date]) });
+        }
+      });
+    });
+
     // 差分なし
     if (payload.length === 0) {
       showInfo("変更はありません。");
       return;
     }
 
+    // 一度に送れない量は、1 トランザクションで済む form POST で送る
+    if (payload.length > MAX_PATCH_CHANGES) {
+      submitForm(payload, [DRAFT_KEY, ...otherDraftKeys]);
+      return;
+    }
+
+    saveBtn.disabled = true;
     try {
-      // ---- form POST ----
-      const form = document.createElement("form");
-      form.method = "POST";
-      form.action = `/schedule/save?week=${WEEK_OFFSET}`;
+      let res = await patchSchedule(payload);
+
+      // CSRF 切れの 400 は HTML で返る → トークンを取り直して 1 回だけやり直す
+      if (res.status === 400 && !isJsonResponse(res) && await refreshCsrfToken()) {
+        res = await patchSchedule(payload);
+      }
 
-      // 🔒 CSRF hidden input
-      const csrf = document.createElement("input");
-      csrf.type = "hidden";
-      csrf.name = "csrf_token";
-      csrf.value = csrf_token;
-      form.appendChild(csrf);
+      // セッション切れでログイン画面へ飛ばされたときも成功扱いにしない
+      if (res.ok && !res.redirected) {
+        // 週ごとの新しい版を覚えておく（戻るボタンで古い画面が出たら読み直すため）
+        if (res.status !== 204) {
+          const data = await res.json().catch(() => ({}));
+          rememberVersions(data.weeks || {});
+        }
 
-      // payload hidden
-      const input = document.createElement("input");
-      input.type = "hidden";
-      input.name = "payload";
-      input.value = JSON.stringify(payload);
-      form.appendChild(input);
+        // 保存済みの状態を今の選択に合わせ、送った draft を消す（再読み込みなし）
+        Object.keys(initialSelections).forEach((date) => delete initialSelections[date]);
+        Object.assign(initialSelections, currentSelections);
+        Object.keys(draft).forEach((date) => delete draft[date]);
+        localStorage.removeItem(DRAFT_KEY);
+        otherDraftKeys.forEach((key) => localStorage.removeItem(key));
 
-      document.body.appendChild(form);
+        showInfo(res.status === 204 ? "変更はありません。" : "変更を保存しました！");
+        return;
+      }
 
-      // draft のリセット
-      localStorage.removeItem(DRAFT_KEY);
+      // 入力の誤りは JSON の 400 で返る
+      if (res.status === 400 && isJsonResponse(res)) {
+        const data = await res.json().catch(() => ({}));
+        showError(data.error || "保存できませんでした。");
+        return;
+      }
 
-      // 送信
-      form.submit();
+      // それ以外（サーバーエラーなど）は従来の form POST でやり直す（draft は保存できるまで残る）
+      submitForm(payload, [DRAFT_KEY, ...otherDraftKeys]);
 
     } catch (err) {
       console.error("保存エラー:", err);
-      showError("通信エラーが発生しました。");
+      submitForm(payload, [DRAFT_KEY, ...otherDraftKeys]);
+    } finally {
+      saveBtn.disabled = false;
     }
   });
 });
 
+// ======================================================
+// 📌 PATCH /api/schedule
+// ======================================================
+function patchSchedule(payload) {
+  return fetch("/api/schedule", {
+    method: "PATCH",
+    credentials: "same-origin",
+    headers: {
+      "Content-Type": "application/json",
+      "Accept": "application/json",
+      "X-CSRFToken": csrf_token,
+    },
+    body: JSON.stringify({ changes: payload }),
+  });
+}
+
+function isJsonResponse(res) {
+  return (res.headers.get("Content-Type") || "").includes("application/json");
+}
+
+// 新しい CSRF トークンを取り直す（取れなければ false）
+async function refreshCsrfToken() {
+  try {
+    const res = await fetch("/api/csrf-token", { credentials: "same-origin", cache: "no-store" });
+    if (!res.ok || res.redirected || !isJsonResponse(res)) return false;
+    const data = await res.json();
+    if (!data.csrf_token) return false;
+    csrf_token = data.csrf_token;
+    return true;
+  } catch {
+    return false;
+  }
+}
+
+// ======================================================
+// 📌 版（スタンプ）：bfcache から戻った画面が古ければ読み直す
+// ======================================================
+function storedVersions() {
+  try {
+    return JSON.parse(sessionStorage.getItem(VERSIONS_KEY)) || {};
+  } catch {
+    return {};
+  }
+}
+
+function rememberVersions(weeks) {
+  const versions = storedVersions();
+  Object.keys(weeks).forEach((monday) => {
+    versions[monday] = weeks[monday].stamp;
+  });
+  sessionStorage.setItem(VERSIONS_KEY, JSON.stringify(versions));
+  if (versions[WEEK_MONDAY]) pageStamp = versions[WEEK_MONDAY];
+}
+
+window.addEventListener("pageshow", (e) => {
+  // 別の週の画面からこの週の下書きを保存していたら、この画面は古い
+  const latest = storedVersions()[WEEK_MONDAY];
+  if (e.persisted && latest && latest !== pageStamp) location.reload();
+});
+
+// ======================================================
+// 📌 form POST（fetch が使えないときの従来の保存方法）
+// ======================================================
+function submitForm(payload, draftKeys) {
+  try {
+    const form = document.createElement("form");
+    form.method = "POST";
+    form.action = `/schedule/save?week=${WEEK_OFFSET}`;
+
+    // 🔒 CSRF hidden input
+    const csrf = document.createElement("input");
+    csrf.type = "hidden";
+    csrf.name = "csrf_token";
+    csrf.value = csrf_token;
+    form.appendChild(csrf);
+
+    // payload hidden
+    const input = document.createElement("input");
+    input.type = "hidden";
+    input.name = "payload";
+    input.value = JSON.stringify(payload);
+    form.appendChild(input);
+
+    document.body.appendChild(form);
+
+    // draft はまだ消さない（保存できたら戻り先の ?saved=1 のページで消す）
+    sessionStorage.setItem(SUBMITTED_KEY, JSON.stringify(draftKeys));
+
+    // 送信
+    form.submit();
+
+  } catch (err) {
+    console.error("保存エラー:", err);
+    showError("通信エラーが発生しました。");
+  }
+}
+
+// form POST の保存が済んだページ（?saved=1）なら、送った draft を消して URL から外す
+function clearSubmittedDrafts() {
+  const url = new URL(location.href);
+  if (!url.searchParams.has("saved")) return;
+
+  let keys = [];
+  try {
+    keys = JSON.parse(sessionStorage.getItem(SUBMITTED_KEY)) || [];
+  } catch {
+    keys = [];
+  }
+  keys.forEach((key) => localStorage.removeItem(key));
+  sessionStorage.removeItem(SUBMITTED_KEY);
+
+  url.searchParams.delete("saved");
+  history.replaceState(null, "", url);
+}
+
+// ======================================================
+// 📌 週またぎ draft
+// ======================================================
+function otherWeekDraftKeys(currentKey) {
+  const keys = [];
+  for (let i = 0; i < localStorage.length; i++) {
+    const key = localStorage.key(i);
+    if (key && key.startsWith("schedule-draft-week") && key !== currentKey) {
+      keys.push(key);
+    }
+  }
+  return keys;
+}
+
+// 今週の月曜日（YYYY-MM-DD。draft の日付と文字列で比べる）
+function currentMonday() {
+  const now = new Date();
+  const monday = new Date(now.getFullYear(), now.getMonth(), now.getDate() - ((now.getDay() + 6) % 7));
+  const mm = String(monday.getMonth() + 1).padStart(2, "0");
+  const dd = String(monday.getDate()).padStart(2, "0");
+  return `${monday.getFullYear()}-${mm}-${dd}`;
+}
+
 // ======================================================
 // 📌 slot 日本語変換
 // ======================================================
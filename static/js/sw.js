@@ -47,6 +47,11 @@ self.addEventListener("activate", (event) => {
 self.addEventListener("fetch", (event) => {
   const url = new URL(event.request.url);
 
+  // SSE（終わらないレスポンス）はキャッシュ処理に通さずブラウザに任せる
+  if ((event.request.headers.get("Accept") || "").includes("text/event-stream")) {
+    return;
+  }
+
   // 状態依存ページ（除外対象）
   const STATE_SENSITIVE_PATHS = ["/", "/register", "/friend"];
 
@@ -0,0 +1,9 @@
+# wsgi.py
+# 本番の入口（gunicorn -c gunicorn.conf.py wsgi:app）
+#
+# preload_app のときは gunicorn の親プロセスで 1 回だけ読み込まれ、
+# ワーカーは fork でそれを受け継ぐ（読み込み済みのモジュールやテンプレートをコピーオンライトで共有）。
+
+from app import create_app
+
+app = create_app()